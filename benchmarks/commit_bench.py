@@ -0,0 +1,112 @@
+"""
+Commits per second of the database writer under concurrent `shop` traffic.
+
+    python -m benchmarks.commit_bench --users 2000 --concurrency 200
+
+Every simulated shop command makes the database calls of the real one (user, account by game name,
+last_get_shops_at, skins of the store, skin log) through AsyncDatabase. The same traffic runs with the
+rollback journal and a commit per call, with WAL and a commit per call, and with WAL and group commit.
+calls/s counts the database calls that were committed, commits/s the transactions it took. The gap
+between the modes grows with the cost of an fsync on the disk the database is on.
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+# importing database creates the bot database in the working directory, keep it out of the repo
+os.chdir(tempfile.mkdtemp())
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import scoped_session, sessionmaker  # noqa: E402
+from sqlalchemy.pool import QueuePool  # noqa: E402
+
+from database import AsyncDatabase, Base, User, RiotAccount, SkinLog, Weapon  # noqa: E402
+from database.setting import SQLITE_PRAGMAS, configure_sqlite  # noqa: E402
+from database.weapon import skin_cache  # noqa: E402
+
+MODES = {
+    "rollback journal, commit per call": ({}, 0, 1),
+    "WAL, commit per call": (SQLITE_PRAGMAS, 0, 1),
+    "WAL, group commit": (SQLITE_PRAGMAS, 0.002, 64),
+}
+
+
+def generate(path: str, pragmas, users: int):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, poolclass=QueuePool)
+    configure_sqlite(engine, pragmas)
+    Base.metadata.create_all(bind=engine)
+    skins = [str(uuid.uuid4()) for _ in range(400)]
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"id": i, "language": "ja-JP"} for i in range(users)])
+        conn.execute(RiotAccount.__table__.insert(), [
+            {"uuid": i, "username": f"user{i}", "region": "ap", "game_name": f"player{i}#{i}",
+             "puuid": str(uuid.uuid4()), "user_id": i} for i in range(users)])
+        conn.execute(Weapon.__table__.insert(), [
+            {"uuid": skin + "ja-JP", "display_name": skin[:8], "display_icon": ""} for skin in skins])
+    return engine, skins
+
+
+async def shop(db: AsyncDatabase, user_id: int, skins) -> float:
+    started = time.perf_counter()
+    user = await db.run(User.get_promised, user_id)
+    account = await db.run(RiotAccount.get_by_game_name, f"player{user_id}#{user_id}")
+    await db.run(RiotAccount.mark_fetched, account.uuid, False, datetime.datetime.now())
+    offers = random.sample(skins, 4)
+    await db.run(Weapon.get_many, offers, user.language)
+    await db.run(SkinLog.add_logs_once, account.puuid, datetime.date.today(), offers)
+    return time.perf_counter() - started
+
+
+async def run_mode(pragmas, group_window: float, group_max: int, users: int, commands: int, concurrency: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    engine, skins = generate(path, pragmas, users)
+    skin_cache.clear()
+    db = AsyncDatabase(scoped_session(sessionmaker(autoflush=False, bind=engine)), slow_seconds=float("inf"),
+                       group_window=group_window, group_max=group_max)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await shop(db, random.randrange(users), skins)
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(commands)))
+    elapsed = time.perf_counter() - started
+    db.close()
+    engine.dispose()
+    latencies = sorted(latencies)
+    return {
+        "shops/s": commands / elapsed,
+        "calls/s": commands * 5 / elapsed,
+        "commits/s": db.commits / elapsed,
+        "calls/commit": (commands * 5) / max(db.commits, 1),
+        "p50 ms": statistics.median(latencies) * 1000,
+        "p99 ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main(users: int, commands: int, concurrency: int):
+    results = {name: asyncio.run(run_mode(*mode, users, commands, concurrency)) for name, mode in MODES.items()}
+    columns = list(next(iter(results.values())))
+    print(f"{commands} shop commands, {concurrency} at a time")
+    print(f"{'mode':36}" + "".join(f"{column:>14}" for column in columns))
+    for name, result in results.items():
+        print(f"{name:36}" + "".join(f"{result[column]:14.1f}" for column in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--commands", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+    main(args.users, args.commands, args.concurrency)
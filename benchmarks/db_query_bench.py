@@ -0,0 +1,129 @@
+"""
+Per-command database latency before and after the index migration, on a generated dataset.
+
+    python -m benchmarks.db_query_bench --accounts 250000
+
+Every account also has a store_logs row for each day within SKIN_LOG_RETENTION_DAYS (2M rows for 250k
+accounts), and skin_daily_counts holds a year of counts. The migration does not change these tables, their
+rows show the shop dedupe and ranking latency at that size. The size and the migration of the old
+skin_logs table are measured by benchmarks/skin_log_bench.py.
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+# importing database creates the bot database in the working directory, keep it out of the repo
+os.chdir(tempfile.mkdtemp())
+
+from sqlalchemy import create_engine, func  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import setting  # noqa: E402
+from database import Base, User, RiotAccount, SkinLog, SkinDailyCount  # noqa: E402
+from database.migration import migrate  # noqa: E402
+
+TIMEZONES = ["Asia/Tokyo", "America/New_York", "Europe/London", "Asia/Seoul"]
+MIGRATED_INDEXES = ["ix_riot_accounts_game_name", "ix_riot_accounts_user_id", "ix_users_next_notify_at"]
+
+
+def generate(path: str, accounts: int):
+    Base.metadata.create_all(bind=create_engine(f"sqlite:///{path}"))
+    conn = sqlite3.connect(path)
+    # start from the schema before the migration
+    for index in MIGRATED_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {index}")
+    now = datetime.datetime.utcnow()
+    users, riot_accounts = [], []
+    for i in range(accounts):
+        subscribed = random.random() < 0.1
+        timezone = random.choice(TIMEZONES) if subscribed else ""
+        # migration 2 schedules the subscribers again anyway
+        next_notify_at = now + datetime.timedelta(seconds=random.randrange(86400)) if subscribed else None
+        users.append((i, "ja-JP", timezone, random.randint(0, 23), next_notify_at))
+        puuid = str(uuid.uuid4())
+        riot_accounts.append((i, f"user{i}", "ap", f"player{i}#{i % 10000}", puuid, i))
+    conn.executemany("INSERT INTO users (id, language, auto_notify_timezone, auto_notify_at, next_notify_at) "
+                     "VALUES (?, ?, ?, ?, ?)", users)
+    conn.executemany("INSERT INTO riot_accounts (uuid, username, region, game_name, puuid, user_id) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", riot_accounts)
+
+    # what the daily purge leaves: every account logged its store on each day of the retention
+    today = datetime.date.today()
+    skins = [uuid.uuid4() for _ in range(800)]
+    for day in range(setting.SKIN_LOG_RETENTION_DAYS + 1):
+        date = (today - datetime.timedelta(days=day)).isoformat()
+        conn.executemany("INSERT INTO store_logs (date, account_puuid, skin_uuids) VALUES (?, ?, ?)",
+                         [(date, uuid.UUID(a[4]).bytes, b"".join(skin.bytes for skin in random.sample(skins, 4)))
+                          for a in riot_accounts])
+    conn.executemany("INSERT INTO skin_daily_counts (date, skin_uuid, count) VALUES (?, ?, ?)",
+                     [((today - datetime.timedelta(days=day)).isoformat(), str(skin),
+                       random.randint(0, accounts * 4 // len(skins) * 2)) for day in range(365) for skin in skins])
+    conn.commit()
+    conn.close()
+    return [a[3] for a in riot_accounts], [a[4] for a in riot_accounts]
+
+
+def measure(session, game_names, puuids, repeat: int):
+    today = datetime.date.today()
+    quiet = session.query(func.min(User.next_notify_at)).scalar() - datetime.timedelta(seconds=1)
+    commands = {
+        "select menu (account by game name)": lambda: session.query(RiotAccount).filter(
+            RiotAccount._game_name == random.choice(game_names)).first(),
+        "list (accounts of user)": lambda: session.query(RiotAccount).filter(
+            RiotAccount.user_id == random.randrange(len(puuids))).all(),
+        # a tick between two deliveries, nobody is due yet
+        "autosend tick (due subscribers)": lambda: session.query(User).filter(
+            User.next_notify_at <= quiet).all(),
+        "autosend tick (next wake up)": lambda: session.query(func.min(User.next_notify_at)).scalar(),
+        "shop (store log dedupe)": lambda: session.query(SkinLog.date).filter(
+            SkinLog.date == today, SkinLog.account_puuid == random.choice(puuids)).first(),
+        "ranking (day)": lambda: SkinDailyCount.ranking(session, today, today),
+        "ranking (month)": lambda: SkinDailyCount.ranking(session, today - datetime.timedelta(days=29), today),
+    }
+    results = {}
+    for name, query in commands.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - started) * 1000)
+            session.expunge_all()
+        results[name] = statistics.mean(timings)
+    return results
+
+
+def main(accounts: int, repeat: int):
+    path = os.path.join(os.getcwd(), "bench.sqlite3")
+    started = time.perf_counter()
+    game_names, puuids = generate(path, accounts)
+    print(f"generated {accounts} accounts and {accounts * (setting.SKIN_LOG_RETENTION_DAYS + 1)} store_logs rows "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    engine = create_engine(f"sqlite:///{path}")
+    session = sessionmaker(bind=engine)()
+    before = measure(session, game_names, puuids, repeat)
+    started = time.perf_counter()
+    migrate(engine)
+    print(f"migration took {time.perf_counter() - started:.1f}s")
+    after = measure(session, game_names, puuids, repeat)
+
+    print(f"{'command':40} {'before ms':>12} {'after ms':>12} {'speedup':>9}")
+    for name in before:
+        print(f"{name:40} {before[name]:12.3f} {after[name]:12.3f} {before[name] / after[name]:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=250000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    main(args.accounts, args.repeat)
@@ -0,0 +1,211 @@
+"""
+Runs one auto notify tick of the bot against a local stub of the Riot endpoints.
+
+    python -m benchmarks.notify_engine_bench --users 10000 --latency 0.05
+    python -m benchmarks.notify_engine_bench --users 10000 --unpaced --no-preauth
+
+Every user of a fresh bot database subscribes to the same hour. The accounts are logged in ahead of time by
+preauth_due like in the PREAUTH_MINUTES before the hour, then the tick runs as store_content_notify does:
+_enqueue_due_notifies claims the jobs and the NotifyEngine of ValorantStoreBot delivers them through
+_run_notify_job, fetch_storefront, RiotFetcher and valclient.AsyncClient, ending with NotifyJob.finish.
+The riot hosts resolve to the stub, which serves TLS with a self-signed certificate. Only discord is left out,
+the DMs are counted instead. The requests are paced by RATE_LIMITS like in the bot, --unpaced lifts the limits.
+The tick is expected to finish within NOTIFY_TICK_SECONDS for NOTIFY_USERS_PER_TICK users.
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import os
+import socket
+import ssl
+import sys
+import tempfile
+import time
+import uuid
+from typing import List
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+# the bot database is created in the working directory, keep it out of the repo and away from DATABASE_URL
+os.chdir(tempfile.mkdtemp())
+os.environ["DATABASE_URL"] = "sqlite:///valorant-store-bot.sqlite3"
+
+import aiohttp  # noqa: E402
+from aiohttp import web  # noqa: E402
+from aiohttp.abc import AbstractResolver  # noqa: E402
+from cryptography import x509  # noqa: E402
+from cryptography.hazmat.primitives import hashes, serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import ec  # noqa: E402
+from cryptography.x509.oid import NameOID  # noqa: E402
+from sqlalchemy import func  # noqa: E402
+
+from client import ValorantStoreBot  # noqa: E402
+from database import Base, NotifyJob, User, Weapon  # noqa: E402
+from database.user import RiotAccount  # noqa: E402
+from database.weapon import SKIN_LEVEL_ICON_URL  # noqa: E402
+from services.rate_governor import BucketConfig, RateGovernor  # noqa: E402
+from setting import HTTP_POOL_SIZE, HTTP_POOL_SIZE_PER_HOST, HTTP_KEEPALIVE_SECONDS, NOTIFY_TICK_SECONDS, \
+    PREAUTH_MINUTES, RATE_LIMIT_MAX_WAIT_SECONDS, RATE_LIMIT_RETRIES  # noqa: E402
+
+REGIONS = ["ap", "na", "eu", "kr", "latam", "br"]
+PUUIDS = uuid.UUID("6f1d7c3e-0b8a-4f55-9d8e-2a4b1c9e7f10")
+
+
+def puuid_of(username: str) -> str:
+    return str(uuid.uuid5(PUUIDS, username))
+
+
+def build_stub(latency: float, offers: List[str]) -> web.Application:
+    """the riot endpoints a delivery needs, an access token carries the username it was issued for"""
+    async def authorization(request: web.Request):
+        await asyncio.sleep(latency)
+        if request.method == "PUT":
+            username = (await request.json())["username"]
+            return web.json_response({"type": "response", "response": {"parameters": {
+                "uri": f"https://playvalorant.com/opt_in#access_token={username}&id_token=id&expires_in=3600"}}})
+        return web.json_response({"type": "auth"})
+
+    async def entitlements(_: web.Request):
+        await asyncio.sleep(latency)
+        return web.json_response({"entitlements_token": "entitlements"})
+
+    async def userinfo(request: web.Request):
+        await asyncio.sleep(latency)
+        return web.json_response({"sub": puuid_of(request.headers["Authorization"][len("Bearer "):])})
+
+    async def storefront(_: web.Request):
+        await asyncio.sleep(latency)
+        return web.json_response({"SkinsPanelLayout": {"SingleItemOffers": offers}})
+
+    app = web.Application()
+    app.router.add_route("*", "/api/v1/authorization", authorization)
+    app.router.add_post("/api/token/v1", entitlements)
+    app.router.add_post("/userinfo", userinfo)
+    app.router.add_get("/store/v2/storefront/{puuid}", storefront)
+    return app
+
+
+def self_signed_context() -> ssl.SSLContext:
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "riot stub")])
+    now = datetime.datetime.utcnow()
+    certificate = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key()) \
+        .serial_number(x509.random_serial_number()).not_valid_before(now) \
+        .not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256())
+    with open("stub.pem", "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain("stub.pem")
+    return context
+
+
+class StubResolver(AbstractResolver):
+    """every host is the stub"""
+
+    def __init__(self, port: int):
+        self.port = port
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET):
+        return [{"hostname": host, "host": "127.0.0.1", "port": self.port, "family": socket.AF_INET,
+                 "proto": 0, "flags": socket.AI_NUMERICHOST}]
+
+    async def close(self):
+        pass
+
+
+class StubUser:
+    def __init__(self, messages: collections.Counter, uid: int):
+        self.messages = messages
+        self.uid = uid
+
+    async def send(self, content=None, embeds=None):
+        self.messages["store" if embeds else "text"] += 1
+
+
+class BenchBot(ValorantStoreBot):
+    """the bot without discord, the DMs it would send are counted"""
+
+    def __init__(self):
+        super().__init__("!")
+        self.messages: collections.Counter = collections.Counter()
+
+    async def get_user_promised(self, uid: int) -> StubUser:
+        return StubUser(self.messages, uid)
+
+
+def add_users(session, users: int, fire_at: datetime.datetime, offers: List[str]):
+    """auto notify subscribers that are all due at fire_at, and the offered skins in the catalog"""
+    session.execute(Weapon.__table__.insert(), [
+        {"uuid": offer + "en-US", "display_name": f"skin {offer}",
+         "display_icon": SKIN_LEVEL_ICON_URL.format(uuid=offer)} for offer in offers])
+    session.execute(User.__table__.insert(), [
+        {"id": i, "language": "en-US", "auto_notify_timezone": "UTC", "auto_notify_at": fire_at.hour,
+         "auto_notify_flag": True, "next_notify_at": fire_at} for i in range(users)])
+    session.execute(RiotAccount.__table__.insert(), [
+        {"username": f"user{i}", "password": "password", "region": REGIONS[i % len(REGIONS)],
+         "puuid": puuid_of(f"user{i}"), "user_id": i} for i in range(users)])
+    session.commit()
+
+
+async def main(users: int, latency: float, port: int, unpaced: bool, preauth: bool):
+    offers = [str(uuid.uuid4()) for _ in range(4)]
+    runner = web.AppRunner(build_stub(latency, offers), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port, ssl_context=self_signed_context()).start()
+
+    bot = BenchBot()
+    Base.metadata.create_all(bind=bot.database.get_bind())
+    # the session of valclient.new_session, with riot resolving to the stub and its certificate accepted
+    bot.fetcher._http_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, limit_per_host=HTTP_POOL_SIZE_PER_HOST,
+                                       keepalive_timeout=HTTP_KEEPALIVE_SECONDS, resolver=StubResolver(port),
+                                       ssl=False),
+        cookie_jar=aiohttp.DummyCookieJar(), timeout=aiohttp.ClientTimeout(total=10))
+    if unpaced:
+        unlimited = BucketConfig(rate=1e6, burst=1e6, min_rate=1e6, max_rate=1e6)
+        bot.fetcher.governor = RateGovernor({kind: unlimited for kind in ("auth", "region", "proxy")},
+                                            max_wait=RATE_LIMIT_MAX_WAIT_SECONDS, retries=RATE_LIMIT_RETRIES)
+
+    fire_at = datetime.datetime.utcnow().replace(microsecond=0) + datetime.timedelta(minutes=1)
+    await bot.db.run(add_users, users, fire_at, offers)
+    # as in on_ready, the cluster takes its notify buckets before the loops run
+    await bot.renew_leases()
+    if preauth:
+        # what preauth_loop does during the PREAUTH_MINUTES before the hour
+        started = time.monotonic()
+        preauthed = await bot.preauth_due()
+        print(f"preauth: {preauthed} in {time.monotonic() - started:.1f}s (window {PREAUTH_MINUTES * 60}s)")
+
+    # one tick of store_content_notify at the hour
+    started = time.monotonic()
+    jobs = await bot.db.run(bot._enqueue_due_notifies, fire_at)
+    stats = await bot.notify_engine.run(jobs)
+    elapsed = time.monotonic() - started
+
+    statuses = await bot.db.run(lambda session: dict(
+        session.query(NotifyJob.status, func.count()).group_by(NotifyJob.status).all()))
+    slowest = bot.db.slowest(6)
+    await bot.fetcher.close()
+    bot.db.close()
+    await runner.cleanup()
+    print(stats)
+    print(f"jobs: {statuses}, DMs: {dict(bot.messages)}, logins: {dict(bot.fetcher.login_sources)}")
+    print(f"tick: {elapsed:.1f}s, finished inside one tick ({NOTIFY_TICK_SECONDS}s): {elapsed < NOTIFY_TICK_SECONDS}")
+    print(f"database: {bot.db.batches} batches")
+    for query_stats in slowest:
+        print(f"  {query_stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unpaced", action="store_true", help="no RATE_LIMITS pacing")
+    parser.add_argument("--no-preauth", dest="preauth", action="store_false",
+                        help="every delivery logs in, like a bot started right at the hour")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.latency, args.port, args.unpaced, args.preauth))
@@ -0,0 +1,159 @@
+"""
+Size and speed of the store log before and after the store_logs migration, on a generated year of stores.
+
+    python -m benchmarks.skin_log_bench --accounts 2000
+
+The old skin_logs table gets 4 rows per account and day (2.9M rows for 2000 accounts). The same data is
+migrated twice: keeping the whole year in store_logs (the format alone), and with SKIN_LOG_RETENTION_DAYS
+(format and retention, the older days only remain in skin_daily_counts). Sizes are of the whole database
+file after VACUUM.
+"""
+import argparse
+import datetime
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+# importing database creates the bot database in the working directory, keep it out of the repo
+os.chdir(tempfile.mkdtemp())
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+import setting  # noqa: E402
+from database import Base  # noqa: E402
+from database.migration import migrate  # noqa: E402
+
+DAYS = 365
+
+
+def generate(path: str, accounts: int):
+    Base.metadata.create_all(bind=create_engine(f"sqlite:///{path}"))
+    conn = sqlite3.connect(path)
+    # the table and indexes of skin_logs before version 3, versions 1 and 2 are applied already
+    conn.execute("CREATE TABLE skin_logs (id INTEGER NOT NULL PRIMARY KEY, account_puuid VARCHAR, date DATE, "
+                 "skin_uuid VARCHAR)")
+    conn.execute("CREATE INDEX ix_skin_logs_date ON skin_logs (date)")
+    conn.execute("CREATE INDEX ix_skin_logs_account_puuid_date ON skin_logs (account_puuid, date)")
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    conn.executemany("INSERT INTO schema_version (version) VALUES (?)", [(1,), (2,)])
+    today = datetime.date.today()
+    skins = [str(uuid.uuid4()) for _ in range(400)]
+    puuids = [str(uuid.uuid4()) for _ in range(accounts)]
+    for day in range(DAYS):
+        date = (today - datetime.timedelta(days=day)).isoformat()
+        conn.executemany("INSERT INTO skin_logs (account_puuid, date, skin_uuid) VALUES (?, ?, ?)",
+                         [(puuid, date, skin) for puuid in puuids for skin in random.sample(skins, 4)])
+    conn.commit()
+    conn.close()
+    return puuids, skins
+
+
+def file_size(path: str) -> int:
+    conn = sqlite3.connect(path)
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(path)
+
+
+def timed(query, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        query()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.mean(timings)
+
+
+def measure(path: str, compact: bool, puuids, skins, repeat: int):
+    conn = sqlite3.connect(path)
+    today = datetime.date.today().isoformat()
+    if compact:
+        def key(puuid):
+            return uuid.UUID(puuid).bytes
+
+        lookup = "SELECT date FROM store_logs WHERE date = ? AND account_puuid = ?"
+
+        def log_store(puuid):
+            conn.execute("INSERT INTO store_logs (date, account_puuid, skin_uuids) VALUES (?, ?, ?) "
+                         "ON CONFLICT DO NOTHING",
+                         (today, key(puuid), b"".join(uuid.UUID(skin).bytes for skin in random.sample(skins, 4))))
+    else:
+        def key(puuid):
+            return puuid
+
+        lookup = "SELECT id FROM skin_logs WHERE date = ? AND account_puuid = ? LIMIT 1"
+
+        def log_store(puuid):
+            if conn.execute(lookup, (today, puuid)).fetchone() is None:
+                conn.executemany("INSERT INTO skin_logs (account_puuid, date, skin_uuid) VALUES (?, ?, ?)",
+                                 [(puuid, today, skin) for skin in random.sample(skins, 4)])
+
+    def new_store():
+        # the skin_daily_counts upsert is the same in both versions and left out
+        log_store(str(uuid.uuid4()))
+        conn.commit()
+
+    results = {
+        "shop dedupe (is today's store logged)": timed(
+            lambda: conn.execute(lookup, (today, key(random.choice(puuids)))).fetchone(), repeat),
+        "log a store": timed(new_store, repeat),
+    }
+    conn.close()
+    return results
+
+
+def migrate_copy(path: str, copy: str, retention_days: int) -> float:
+    shutil.copy(path, copy)
+    setting.SKIN_LOG_RETENTION_DAYS = retention_days
+    engine = create_engine(f"sqlite:///{copy}")
+    started = time.perf_counter()
+    migrate(engine)
+    elapsed = time.perf_counter() - started
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT COUNT(*) FROM store_logs")).scalar()
+    engine.dispose()
+    print(f"migration keeping {retention_days} days: {elapsed:.1f}s, {rows} store_logs rows")
+    return elapsed
+
+
+def main(accounts: int, repeat: int):
+    retention_days = setting.SKIN_LOG_RETENTION_DAYS
+    path = os.path.join(os.getcwd(), "old.sqlite3")
+    started = time.perf_counter()
+    puuids, skins = generate(path, accounts)
+    print(f"generated {accounts * DAYS * 4} skin_logs rows in {time.perf_counter() - started:.1f}s")
+
+    year, retained = os.path.join(os.getcwd(), "year.sqlite3"), os.path.join(os.getcwd(), "retained.sqlite3")
+    migrate_copy(path, year, DAYS + 1)
+    migrate_copy(path, retained, retention_days)
+
+    sizes = {
+        "skin_logs, 4 rows per store": file_size(path),
+        f"store_logs, {DAYS} days": file_size(year),
+        f"store_logs, {retention_days} days": file_size(retained),
+    }
+    print(f"{'database':36} {'MiB':>10} {'of before':>10}")
+    for name, size in sizes.items():
+        print(f"{name:36} {size / 2 ** 20:10.1f} {size / sizes['skin_logs, 4 rows per store']:10.1%}")
+
+    before = measure(path, False, puuids, skins, repeat)
+    after = measure(year, True, puuids, skins, repeat)
+    print(f"{'query':40} {'before ms':>12} {'after ms':>12} {'speedup':>9}")
+    for name in before:
+        print(f"{name:40} {before[name]:12.3f} {after[name]:12.3f} {before[name] / after[name]:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+    main(args.accounts, args.repeat)
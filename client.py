@@ -1,22 +1,40 @@
 import asyncio
+import collections
+import concurrent.futures
 import functools
 import logging
-import random
-from datetime import datetime
-from typing import Optional, List, Callable
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Optional, List, Callable, Dict, Awaitable, TypeVar
 
 import discord
-import pytz
 import sqlalchemy.orm
-from discord.embeds import EmptyEmbed
 from discord.ext import commands
 
 import valclient
-from database import session, Weapon
+from database import session, AsyncDatabase, Weapon, SkinLog, SkinDailyCount, NotifyJob, cookie_storage_enabled
 from database.user import RiotAccount, User
-from setting import INITIAL_EXTENSIONS
+from database.weapon import skin_cache
+from services import NotifyEngine, StorefrontCache
+from services.catalog_loader import refresh_catalog
+from services.cluster import ClusterConfig, ClusterLeases
+from services.fetch_worker import FetchPool
+from services.health import HealthServer
+from services.notify_scheduler import reschedule, local_date, FIRE_WINDOW
+from services.proxy_pool import ProxyPool
+from services.rank import tier_name
+from services.riot_fetcher import RiotFetcher
+from services.store_renderer import build_store_embeds, send_store
+from setting import INITIAL_EXTENSIONS, BLOCKING_WORKERS, HTTP_POOL_SIZE, NOTIFY_TICK_SECONDS, NOTIFY_CONCURRENCY, \
+    NOTIFY_REGION_CONCURRENCY, NOTIFY_USER_DEADLINE_SECONDS, NOTIFY_JOB_MAX_ATTEMPTS, NOTIFY_JOB_BACKOFF_SECONDS, \
+    NOTIFY_JOB_RETENTION_DAYS, CLUSTER_LEASE_SECONDS, HEALTH_HOST, PROXY_FILE, SUPPORTED_LANGUAGES, CATALOG_REFRESH_HOURS, \
+    CATALOG_FILE, PREAUTH_MINUTES, PREAUTH_INTERVAL_SECONDS, DB_SLOW_QUERY_SECONDS, \
+    DB_GROUP_COMMIT_MS, DB_GROUP_COMMIT_MAX, SKIN_LOG_RETENTION_DAYS
 from valclient.auth import InvalidCredentialError, RateLimitedError
 
+T = TypeVar("T")
+
 
 def build_logger() -> logging.Logger:
     sth = logging.StreamHandler()
@@ -27,47 +45,52 @@ def build_logger() -> logging.Logger:
     return logging.getLogger(__name__)
 
 
-with open("proxies.txt", "r", encoding="utf-8") as f:
-    proxies = f.read().splitlines()
-
-premium_proxies = proxies[:(int(len(proxies) / 4))]
-normal_proxies = proxies[(int(len(proxies) / 4) * 3):]
-
-
-def get_link(link: str) -> str:
-    splited = link.split(":")
-    return f"http://{splited[2]}:{splited[3]}@{splited[0]}:{splited[1]}"
-
-
-def get_proxy_url(is_premium: bool):
-    if is_premium:
-        link = get_link(random.choice(premium_proxies))
-    else:
-        link = get_link(random.choice(normal_proxies))
-    return {
-        "http": link,
-        "https": link
-    }
-
-
 class ValorantStoreBot(commands.AutoShardedBot):
-    def __init__(self, prefix: str, intents: Optional[discord.Intents] = None):
-        super().__init__(prefix, intents=intents, max_messages=None, help_command=None)
+    def __init__(self, prefix: str, intents: Optional[discord.Intents] = None,
+                 fetch_pool: Optional[FetchPool] = None, cluster: Optional[ClusterConfig] = None,
+                 health_port: Optional[int] = None):
+        self.cluster = cluster or ClusterConfig()
+        super().__init__(prefix, intents=intents, max_messages=None, help_command=None,
+                         shard_ids=self.cluster.shard_ids, shard_count=self.cluster.shard_count)
         for c in INITIAL_EXTENSIONS:
             self.load_extension(c)
 
+        # the session for code running in the executor, everything on the event loop goes through self.db
         self.database: sqlalchemy.orm.Session = session
         self.logger: logging.Logger = build_logger()
+        self.db = AsyncDatabase(session, DB_SLOW_QUERY_SECONDS, self.logger,
+                                group_window=DB_GROUP_COMMIT_MS / 1000, group_max=DB_GROUP_COMMIT_MAX)
         self.admins: List[int] = [753630696295235605]
+        self.notify_engine: NotifyEngine[NotifyJob] = NotifyEngine(
+            self._run_notify_job,
+            key=lambda job: job.user.auto_notify_account.region if job.user.auto_notify_account else "",
+            global_limit=NOTIFY_CONCURRENCY, region_limit=NOTIFY_REGION_CONCURRENCY,
+            deadline=NOTIFY_USER_DEADLINE_SECONDS, logger=self.logger)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=BLOCKING_WORKERS)
+        self.proxies = ProxyPool(PROXY_FILE)
+        self.fetcher = RiotFetcher(self.db, self.proxies, HTTP_POOL_SIZE)
+        self.token_cache: valclient.TokenCache = self.fetcher.token_cache
+        self.login_sources: collections.Counter = self.fetcher.login_sources
+        # storefronts are fetched by the worker processes when the bot runs as the gateway
+        self.fetch_pool = fetch_pool
+        self.storefront_cache = StorefrontCache()
+        self.notify_wakeup = asyncio.Event()
+        self.leases = ClusterLeases(self.cluster, CLUSTER_LEASE_SECONDS, self.logger)
+        # user id -> the next_notify_at its account was logged in ahead for
+        self.preauthed: Dict[int, datetime] = {}
+        self._background_started = False
+        self.health: Optional[HealthServer] = None
+        if health_port is not None:
+            self.health = HealthServer(self.health_status, HEALTH_HOST, health_port)
 
     async def update_account_profile(self, user: User, account: RiotAccount):
         cl = await self.login_valorant(user, account)
         if not cl:
             return
-        name = await self.run_blocking_func(cl.fetch_player_name)
+        name = await cl.fetch_player_name()
         account.puuid = cl.puuid
         account.game_name = f"{name[0]['GameName']}#{name[0]['TagLine']}"
-        self.database.commit()
+        await self.db.run(RiotAccount.update_profile, account.uuid, account.puuid, account.game_name)
 
     async def get_user_promised(self, uid: int) -> discord.User:
         u = self.get_user(uid)
@@ -75,90 +98,318 @@ class ValorantStoreBot(commands.AutoShardedBot):
             u = await self.fetch_user(uid)
         return u
 
-    async def login_valorant(self, user: User, account: RiotAccount) -> Optional[valclient.Client]:
-        cl = self.new_valorant_client_api(user.is_premium, account)
-        user_d = await self.get_user_promised(account.user_id)
+    async def _call_riot(self, user: User, coro: Awaitable[T], notify: bool = True) -> Optional[T]:
+        """await a riot login or request, None is returned when it fails and the user gets a DM if notify"""
         try:
-            await self.run_blocking_func(cl.activate)
+            return await coro
         except RateLimitedError:
+            if not notify:
+                return None
+            user_d = await self.get_user_promised(user.id)
             await user_d.send(user.get_text("現在サーバーが込み合っており、取得ができませんでした。後程お試しください",
                                             "The server is currently busy and could not retrieve the data. Please try again later."))
             return None
         except InvalidCredentialError:
+            if not notify:
+                return None
+            user_d = await self.get_user_promised(user.id)
             await user_d.send(user.get_text("ログインの情報に誤りがあります。\n再度「登録」コマンドを利用してログイン情報を登録してください",
                                             "Invalid credentials, Please use the [register] command again to register your login information."))
+            return None
         except Exception as e:
             self.logger.error(f"failed to login valorant client", exc_info=e)
+            if not notify:
+                return None
+            user_d = await self.get_user_promised(user.id)
             await user_d.send(user.get_text("不明なエラーが発生しました。管理者までお問い合わせください。",
                                             "An unknown error has occurred. Please contact the administrator."))
             return None
-        account.puuid = cl.puuid
-        return cl
+
+    async def login_valorant(self, user: User, account: RiotAccount) -> Optional[valclient.AsyncClient]:
+        return await self._call_riot(user, self.fetcher.login(user.is_premium, account))
+
+    async def fetch_storefront(self, user: User, account: RiotAccount, notify: bool = True) -> Optional[Dict]:
+        # the store does not change until it resets, so a known puuid needs neither a login nor a request
+        offers = self.storefront_cache.get(account._puuid)
+        if offers is not None:
+            return offers
+        if self.fetch_pool is not None:
+            result = await self._call_riot(user, self.fetcher.flights.run(
+                ("remote storefront", account.uuid), lambda: self.fetch_pool.storefront(account.uuid, user.is_premium)), notify)
+            if result is None:
+                return None
+            account.puuid = result["puuid"]
+            offers = result["offers"]
+        else:
+            offers = await self._call_riot(user, self.fetcher.storefront(user.is_premium, account), notify)
+            if offers is None:
+                return None
+        self.storefront_cache.put(account.puuid, offers)
+        return offers
+
+    def _enqueue_due_notifies(self, session: sqlalchemy.orm.Session, now: datetime) -> List[NotifyJob]:
+        """schedule the next delivery of the users that are due and claim the runnable jobs"""
+        query = session.query(User).filter(User.next_notify_at <= now)
+        user_filter = self.leases.user_filter(User.id)
+        if user_filter is not None:
+            query = query.filter(user_filter)
+        due = []
+        for user in query.all():
+            try:
+                fired_at = user.next_notify_at
+                user.next_notify_at = reschedule(user.auto_notify_timezone, user.auto_notify_at, fired_at, now)
+                # skip deliveries whose hour already passed while the bot was down
+                if now < fired_at + FIRE_WINDOW:
+                    due.append((user.id, local_date(user.auto_notify_timezone, fired_at)))
+            except Exception as e:
+                user.next_notify_at = None
+                self.logger.error("failed to schedule store content notify", exc_info=e)
+        NotifyJob.enqueue_many(session, due, now)
+        session.commit()
+        return NotifyJob.claim(session, now, user_filter=self.leases.user_filter(NotifyJob.user_id))
+
+    def _next_notify_time(self, session: sqlalchemy.orm.Session) -> Optional[datetime]:
+        next_notify = session.query(sqlalchemy.func.min(User.next_notify_at))
+        user_filter = self.leases.user_filter(User.id)
+        if user_filter is not None:
+            next_notify = next_notify.filter(user_filter)
+        next_times = [t for t in (next_notify.scalar(),
+                                  NotifyJob.next_attempt(session, self.leases.user_filter(NotifyJob.user_id)))
+                      if t is not None]
+        return min(next_times) if next_times else None
+
+    def _renew_leases(self, session: sqlalchemy.orm.Session) -> List[int]:
+        orphaned = self.leases.renew(session, datetime.utcnow())
+        for bucket in orphaned:
+            # jobs the previous holder of the bucket was running when it stopped
+            recovered = NotifyJob.recover(session, NotifyJob.user_id % self.cluster.clusters == bucket)
+            if recovered:
+                self.logger.info(f"store content notify: resuming {recovered} interrupted deliveries")
+        return orphaned
+
+    async def renew_leases(self):
+        if await self.db.run(self._renew_leases):
+            self.notify_wakeup.set()
+
+    async def cluster_lease_loop(self):
+        while True:
+            await asyncio.sleep(CLUSTER_LEASE_SECONDS / 3)
+            try:
+                await self.renew_leases()
+            except Exception as e:
+                self.logger.error("failed to renew cluster leases", exc_info=e)
 
     async def store_content_notify(self):
+        purged_at = None
+        while True:
+            self.notify_wakeup.clear()
+            now = datetime.utcnow()
+            try:
+                jobs = await self.db.run(self._enqueue_due_notifies, now)
+                if jobs:
+                    stats = await self.notify_engine.run(jobs)
+                    self.logger.info(f"store content notify: {stats}")
+                    continue
+
+                if self.leases.is_leader and (purged_at is None or now - purged_at > timedelta(days=1)):
+                    await self.db.run(NotifyJob.purge, now - timedelta(days=NOTIFY_JOB_RETENTION_DAYS))
+                    await self.db.run(SkinLog.purge, now.date() - timedelta(days=SKIN_LOG_RETENTION_DAYS))
+                    purged_at = now
+
+                # sleep until the next subscriber or retry is due, the autosend command wakes us up on schedule changes
+                next_time = await self.db.run(self._next_notify_time)
+                delay = (next_time - now).total_seconds() if next_time is not None else NOTIFY_TICK_SECONDS
+            except Exception as e:
+                self.logger.error("failed to run store content notify", exc_info=e)
+                # back off for a tick instead of retrying a failing database right away
+                delay = NOTIFY_TICK_SECONDS
+            try:
+                await asyncio.wait_for(self.notify_wakeup.wait(), timeout=max(min(delay, NOTIFY_TICK_SECONDS), 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_notify_job(self, job: NotifyJob) -> bool:
+        ok = False
+        retry = True
+        try:
+            if job.user.auto_notify_account is None:
+                # the account was removed after the job was queued, retrying cannot help
+                self.logger.warning(f"store content notify of user {job.user_id} failed: no auto notify account")
+                retry = False
+                return ok
+            # the user only hears about the error when the last attempt fails too
+            ok = await self._notify_store_content(job.user, notify=job.attempts >= NOTIFY_JOB_MAX_ATTEMPTS)
+            return ok
+        finally:
+            # also runs when the engine cancels the delivery at its deadline
+            await self.db.run(NotifyJob.finish, job.id, ok, datetime.utcnow(), NOTIFY_JOB_MAX_ATTEMPTS,
+                              NOTIFY_JOB_BACKOFF_SECONDS, retry)
+
+    async def _notify_store_content(self, user: User, notify: bool = True) -> bool:
+        offers = await self.fetch_storefront(user, user.auto_notify_account, notify)
+        if offers is None:
+            return False
+        u = await self.get_user_promised(user.id)
+        skins = await self.db.run(Weapon.get_many, offers.get("SkinsPanelLayout", {}).get("SingleItemOffers", []),
+                                  user.language)
+        await send_store(u, build_store_embeds(skins, user),
+                         content=user.get_text("本日のストアの内容をお送りします。", "Here's what's in your valorant store today"))
+        return True
+
+    def _refresh_catalog(self):
+        try:
+            counts = refresh_catalog(self.database, SUPPORTED_LANGUAGES, path=CATALOG_FILE)
+            self.logger.info(f"skin catalog refreshed: {counts}")
+            return counts
+        finally:
+            # runs in the executor, drop the session of this thread
+            self.database.remove()
+
+    async def catalog_refresh_loop(self):
+        # the first refresh is part of warm_up
         while True:
-            await asyncio.sleep(60)
-            users = self.database.query(User).filter(User.auto_notify_timezone != "").all()
-            for user in users:
-                try:
-                    now_hour = datetime.now().astimezone(pytz.timezone(user.auto_notify_timezone)).hour
-                    if now_hour == user.auto_notify_at:
-                        if user.auto_notify_flag is True:
-                            continue
-                        user.auto_notify_flag = True
-                        cl = await self.login_valorant(user, user.auto_notify_account)
-                        if not cl:
-                            self.database.commit()
-                            return
-                        u = await self.get_user_promised(user.id)
-                        await u.send(
-                            content=user.get_text("本日のストアの内容をお送りします。", "Here's what's in your valorant store today"))
-                        offers = await self.run_blocking_func(cl.store_fetch_storefront)
-                        for offer_uuid in offers.get("SkinsPanelLayout", {}).get("SingleItemOffers", []):
-                            skin = Weapon.get_promised(self.database, offer_uuid, user)
-                            embed = discord.Embed(title=skin.display_name, color=0xff0000,
-                                                  url=skin.streamed_video if skin.streamed_video else EmptyEmbed,
-                                                  description=user.get_text("↑から動画が見れます",
-                                                                            "You can watch the video at↑") if skin.streamed_video else EmptyEmbed)
-                            embed.set_author(name="valorant shop",
-                                             icon_url="https://pbs.twimg.com/profile_images/1403218724681777152/rcOjWkLv_400x400.jpg")
-                            embed.set_image(url=skin.display_icon)
-                            await u.send(embed=embed)
-                    else:
-                        user.auto_notify_flag = False
-                except Exception as e:
-                    self.logger.error("failed to notify store content", exc_info=e)
-            self.database.commit()
+            await asyncio.sleep(CATALOG_REFRESH_HOURS * 60 * 60)
+            try:
+                if self.leases.is_leader:
+                    await self.run_blocking_func(self._refresh_catalog)
+            except Exception as e:
+                self.logger.error("failed to refresh skin catalog", exc_info=e)
+
+    def _preload_skins(self) -> int:
+        """the skins offered most over the last week, as many as the cache holds in every language"""
+        try:
+            today = datetime.utcnow().date()
+            hot = [uuid for uuid, _ in SkinDailyCount.ranking(self.database, today - timedelta(days=7), today,
+                                                              limit=skin_cache.max_size // len(SUPPORTED_LANGUAGES))]
+            return sum(Weapon.preload(self.database, hot, language) for language in SUPPORTED_LANGUAGES)
+        finally:
+            self.database.remove()
+
+    async def _preauth(self, user: User) -> bool:
+        try:
+            if self.fetch_pool is not None:
+                await self.fetch_pool.login(user.auto_notify_account.uuid, user.is_premium)
+            else:
+                await self.fetcher.login(user.is_premium, user.auto_notify_account)
+            return True
+        except Exception as e:
+            # no message to the user here, the delivery logs in again and reports what went wrong
+            self.logger.info(f"preauth of user {user.id} failed: {e!r}")
+            return False
+
+    def _users_due_soon(self, session: sqlalchemy.orm.Session, now: datetime) -> List[User]:
+        query = session.query(User).filter(User.next_notify_at > now,
+                                           User.next_notify_at <= now + timedelta(minutes=PREAUTH_MINUTES))
+        user_filter = self.leases.user_filter(User.id)
+        if user_filter is not None:
+            query = query.filter(user_filter)
+        return query.all()
+
+    async def preauth_due(self) -> str:
+        """log in the auto notify accounts due within PREAUTH_MINUTES, each once per delivery"""
+        now = datetime.utcnow()
+        due = {user: user.next_notify_at for user in await self.db.run(self._users_due_soon, now)
+               if user.auto_notify_account is not None and self.preauthed.get(user.id) != user.next_notify_at}
+        semaphore = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+
+        async def preauth(user: User) -> bool:
+            async with semaphore:
+                return await self._preauth(user)
+
+        results = await asyncio.gather(*(preauth(user) for user in due))
+        self.preauthed = {user_id: at for user_id, at in self.preauthed.items() if at > now}
+        self.preauthed.update((user.id, at) for user, at in due.items())
+        return f"{sum(results)}/{len(results)} accounts"
+
+    async def preauth_loop(self):
+        while True:
+            await asyncio.sleep(PREAUTH_INTERVAL_SECONDS)
+            try:
+                await self.preauth_due()
+            except Exception as e:
+                self.logger.error("failed to preauth auto notify accounts", exc_info=e)
+
+    async def _warm_up_stage(self, name: str, stage: Callable[[], Awaitable]):
+        started = time.perf_counter()
+        try:
+            result = await stage()
+        except Exception as e:
+            self.logger.error(f"warm-up {name} failed", exc_info=e)
+            return
+        self.logger.info(f"warm-up {name}: {time.perf_counter() - started:.2f}s ({result})")
+
+    async def warm_up(self):
+        """preload what the first stores and deliveries need, then keep doing it in the background"""
+        started = time.perf_counter()
+        if self.leases.is_leader:
+            await self._warm_up_stage("catalog", lambda: self.run_blocking_func(self._refresh_catalog))
+        await self._warm_up_stage("skin cache", lambda: self.run_blocking_func(self._preload_skins))
+        await self._warm_up_stage("preauth", self.preauth_due)
+        self.logger.info(f"warm-up done in {time.perf_counter() - started:.2f}s")
+        asyncio.ensure_future(self.catalog_refresh_loop())
+        asyncio.ensure_future(self.preauth_loop())
 
     async def run_blocking_func(self, blocking_func: Callable, *args, **kwargs):
         loop = asyncio.get_event_loop()
         function = functools.partial(blocking_func, *args, **kwargs)
-        return await loop.run_in_executor(None, function)
-
-    def new_valorant_client_api(self, is_premium: bool,
-                                account: RiotAccount) -> valclient.Client:
-        if account.is_not_valid:
-            return valclient.Client()
-        proxy = get_proxy_url(is_premium)
-        return valclient.Client(region=account.region, auth={
-            "username": account.username,
-            "password": account.password
-        }, proxy=proxy)
-
-    def get_valorant_rank_tier(self, cl: valclient.Client) -> str:
-        tier_to_name = ["UNRANKED", "Unused1", "Unused2", "IRON 1", "IRON 2", "IRON 3", "BRONZE 1",
-                        "BRONZE 2", "BRONZE 3", "SILVER 1", "SILVER 2", "SILVER 3", "GOLD 1", "GOLD 2",
-                        "GOLD 3", "PLATINUM 1", "PLATINUM 2", "PLATINUM 3", "DIAMOND 1", "DIAMOND 2",
-                        "DIAMOND 3", "IMMORTAL 1", "IMMORTAL 2", "IMMORTAL 3", "RADIANT"]
-        result = cl.fetch_competitive_updates()
-        try:
-            tier = result["Matches"][0]["TierAfterUpdate"]
-        except IndexError:
-            return "Failed to get rank tier"
-        return tier_to_name[tier]
+        return await loop.run_in_executor(self.executor, function)
+
+    def new_valorant_client_api(self, is_premium: bool, account: RiotAccount,
+                                cookies: Optional[Dict[str, str]] = None) -> valclient.AsyncClient:
+        return self.fetcher.new_client(is_premium, account, cookies=cookies)
+
+    async def get_valorant_rank_tier(self, cl: valclient.AsyncClient, language: str = "en-US") -> str:
+        return tier_name(await self.fetcher.client_rank(cl), language)
+
+    async def fetch_rank(self, user: User, account: RiotAccount) -> Optional[str]:
+        tier = await self._call_riot(user, self.fetcher.rank(user.is_premium, account))
+        if tier is None:
+            return None
+        return tier_name(tier, user.language)
 
     async def on_ready(self):
         print(f"bot started: {self.user}")
         await self.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name="Valorant store"))
 
+        # the background tasks below only work on what the leases give to this cluster
+        await self.renew_leases()
+        # on_ready fires again after every reconnect, the loops must only be started once
+        if self._background_started:
+            return
+        self._background_started = True
+        asyncio.ensure_future(self.cluster_lease_loop())
         asyncio.ensure_future(self.store_content_notify())
+        asyncio.ensure_future(self.warm_up())
+
+    def health_status(self) -> Dict:
+        shards = {
+            shard_id: {
+                "connected": not shard.is_closed(),
+                "latency_ms": round(shard.latency * 1000) if math.isfinite(shard.latency) else None,
+            } for shard_id, shard in self.shards.items()
+        }
+        return {
+            "cluster": self.cluster.cluster_id,
+            "clusters": self.cluster.clusters,
+            "healthy": self.is_ready() and bool(shards) and all(s["connected"] for s in shards.values()),
+            "shards": shards,
+            "guilds": len(self.guilds),
+            "notify_buckets": sorted(self.leases.buckets),
+            "db_queued": self.db.queued,
+            "cookie_storage": "enabled" if cookie_storage_enabled() else "disabled",
+            "last_notify": str(self.notify_engine.last_stats) if self.notify_engine.last_stats else None,
+        }
+
+    async def start(self, *args, **kwargs):
+        if self.health is not None:
+            await self.health.start()
+        await super().start(*args, **kwargs)
+
+    async def close(self):
+        if self.health is not None:
+            await self.health.stop()
+        await self.db.run(self.leases.release)
+        await self.fetcher.close()
+        if self.fetch_pool is not None:
+            self.fetch_pool.close()
+        await super().close()
@@ -1,20 +1,22 @@
 import asyncio
-import collections
 import random
+import time
 from datetime import timedelta, datetime
 from typing import Union, Callable, Dict, List
 
 import discord
 import pytz
 from discord import Interaction
-from discord.embeds import EmptyEmbed
 from discord.ext import commands
 from discord.ext.commands import Context
 
 from client import ValorantStoreBot
-from database import User, Weapon, Guild, SkinLog
+from database import User, Weapon, Guild, SkinLog, SkinDailyCount, RiotSession, cookie_storage_enabled
 from database.user import RiotAccount
-from sqlalchemy import func as sqlalchemy_func
+from database.weapon import skin_cache
+from services.notify_scheduler import schedule
+from services.rate_governor import format_histogram
+from services.store_renderer import build_store_embeds, build_night_store_embeds, send_store, render_stats
 
 from valclient.auth import InvalidCredentialError, RateLimitedError
 
@@ -25,12 +27,12 @@ class CommandsHandler(commands.Cog):
 
     @commands.command("help", aliases=["ヘルプ"])
     async def help_message(self, ctx: Context):
-        user = User.get_promised(self.bot.database, ctx.message.author.id)
+        user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
         with open(user.get_text("assets/help_ja.txt", "assets/help_en.txt"), encoding="utf-8") as f:
             await ctx.send(f.read())
 
     async def list_account_and_execute(self, ctx: Context, func: Callable):
-        user = User.get_promised(self.bot.database, ctx.message.author.id)
+        user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
 
         view = discord.ui.View(timeout=60)
         accounts = user.riot_accounts
@@ -71,19 +73,24 @@ class CommandsHandler(commands.Cog):
         await view.wait()
 
     @commands.command("ranking", aliases=["ランキング"])
-    async def skin_ranking(self, ctx: Context):
-        user = User.get_promised(self.bot.database, ctx.message.author.id)
-        logs: List[SkinLog] = self.bot.database.query(SkinLog).filter(
-            sqlalchemy_func.DATE(SkinLog.date) == datetime.today().date()).all()
-        if len(logs) == 0:
-            await ctx.send(user.get_text(
-                "まだ今日は誰もBOTを利用していないようです。データが見つかりませんでした。",
-                "No one seems to be using the BOT today yet. No data was found."
-            ))
+    async def skin_ranking(self, ctx: Context, window: str = "day"):
+        user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
+        days = {"week": 7, "週間": 7, "month": 30, "月間": 30}.get(window, 1)
+        today = datetime.today().date()
+        ranking = await self.bot.db.run(SkinDailyCount.ranking, today - timedelta(days=days - 1), today, limit=4)
+        if len(ranking) == 0:
+            if days == 1:
+                await ctx.send(user.get_text(
+                    "まだ今日は誰もBOTを利用していないようです。データが見つかりませんでした。",
+                    "No one seems to be using the BOT today yet. No data was found."
+                ))
+            else:
+                await ctx.send(user.get_text(
+                    f"この{days}日間は誰もBOTを利用していないようです。データが見つかりませんでした。",
+                    f"No one seems to have used the BOT in the last {days} days. No data was found."
+                ))
             return
-        data = [log.skin_uuid for log in logs]
-        skin_data, _ = zip(*collections.Counter(data).most_common())
-        await self._send_store_content(skin_data[:4], user, ctx)
+        await self._send_store_content([skin_uuid for skin_uuid, _ in ranking], user, ctx)
 
     @commands.command("autosend", aliases=["自動送信"])
     async def setup_auto_send(self, ctx: Context):
@@ -91,9 +98,8 @@ class CommandsHandler(commands.Cog):
         def wrapper(view: discord.ui.View):
             async def select_auto_send_time(interaction: Interaction):
                 await interaction.response.send_message(content="processing your request....wait a moment...")
-                account: RiotAccount = self.bot.database.query(RiotAccount).filter(
-                    RiotAccount._game_name == interaction.data["values"][0]).first()
-                user = User.get_promised(self.bot.database, ctx.message.author.id)
+                account: RiotAccount = await self.bot.db.run(RiotAccount.get_by_game_name, interaction.data["values"][0])
+                user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
                 if not user.is_premium:
                     await ctx.send(user.get_text("この機能はプレミアムユーザー限定です。\n詳細は「プレミアム」コマンドを参照してください",
                                                  "This feature is only available to Premium users.\ntype [premium] commands for details"))
@@ -144,10 +150,9 @@ class CommandsHandler(commands.Cog):
                     view.stop()
                     return
 
-                user.auto_notify_at = int(time.content)
-                user.auto_notify_timezone = timezone
-                user.auto_notify_account = account
-                self.bot.database.commit()
+                await self.bot.db.run(User.set_auto_notify, user.id, account.uuid, timezone, int(time.content),
+                                      schedule(timezone, int(time.content), datetime.utcnow()))
+                self.bot.notify_wakeup.set()
                 view.stop()
                 await ctx.send(user.get_text(
                     f"時刻を{timezone}の{time.content}時に設定しました。\n現在時刻は{datetime.now().astimezone(pytz.timezone(timezone))}です。",
@@ -162,16 +167,9 @@ class CommandsHandler(commands.Cog):
         if ctx.message.author.id not in self.bot.admins:
             return
         mentioned_ids = [user.id for user in ctx.message.mentions]
-        for user_id in mentioned_ids:
-            user = User.get_promised(self.bot.database, user_id)
-            if not month.isdigit():
-                month = "1"
-            if not user.is_premium:
-                user.premium_until = datetime.now() + timedelta(days=31 * int(month))
-            else:
-                user.premium_until += timedelta(days=31 * int(month))
-            user.is_premium = True
-        self.bot.database.commit()
+        if not month.isdigit():
+            month = "1"
+        await self.bot.db.run(User.add_premium, mentioned_ids, int(month))
         await ctx.send(f"Congratulations! now a premium user: {len(mentioned_ids)}")
 
     @commands.command("unpremium")
@@ -179,47 +177,106 @@ class CommandsHandler(commands.Cog):
         if ctx.message.author.id not in self.bot.admins:
             return
         mentioned_ids = [user.id for user in ctx.message.mentions]
-        for user_id in mentioned_ids:
-            user = User.get_promised(self.bot.database, user_id)
-            user.is_premium = False
-            user.premium_until = None
-        self.bot.database.commit()
+        await self.bot.db.run(User.remove_premium, mentioned_ids)
         await ctx.send(f"now not a premium user: {len(mentioned_ids)}")
 
+    @commands.command("stats")
+    async def show_stats(self, ctx: Context):
+        if ctx.message.author.id not in self.bot.admins:
+            return
+        sources = self.bot.login_sources
+        cookies = "enabled" if cookie_storage_enabled() else "disabled (COOKIE_ENCRYPTION_KEY is not set)"
+        await ctx.send(f"logins: cache={sources['cache']} cookie={sources['cookie']} credentials={sources['credentials']}\n"
+                       f"cookie storage {cookies}\n"
+                       f"token cache: size={len(self.bot.token_cache)} hits={self.bot.token_cache.hits} "
+                       f"misses={self.bot.token_cache.misses}\n"
+                       f"storefront cache: size={len(self.bot.storefront_cache)} hits={self.bot.storefront_cache.hits} "
+                       f"misses={self.bot.storefront_cache.misses}\n"
+                       f"skin cache: size={len(skin_cache)} hits={skin_cache.hits} misses={skin_cache.misses}\n"
+                       f"stores sent: {render_stats.stores} messages per store={render_stats.messages_per_store:.2f}\n"
+                       f"proxies: total={len(self.bot.proxies)} quarantined={len(self.bot.proxies.quarantined())}\n"
+                       f"coalesced riot calls: {self.bot.fetcher.flights.coalesced} of {self.bot.fetcher.flights.calls}\n"
+                       f"rate limit queue: {self.bot.fetcher.governor.queue_depth} waiting, "
+                       f"waits {format_histogram(self.bot.fetcher.governor.histogram()) or '-'}\n"
+                       f"database: {self.bot.db.queued} queued, "
+                       f"{sum(s.calls for s in self.bot.db.stats.values()) - self.bot.db.commits} calls "
+                       f"in {self.bot.db.commits} commits")
+
+    @commands.command("dbstats")
+    async def show_database_stats(self, ctx: Context, count: int = 15):
+        if ctx.message.author.id not in self.bot.admins:
+            return
+        # the calls that took the most time in total first
+        await ctx.send("\n".join(str(stats) for stats in self.bot.db.slowest(count)) or "no database calls yet")
+
+    @commands.command("ratelimits")
+    async def show_rate_limits(self, ctx: Context, count: int = 15):
+        if ctx.message.author.id not in self.bot.admins:
+            return
+        buckets = sorted(self.bot.fetcher.governor.buckets.items(),
+                         key=lambda item: (item[1].waiting, item[1].limited_count), reverse=True)[:count]
+        lines = [f"{kind} {name.rsplit('@', 1)[-1]}: rate={b.rate:.1f}/s waiting={b.waiting} limited={b.limited_count} "
+                 f"waits {format_histogram(b.histogram) or '-'}" for (kind, name), b in buckets]
+        await ctx.send("\n".join(lines) or "no riot requests yet")
+
+    @commands.command("proxies")
+    async def show_proxies(self, ctx: Context, count: int = 15):
+        if ctx.message.author.id not in self.bot.admins:
+            return
+        now = time.monotonic()
+        # the least successful first
+        proxies = sorted(self.bot.proxies.proxies.values(), key=lambda p: p.success_rate)[:count]
+        lines = []
+        for p in proxies:
+            latency = f"{p.latency * 1000:.0f}ms" if p.latency is not None else "-"
+            quarantine = f" quarantined {p.quarantined_until - now:.0f}s" if not p.is_healthy(now) else ""
+            lines.append(f"{p.address}{' (premium)' if p.premium else ''}: requests={p.requests} "
+                         f"success={p.success_rate:.0%} rate_limited={p.rate_limited} latency={latency} "
+                         f"accounts={p.accounts}{quarantine}")
+        await ctx.send("\n".join(lines) or "no proxies")
+
     @commands.command("onlyhere", aliases=["コマンド制限"])
     @commands.has_permissions(administrator=True)
     async def response_only_this_channel(self, ctx: Context):
-        user = User.get_promised(self.bot.database, ctx.message.author.id)
-        guild = Guild.get_promised(self.bot.database, ctx.guild.id)
-        guild.response_here = ctx.channel.id
-        self.bot.database.commit()
+        user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
+        guild = await self.bot.db.run(Guild.set_response_here, ctx.guild.id, ctx.channel.id)
         await ctx.send(user.get_text(f"<#{guild.response_here}> のみでBOTがshopコマンドに反応するように設定しました。[everywhere]コマンドで解除できます",
                                      f"<#{guild.response_here}> only set the BOT to respond to the shop command.\nThis can be deactivated with the [everywhere] command"))
 
     @commands.command("everywhere", aliases=["コマンド解放"])
     @commands.has_permissions(administrator=True)
     async def response_only_this_channel(self, ctx: Context):
-        user = User.get_promised(self.bot.database, ctx.message.author.id)
-        guild = Guild.get_promised(self.bot.database, ctx.guild.id)
-        guild.response_here = None
-        self.bot.database.commit()
+        user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
+        await self.bot.db.run(Guild.set_response_here, ctx.guild.id, None)
         await ctx.send(user.get_text(f"すべての場所でBOTがshopコマンドに反応するように設定しました。",
                                      "All locations have been set up so that the BOT responds to shop commands."))
 
     @commands.command("rank", aliases=["ランク"])
     async def get_account_rank(self, ctx: Context):
+        user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
+        accounts = user.riot_accounts
+        if user.is_premium and len(accounts) > 1:
+            # premium users get the ranks of all their accounts at once instead of picking one
+            for account in accounts:
+                if not account._game_name:
+                    await ctx.send(user.get_text("登録されている情報を更新しています....", "updating the registered information"))
+                    await self.bot.update_account_profile(user, account)
+            tiers = await asyncio.gather(*(self.bot.fetch_rank(user, account) for account in accounts))
+            lines = [f"{account.game_name}: {tier}" for account, tier in zip(accounts, tiers)
+                     if tier is not None and account._game_name]
+            if lines:
+                await ctx.send("\n".join(lines))
+            return
 
         def wrapper(view: discord.ui.View):
             async def select_account_region(interaction: Interaction):
                 await interaction.response.send_message(content="processing your request....wait a moment...")
-                account: RiotAccount = self.bot.database.query(RiotAccount).filter(
-                    RiotAccount._game_name == interaction.data["values"][0]).first()
-                user = User.get_promised(self.bot.database, ctx.message.author.id)
-                cl = await self.bot.login_valorant(user, account)
-                if not cl:
+                account: RiotAccount = await self.bot.db.run(RiotAccount.get_by_game_name, interaction.data["values"][0])
+                user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
+                tier = await self.bot.fetch_rank(user, account)
+                if tier is None:
                     view.stop()
                     return
-                tier = await self.bot.run_blocking_func(self.bot.get_valorant_rank_tier, cl)
                 await ctx.send(tier)
 
             return select_account_region
@@ -228,7 +285,7 @@ class CommandsHandler(commands.Cog):
 
     @commands.command("list", aliases=["リスト"])
     async def list_accounts(self, ctx: Context):
-        user = User.get_promised(self.bot.database, ctx.message.author.id)
+        user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
         if len(user.riot_accounts) == 0:
             await ctx.send(user.get_text("アカウント情報が登録されていません\n[登録]コマンドを利用して登録してください",
                                          "Your account information has not been registered yet \nAdd your account information using the [register] command."))
@@ -237,7 +294,7 @@ class CommandsHandler(commands.Cog):
 
     @commands.command("update", aliases=["登録更新"])
     async def update_account(self, ctx: Context):
-        user = User.get_promised(self.bot.database, ctx.message.author.id)
+        user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
         if not isinstance(ctx.message.channel, discord.channel.DMChannel) or ctx.message.author == self.bot.user:
             await ctx.send(user.get_text("この動作は個人チャットでする必要があります。", "This action needs to be done in private chat"))
             return
@@ -253,7 +310,7 @@ class CommandsHandler(commands.Cog):
             await self.list_account_and_execute(ctx, wrapper)
             return
 
-        guild = Guild.get_promised(self.bot.database, ctx.guild.id)
+        guild = await self.bot.db.run(Guild.get_promised, ctx.guild.id)
         if guild.response_here and ctx.channel.id != guild.response_here:
             return
         await self.list_account_and_execute(ctx, wrapper)
@@ -263,9 +320,8 @@ class CommandsHandler(commands.Cog):
         def wrapper(view: discord.ui.View):
             async def select_account_region(interaction: Interaction):
                 await interaction.response.send_message(content="processing your request....wait a moment...")
-                account: RiotAccount = self.bot.database.query(RiotAccount).filter(
-                    RiotAccount._game_name == interaction.data["values"][0]).first()
-                user = User.get_promised(self.bot.database, interaction.user.id)
+                account: RiotAccount = await self.bot.db.run(RiotAccount.get_by_game_name, interaction.data["values"][0])
+                user = await self.bot.db.run(User.get_promised, interaction.user.id)
                 get_span = 20 if user.is_premium else 360
                 if account.last_get_night_shops_at and account.last_get_night_shops_at + timedelta(
                         minutes=get_span) >= datetime.now():
@@ -273,13 +329,11 @@ class CommandsHandler(commands.Cog):
                         f"最後に取得してから{get_span}分経過していません。{get_span}分に一度のみこのコマンドを実行可能です。",
                         f"It has not been {get_span} minutes since the last acquisition. this command can only be executed once every {get_span} minutes."))
                     return
-                account.last_get_night_shops_at = datetime.now()
-                self.bot.database.commit()
-                cl = await self.bot.login_valorant(user, account)
-                if not cl:
+                await self.bot.db.run(RiotAccount.mark_fetched, account.uuid, True, datetime.now())
+                offers = await self.bot.fetch_storefront(user, account)
+                if offers is None:
                     view.stop()
                     return
-                offers = await self.bot.run_blocking_func(cl.store_fetch_storefront)
                 if len(offers.get("BonusStore", {}).get("BonusStoreOffers", [])) == 0:
                     await ctx.send(user.get_text(
                         "ショップの内容が見つかりませんでした。Valorantがメンテナンス中もしくは何かの障害の可能性があります。\nそのどちらでもない場合は開発者までご連絡ください。\nhttp://valorant.sakura.rip",
@@ -292,26 +346,19 @@ class CommandsHandler(commands.Cog):
         await self._execute_shop_command_on_allowed_channel(ctx, wrapper)
 
     async def _send_night_store_content(self, offers: Dict, user: User, ctx: Context):
-        for offer in offers.get("BonusStore", {}).get("BonusStoreOffers", []):
-            skin = Weapon.get_promised(self.bot.database, offer["Offer"]["Rewards"][0]["ItemID"], user)
-            embed = discord.Embed(title=skin.display_name, color=0xff0000,
-                                  url=skin.streamed_video if skin.streamed_video else EmptyEmbed,
-                                  description=user.get_text(
-                                      f'{list(offer["Offer"]["Cost"].values())[0]}→{list(offer["DiscountCosts"].values())[0]}({offer["DiscountPercent"]}%off) ',
-                                      f'{list(offer["Offer"]["Cost"].values())[0]}→{list(offer["DiscountCosts"].values())[0]}({offer["DiscountPercent"]}%off) ') if skin.streamed_video else EmptyEmbed)
-            embed.set_author(name="valorant shop",
-                             icon_url="https://pbs.twimg.com/profile_images/1403218724681777152/rcOjWkLv_400x400.jpg")
-            embed.set_image(url=skin.display_icon)
-            await ctx.send(embed=embed)
+        night_offers = offers.get("BonusStore", {}).get("BonusStoreOffers", [])
+        skins = await self.bot.db.run(Weapon.get_many,
+                                      [offer["Offer"]["Rewards"][0]["ItemID"] for offer in night_offers],
+                                      user.language)
+        await send_store(ctx, build_night_store_embeds(night_offers, skins))
 
     @commands.command("shop", aliases=["store", "ショップ", "ストア"])
     async def fetch_today_shop(self, ctx: Context):
         def wrapper(view: discord.ui.View):
             async def select_account_region(interaction: Interaction):
                 await interaction.response.send_message(content="processing your request....wait a moment...")
-                account: RiotAccount = self.bot.database.query(RiotAccount).filter(
-                    RiotAccount._game_name == interaction.data["values"][0]).first()
-                user = User.get_promised(self.bot.database, interaction.user.id)
+                account: RiotAccount = await self.bot.db.run(RiotAccount.get_by_game_name, interaction.data["values"][0])
+                user = await self.bot.db.run(User.get_promised, interaction.user.id)
                 get_span = 10 if user.is_premium else 180
                 if account.last_get_shops_at and account.last_get_shops_at + timedelta(
                         minutes=get_span) >= datetime.now():
@@ -320,16 +367,12 @@ class CommandsHandler(commands.Cog):
                         f"It has not been {get_span} minutes since the last acquisition. this command can only be executed once every {get_span} minutes."))
                     return
 
-                account.last_get_shops_at = datetime.now()
-                self.bot.database.commit()
-                cl = await self.bot.login_valorant(user, account)
-                if not cl:
-                    account.last_get_shops_at = None
-                    self.bot.database.commit()
+                await self.bot.db.run(RiotAccount.mark_fetched, account.uuid, False, datetime.now())
+                offers = await self.bot.fetch_storefront(user, account)
+                if offers is None:
+                    await self.bot.db.run(RiotAccount.mark_fetched, account.uuid, False, None)
                     view.stop()
                     return
-                offers = await self.bot.run_blocking_func(cl.store_fetch_storefront)
-                user = User.get_promised(self.bot.database, ctx.message.author.id)
                 skins_uuids = offers.get("SkinsPanelLayout", {}).get("SingleItemOffers", [])
                 if len(skins_uuids) == 0:
                     await ctx.send(user.get_text(
@@ -341,13 +384,7 @@ class CommandsHandler(commands.Cog):
                                                  "The night market is open.！\nLet's check it with the command `nightmarket`, `ナイトストア`"))
                 await self._send_store_content(skins_uuids, user, ctx)
 
-                if self.bot.database.query(SkinLog).filter(
-                        sqlalchemy_func.DATE(SkinLog.date) == datetime.today().date(),
-                        SkinLog.account_puuid == account.puuid).count() == 0:
-                    logs = [SkinLog(account_puuid=account.puuid,
-                                    date=datetime.today().date(), skin_uuid=uuid) for uuid in skins_uuids]
-                    self.bot.database.add_all(logs)
-                    self.bot.database.commit()
+                await self.bot.db.run(SkinLog.add_logs_once, account.puuid, datetime.today().date(), skins_uuids)
 
                 view.stop()
 
@@ -356,21 +393,12 @@ class CommandsHandler(commands.Cog):
         await self._execute_shop_command_on_allowed_channel(ctx, wrapper)
 
     async def _send_store_content(self, offers: List[str], user: User, ctx: Context):
-        for offer_uuid in offers:
-            skin = Weapon.get_promised(self.bot.database, offer_uuid, user)
-
-            embed = discord.Embed(title=skin.display_name, color=0xff0000,
-                                  url=skin.streamed_video if skin.streamed_video else EmptyEmbed,
-                                  description=user.get_text("↑から動画が見れます",
-                                                            "You can watch the video at↑") if skin.streamed_video else EmptyEmbed)
-            embed.set_author(name="valorant shop",
-                             icon_url="https://pbs.twimg.com/profile_images/1403218724681777152/rcOjWkLv_400x400.jpg")
-            embed.set_image(url=skin.display_icon)
-            await ctx.send(embed=embed)
+        skins = await self.bot.db.run(Weapon.get_many, list(offers), user.language)
+        await send_store(ctx, build_store_embeds(skins, user))
 
     @commands.command("randommap", aliases=["ランダムマップ"])
     async def random_map(self, ctx: Context):
-        user = User.get_promised(self.bot.database, ctx.message.author.id)
+        user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
         if user.language == "ja-JP":
             maps = ["アセント", "スプリット", "バインド", "ブリーズ", "アイスボックス", "ヘイブン", "フラクチャー"]
         else:
@@ -383,9 +411,7 @@ class CommandsHandler(commands.Cog):
 
         def button_pushed_lang(lang: str):
             async def button_pushed(interaction: Interaction):
-                db_user = User.get_promised(self.bot.database, interaction.user.id)
-                db_user.language = lang
-                self.bot.database.commit()
+                db_user = await self.bot.db.run(User.set_language, interaction.user.id, lang)
                 await interaction.channel.send(db_user.get_text("更新しました", "updated"))
 
             return button_pushed
@@ -402,7 +428,7 @@ class CommandsHandler(commands.Cog):
 
     @commands.command("premium", aliases=["プレミアム"])
     async def get_premium_details(self, ctx: Context):
-        user = User.get_promised(self.bot.database, ctx.message.author.id)
+        user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
         embed = discord.Embed(title=user.get_text("プレミアムユーザーの詳細", "Premium User Details"),
                               description=user.get_text(
                                   "Valorant store botの利用者は、プレミアムユーザーになることで以下の特典を得ることができます(月額500円. paypay/linepay/paypal/btc/ltc)",
@@ -445,7 +471,7 @@ class CommandsHandler(commands.Cog):
 
     @commands.command("register", aliases=["登録"])
     async def register_riot_account(self, ctx: Context):
-        user = User.get_promised(self.bot.database, ctx.message.author.id)
+        user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
         if not isinstance(ctx.message.channel, discord.channel.DMChannel) or ctx.message.author == self.bot.user:
             await ctx.send(user.get_text("ログイン情報の登録が必要です。\n個人チャットで登録を進めてください",
                                          "You need to register your login information. Please proceed to register in \n personal chat"))
@@ -469,12 +495,11 @@ Use the `premium` or `プレミアム` commands to get the details of premium us
         await self.register_riot_user_internal(ctx.message.author)
 
     async def register_riot_user_internal(self, to: Union[discord.Member, discord.User]):
-        user = User.get_promised(self.bot.database, to.id)
+        user = await self.bot.db.run(User.get_promised, to.id)
 
         if user.try_activate_count >= 3:
             if user.activation_locked_at + timedelta(minutes=10) < datetime.now():
-                user.try_activate_count = 0
-                user.activation_locked_at = None
+                await self.bot.db.run(User.unlock_activation, user.id)
             else:
                 await to.send(user.get_text(f"ログインの試行回数上限に達しました。({user.try_activate_count}回)\n10分後に再度お試しください。",
                                             f"The maximum number of login attempts has been reached. ({user.try_activate_count} times)\nplease try again 10 minutes later,."))
@@ -563,16 +588,15 @@ Use the `premium` or `プレミアム` commands to get the details of premium us
             return
         riot_account.password = password.content
         await to.send(user.get_text("確認中です...", "checking...."))
-        user.try_activate_count += 1
-        cl = self.bot.new_valorant_client_api(user.is_premium, riot_account)
+        user = await self.bot.db.run(User.count_activation, user.id)
         try:
-            await self.bot.run_blocking_func(cl.activate)
+            cl = self.bot.new_valorant_client_api(user.is_premium, riot_account)
+            await cl.activate()
         except InvalidCredentialError:
             if user.try_activate_count >= 3:
-                user.activation_locked_at = datetime.now()
+                await self.bot.db.run(User.lock_activation, user.id, datetime.now())
                 await to.send(user.get_text(f"ログインの試行回数上限に達しました。({user.try_activate_count}回)\n10分後に再度お試しください。",
                                             f"The maximum number of login attempts has been reached. ({user.try_activate_count} times)\nplease try again 10 minutes later,."))
-                self.bot.database.commit()
                 return
             await to.send(user.get_text(
                 "ログインの情報に誤りがあります。\n再度「登録」コマンドを利用してログイン情報を登録してください。",
@@ -587,14 +611,12 @@ Use the `premium` or `プレミアム` commands to get the details of premium us
             await to.send(user.get_text("不明なエラーが発生しました。管理者までお問い合わせください。",
                                         "An unknown error has occurred. Please contact the administrator."))
             return None
-        user.try_activate_count = 0
-        user.activation_locked_at = None
-        name = await self.bot.run_blocking_func(cl.fetch_player_name)
+        name = await cl.fetch_player_name()
         riot_account.game_name = f"{name[0]['GameName']}#{name[0]['TagLine']}"
         riot_account.puuid = cl.puuid
-        user.riot_accounts.append(riot_account)
-        self.bot.database.commit()
-        tier = await self.bot.run_blocking_func(self.bot.get_valorant_rank_tier, cl)
+        riot_account = await self.bot.db.run(User.add_riot_account, user.id, riot_account)
+        await self.bot.db.run(RiotSession.save_cookies, riot_account.uuid, cl.auth.cookies)
+        tier = await self.bot.get_valorant_rank_tier(cl, user.language)
         await to.send(user.get_text(
             f"ログイン情報の入力が完了しました。\n{riot_account.game_name}\nRANK: {tier}",
             f"Your login information has been entered.\n{riot_account.game_name}\nRANK: {tier}"
@@ -602,7 +624,7 @@ Use the `premium` or `プレミアム` commands to get the details of premium us
 
     @commands.command("unregister", aliases=["登録解除"])
     async def unregister_riot_account(self, ctx: Context):
-        user = User.get_promised(self.bot.database, ctx.message.author.id)
+        user = await self.bot.db.run(User.get_promised, ctx.message.author.id)
 
         if not isinstance(ctx.message.channel, discord.channel.DMChannel) or ctx.message.author == self.bot.user:
             await ctx.send(user.get_text("この動作は個人チャットでする必要があります。", "This action needs to be done in private chat"))
@@ -616,16 +638,13 @@ Use the `premium` or `プレミアム` commands to get the details of premium us
                 f"It has not been {get_span} minutes since the last deletion. this command can only be executed once every {get_span} minutes."))
             return
 
-        user.last_account_deleted_at = datetime.now()
-        self.bot.database.commit()
+        await self.bot.db.run(User.mark_account_deleted, user.id, datetime.now())
 
         def wrapper(view: discord.ui.View):
             async def select_account_region(interaction: Interaction):
                 await interaction.response.send_message(content="processing your request....wait a moment...")
-                account = self.bot.database.query(RiotAccount).filter(
-                    RiotAccount._game_name == interaction.data["values"][0]).first()
-                self.bot.database.delete(account)
-                self.bot.database.commit()
+                account = await self.bot.db.run(RiotAccount.delete_by_game_name, interaction.data["values"][0])
+                self.bot.token_cache.invalidate(account.uuid)
                 view.stop()
                 await ctx.send(user.get_text(f"{account.username}: 完了しました", f"{account.username}: Done"))
 
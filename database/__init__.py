@@ -1,7 +1,14 @@
 from .guild import Guild
 from .user import User, RiotAccount
 from .weapon import Weapon
-from .skin_log import SkinLog
+from .skin_log import SkinLog, SkinDailyCount
+from .riot_session import RiotSession, cookie_storage_enabled
+from .notify_job import NotifyJob
+from .cluster_lease import ClusterLease
+from .chunked_migration import ChunkedMigration, MigrationCheckpoint
 from .setting import Base, ENGINE, session
+from .async_database import AsyncDatabase
+from .migration import migrate
 
 Base.metadata.create_all(bind=ENGINE)
+migrate(ENGINE)
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+
+from sqlalchemy.orm import Session, SessionTransaction, scoped_session
+
+T = TypeVar("T")
+
+
+class QueryStats:
+    """latency of one kind of database call, named after the function that ran it"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        # time spent in the queue before the database thread picked the call up
+        self.wait_seconds = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.calls if self.calls else 0.0
+
+    def __str__(self):
+        return f"{self.name}: calls={self.calls} errors={self.errors} mean={self.mean_seconds * 1000:.1f}ms " \
+               f"max={self.max_seconds * 1000:.1f}ms queued={self.wait_seconds / max(self.calls, 1) * 1000:.1f}ms"
+
+
+class BatchAborted(Exception):
+    """the transaction of a batch was lost, none of its calls were stored"""
+
+
+class BatchSession(Session):
+    """
+    Session of the writer thread. While a call of a batch runs, its commit() and rollback() only
+    end its own savepoint, the batch is committed once after the last call.
+    """
+    savepoint: Optional[SessionTransaction] = None
+
+    def commit(self):
+        if self.savepoint is None:
+            return super().commit()
+        self.flush()
+        self.savepoint.commit()
+        self.savepoint = self.begin_nested()
+
+    def rollback(self):
+        if self.savepoint is None:
+            return super().rollback()
+        if not self.rollback_savepoint():
+            raise BatchAborted("the transaction of the batch was lost")
+        self.savepoint = self.begin_nested()
+
+    def rollback_savepoint(self) -> bool:
+        """
+        roll back the savepoint of the running call, False when the transaction of the batch is gone with it.
+        A savepoint whose flush failed is no longer active but still has to be rolled back.
+        """
+        try:
+            self.savepoint.rollback()
+        except Exception:
+            return False
+        transaction = self.get_transaction()
+        return transaction is not None and transaction.is_active and self.get_nested_transaction() is None
+
+
+class _Call(NamedTuple):
+    func: Callable
+    args: Tuple
+    kwargs: Dict[str, Any]
+    future: concurrent.futures.Future
+    queued_at: float
+
+
+COMMIT = "(commit)"
+
+
+class AsyncDatabase:
+    """
+    The database work of the bot, done by one writer thread so that a slow query or a commit does
+    not stall the event loop and with it every shard.
+
+    `await db.run(func, *args)` runs func(session, *args) on that thread. Calls arriving within
+    group_window seconds of each other (at most group_max) share one transaction and one commit,
+    every call in its own savepoint so that a call that raises only loses its own changes. An error
+    that takes the whole transaction with it (or a failed commit) fails every call of the batch with
+    BatchAborted, the writer goes on with the next batch. A call returns once the commit of its batch
+    is done. The session is closed after every batch, the ORM objects a call returns are detached and
+    their columns and eagerly loaded relationships can be read on the event loop without any SQL.
+    Changes are made by another run, not by assigning to a returned object.
+    """
+
+    def __init__(self, sessions: scoped_session, slow_seconds: float, logger: Optional[logging.Logger] = None,
+                 group_window: float = 0.0, group_max: int = 1):
+        self.sessions = sessions
+        self.slow_seconds = slow_seconds
+        self.logger = logger or logging.getLogger(__name__)
+        self.group_window = group_window
+        self.group_max = group_max
+        # written by the writer thread, read by the event loop
+        self._stats: Dict[str, QueryStats] = {}
+        self._stats_lock = threading.Lock()
+        self.queued = 0
+        self.batches = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._write_loop, name="database", daemon=True)
+        self._thread.start()
+
+    def _write_loop(self):
+        # objects keep their values after the commit, refreshing them would mean SQL on the event loop
+        session = BatchSession(**dict(self.sessions.session_factory.kw, expire_on_commit=False))
+        # the scoped session resolves to this one on the writer thread, also for code using it directly
+        self.sessions.registry.set(session)
+        while True:
+            call = self._queue.get()
+            if call is None:
+                return
+            batch = [call]
+            deadline = time.perf_counter() + self.group_window
+            while len(batch) < self.group_max:
+                try:
+                    call = self._queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if call is None:
+                    # finish this batch, then stop
+                    self._queue.put(None)
+                    break
+                batch.append(call)
+            try:
+                self._run_batch(session, batch)
+            except Exception as e:
+                # the thread has to outlive any error, or every caller waits forever
+                self.logger.error("database batch failed", exc_info=e)
+                for call in batch:
+                    if not call.future.done():
+                        call.future.set_exception(BatchAborted(repr(e)))
+                self._discard(session)
+
+    def _discard(self, session: BatchSession):
+        session.savepoint = None
+        try:
+            session.rollback()
+        except Exception as e:
+            self.logger.error("database rollback failed", exc_info=e)
+        try:
+            session.close()
+        except Exception as e:
+            self.logger.error("closing the database session failed", exc_info=e)
+
+    def _run_batch(self, session: BatchSession, batch: List[_Call]):
+        results = []
+        # the error that cost the batch its transaction
+        lost: Optional[Exception] = None
+        for call in batch:
+            started = time.perf_counter()
+            try:
+                session.savepoint = session.begin_nested()
+                result = call.func(session, *call.args, **call.kwargs)
+                session.flush()
+                session.savepoint.commit()
+                results.append((result, None))
+            except Exception as e:
+                results.append((None, e))
+                if session.savepoint is None or not session.rollback_savepoint():
+                    lost = e
+            finally:
+                session.savepoint = None
+                self._record(getattr(call.func, "__qualname__", repr(call.func)), results[-1][1] is None,
+                             started - call.queued_at, time.perf_counter() - started)
+            if lost is not None:
+                break
+
+        started = time.perf_counter()
+        committed = False
+        try:
+            if lost is None:
+                session.commit()
+                committed = True
+        except Exception as e:
+            lost = e
+        finally:
+            if committed:
+                session.close()
+            else:
+                self._discard(session)
+            self.batches += 1
+            self._record(COMMIT, committed, 0, time.perf_counter() - started)
+
+        if lost is not None:
+            # nothing of the batch was stored, the other calls fail as well
+            aborted = BatchAborted(f"the transaction of the batch was lost: {lost!r}")
+            results = [(None, error if error is lost else aborted) for _, error in results]
+            results += [(None, aborted)] * (len(batch) - len(results))
+        for call, (result, error) in zip(batch, results):
+            if error is not None:
+                call.future.set_exception(error)
+            else:
+                call.future.set_result(result)
+
+    def _record(self, name: str, ok: bool, wait: float, elapsed: float):
+        with self._stats_lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = QueryStats(name)
+            stats.calls += 1
+            stats.errors += not ok
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            stats.wait_seconds += wait
+        if elapsed >= self.slow_seconds:
+            self.logger.warning(f"slow database call {name}: {elapsed:.3f}s")
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        if self._thread is None:
+            self._start()
+        future = concurrent.futures.Future()
+        self.queued += 1
+        try:
+            self._queue.put(_Call(func, args, kwargs, future, time.perf_counter()))
+            # a caller that is cancelled does not take back its call, the writer runs it anyway
+            return await asyncio.shield(asyncio.wrap_future(future))
+        finally:
+            self.queued -= 1
+
+    @property
+    def stats(self) -> Dict[str, QueryStats]:
+        """copy of the stats by call name, safe to iterate while the writer keeps recording"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    @property
+    def commits(self) -> int:
+        stats = self.stats.get(COMMIT)
+        return stats.calls if stats else 0
+
+    def slowest(self, count: int) -> List[QueryStats]:
+        return sorted(self.stats.values(), key=lambda s: s.total_seconds, reverse=True)[:count]
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
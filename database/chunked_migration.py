@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import datetime
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Column, Integer, String, DATETIME, func, inspect, select, tuple_
+from sqlalchemy.engine import Connection, Engine, Row
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.schema import Table
+
+from .setting import Base
+
+
+class MigrationCheckpoint(Base):
+    """how far a ChunkedMigration got, kept in the target database"""
+    __tablename__ = "migration_checkpoints"
+
+    name: str = Column("name", String, primary_key=True)
+    # json list of the key values of the last row moved
+    last_key: str = Column("last_key", String)
+    rows: int = Column("rows", Integer, nullable=False, default=0)
+    updated_at: datetime.datetime = Column("updated_at", DATETIME)
+
+
+def _dump_key(values: Sequence[Any]) -> str:
+    return json.dumps([v.isoformat() if isinstance(v, datetime.date) else v for v in values])
+
+
+def _load_key(key: Sequence[ColumnElement], dumped: str) -> Tuple:
+    values = []
+    for column, value in zip(key, json.loads(dumped)):
+        python_type = column.type.python_type
+        if value is not None and python_type in (datetime.date, datetime.datetime):
+            value = python_type.fromisoformat(value)
+        values.append(value)
+    return tuple(values)
+
+
+class ChunkedMigration:
+    """
+    Moves the rows of a source query into tables of the target database, chunk_size rows at a time.
+
+    The query is read in key order with yield_per, so only one chunk is in memory however big the table is.
+    convert turns a source row into (table, values) pairs and the values of a chunk go in with one multi-row
+    insert per table. The key of the last row is saved in migration_checkpoints in the same transaction as
+    the chunk, a run that was interrupted continues right after it. A dry run reads and converts every row
+    and writes nothing.
+    """
+
+    def __init__(self, name: str, source: Engine, target: Engine, query: Select, key: Sequence[ColumnElement],
+                 convert: Callable[[Row], Iterable[Tuple[Table, Dict[str, Any]]]], chunk_size: int = 5000,
+                 dry_run: bool = False):
+        self.name = name
+        self.source = source
+        self.target = target
+        self.query = query
+        self.key = list(key)
+        self.convert = convert
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        # values written (or that would be written) per table
+        self.written: Dict[str, int] = {}
+
+    def checkpoint(self) -> Optional[MigrationCheckpoint]:
+        # a dry run may look at a target without the schema
+        if not inspect(self.target).has_table(MigrationCheckpoint.__tablename__):
+            return None
+        with Session(bind=self.target) as session:
+            return session.query(MigrationCheckpoint).get(self.name)
+
+    def reset(self):
+        """forget the checkpoint, the next run starts from the first row"""
+        with self.target.begin() as conn:
+            conn.execute(MigrationCheckpoint.__table__.delete().where(MigrationCheckpoint.name == self.name))
+
+    def _remaining(self, last_key: Optional[Tuple]) -> Select:
+        query = self.query
+        if last_key is not None:
+            if len(self.key) == 1:
+                query = query.where(self.key[0] > last_key[0])
+            else:
+                query = query.where(tuple_(*self.key) > tuple_(*last_key))
+        return query.order_by(*self.key)
+
+    def _write(self, conn: Connection, rows: List[Row], moved: int, stored: bool):
+        values: Dict[Table, List[Dict[str, Any]]] = {}
+        for row in rows:
+            for table, row_values in self.convert(row):
+                values.setdefault(table, []).append(row_values)
+        # parents before children, whatever order convert returned them in
+        for table in sorted(values, key=Base.metadata.sorted_tables.index):
+            if not self.dry_run:
+                conn.execute(table.insert(), values[table])
+            self.written[table.name] = self.written.get(table.name, 0) + len(values[table])
+        if self.dry_run:
+            return
+
+        checkpoint_table = MigrationCheckpoint.__table__
+        state = {"last_key": _dump_key([rows[-1]._mapping[column] for column in self.key]),
+                 "rows": moved + len(rows),
+                 "updated_at": datetime.datetime.utcnow()}
+        if stored:
+            conn.execute(checkpoint_table.update().where(checkpoint_table.c.name == self.name), state)
+        else:
+            conn.execute(checkpoint_table.insert(), dict(state, name=self.name))
+
+    def run(self) -> int:
+        """move the rows after the checkpoint, returns how many were read"""
+        checkpoint = self.checkpoint()
+        last_key = _load_key(self.key, checkpoint.last_key) if checkpoint and checkpoint.last_key else None
+        query = self._remaining(last_key)
+        label = f"{self.name} (dry run)" if self.dry_run else self.name
+        if checkpoint is not None:
+            print(f"{label}: resuming after {checkpoint.rows} rows")
+
+        # rows moved by earlier runs, and whether the checkpoint row exists already
+        moved = checkpoint.rows if checkpoint else 0
+        stored = checkpoint is not None
+        done = 0
+        started = time.perf_counter()
+        with Session(bind=self.source) as source:
+            total = source.execute(select(func.count()).select_from(query.subquery())).scalar()
+            result = source.execute(query.execution_options(yield_per=self.chunk_size))
+            for rows in result.partitions():
+                with self.target.begin() as conn:
+                    self._write(conn, rows, moved, stored)
+                done += len(rows)
+                if not self.dry_run:
+                    moved += len(rows)
+                    stored = True
+                print(f"\r{label}: {done}/{total} rows, {done / (time.perf_counter() - started):.0f} rows/s",
+                      end="", flush=True)
+        elapsed = time.perf_counter() - started
+        written = ", ".join(f"{name} {count}" for name, count in self.written.items()) or "nothing"
+        print(f"\r{label}: {done} rows in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.0f} rows/s), "
+              f"{'would write' if self.dry_run else 'wrote'} {written}")
+        return done
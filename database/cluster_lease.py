@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+import datetime
+
+from sqlalchemy import Column, Integer, DATETIME
+
+from .setting import Base
+
+
+class ClusterLease(Base):
+    """which cluster delivers the auto notifies of users with users.id % clusters == bucket"""
+    __tablename__ = "cluster_leases"
+
+    bucket: int = Column("bucket", Integer, primary_key=True, autoincrement=False)
+    holder: int = Column("holder", Integer, nullable=False)
+    expires_at: datetime.datetime = Column("expires_at", DATETIME, nullable=False)
@@ -1,16 +1,18 @@
 from __future__ import annotations
 
-from sqlalchemy import Column, Integer
+from typing import Optional
+
+from sqlalchemy import Column
 from sqlalchemy.orm import Session
 
-from .setting import Base
+from .setting import Base, DiscordId
 
 
 class Guild(Base):
     __tablename__ = "guilds"
 
-    id: int = Column("id", Integer, primary_key=True)
-    response_here: int = Column("response_here", Integer)
+    id: int = Column("id", DiscordId, primary_key=True, autoincrement=False)
+    response_here: int = Column("response_here", DiscordId)
 
     @staticmethod
     def get_promised(session: Session, uid: int) -> Guild:
@@ -21,3 +23,10 @@ class Guild(Base):
         session.add(new_guild)
         session.commit()
         return new_guild
+
+    @staticmethod
+    def set_response_here(session: Session, uid: int, channel_id: Optional[int]) -> Guild:
+        guild = Guild.get_promised(session, uid)
+        guild.response_here = channel_id
+        session.commit()
+        return guild
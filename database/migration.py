@@ -0,0 +1,126 @@
+"""
+Schema migrations for databases created by older versions of the bot.
+
+create_all() only creates missing tables, so anything added to an existing table (columns, indexes)
+has to be listed here. Migrations run in order once per database and the applied version is kept
+in the schema_version table. Write them so they are also harmless on a fresh database, where
+create_all() already built the current schema.
+"""
+from __future__ import annotations
+
+import datetime
+import itertools
+import logging
+import uuid
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import text, inspect, bindparam, DATE, DATETIME
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+
+def _add_lookup_indexes(conn: Connection):
+    # select menu callbacks look accounts up by game name
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_riot_accounts_game_name ON riot_accounts (game_name)"))
+    # relationship join user -> riot_accounts
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_riot_accounts_user_id ON riot_accounts (user_id)"))
+    # ranking and shop dedupe, skin_logs is replaced by store_logs in version 3
+    if inspect(conn).has_table("skin_logs"):
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_skin_logs_date ON skin_logs (date)"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_skin_logs_account_puuid_date ON skin_logs (account_puuid, date)"))
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl_type: str):
+    if column not in [c["name"] for c in inspect(conn).get_columns(table)]:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _add_next_notify_at(conn: Connection):
+    from services.notify_scheduler import schedule
+
+    _add_column(conn, "users", "next_notify_at", DATETIME().compile(dialect=conn.dialect))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_next_notify_at ON users (next_notify_at)"))
+    now = datetime.datetime.utcnow()
+    rows = conn.execute(text(
+        "SELECT id, auto_notify_timezone, auto_notify_at FROM users WHERE auto_notify_timezone > ''")).fetchall()
+    for uid, timezone, hour in rows:
+        conn.execute(text("UPDATE users SET next_notify_at = :at WHERE id = :id").bindparams(
+            bindparam("at", type_=DATETIME)), {"at": schedule(timezone, hour, now), "id": uid})
+
+
+def _parse_uuid(value) -> Optional[str]:
+    """the uuid in the form store_logs expects, None when value is no uuid"""
+    try:
+        return str(uuid.UUID(value))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _compact_skin_logs(conn: Connection):
+    from database.skin_log import SkinLog
+    from setting import SKIN_LOG_RETENTION_DAYS
+
+    if not inspect(conn).has_table("skin_logs"):
+        return
+    # the counts have to be built before the old rows go, for every date skin_daily_counts does not have yet
+    # (all of them on databases from before the table, only some when counts were written in between)
+    conn.execute(text(
+        "INSERT INTO skin_daily_counts (date, skin_uuid, count) "
+        "SELECT date, skin_uuid, COUNT(*) FROM skin_logs "
+        "WHERE date IS NOT NULL AND skin_uuid IS NOT NULL "
+        "AND date NOT IN (SELECT DISTINCT date FROM skin_daily_counts) "
+        "GROUP BY date, skin_uuid "
+        "ON CONFLICT (date, skin_uuid) DO NOTHING"))
+
+    # only the days within the retention go into store_logs, one row per account and day
+    since = datetime.date.today() - datetime.timedelta(days=SKIN_LOG_RETENTION_DAYS)
+    rows = conn.execute(text(
+        "SELECT account_puuid, date, skin_uuid FROM skin_logs WHERE date >= :since ORDER BY account_puuid, date, id"
+    ).bindparams(bindparam("since", type_=DATE)).columns(date=DATE), {"since": since})
+    stores = []
+    for (puuid, date), logs in itertools.groupby(rows, key=lambda row: (row.account_puuid, row.date)):
+        account_puuid = _parse_uuid(puuid)
+        if account_puuid is None:
+            continue
+        # a row that was not written by the bot only loses its own skin, not the store
+        skins = [_parse_uuid(row.skin_uuid) for row in logs]
+        stores.append({"date": date, "account_puuid": account_puuid,
+                       "skin_uuids": list(dict.fromkeys(skin for skin in skins if skin is not None))})
+        if len(stores) >= 5000:
+            conn.execute(SkinLog.__table__.insert(), stores)
+            stores = []
+    if stores:
+        conn.execute(SkinLog.__table__.insert(), stores)
+    conn.execute(text("DROP TABLE skin_logs"))
+
+
+# (version, description, migration), append only
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "add lookup indexes", _add_lookup_indexes),
+    (2, "schedule auto notify with users.next_notify_at", _add_next_notify_at),
+    (3, "replace skin_logs by one store_logs row per account and day", _compact_skin_logs),
+]
+
+
+def current_version(conn: Connection) -> int:
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return version or 0
+
+
+def migrate(engine: Engine) -> int:
+    """apply pending migrations, returns the schema version afterwards"""
+    with engine.begin() as conn:
+        version = current_version(conn)
+    for target, description, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        # one transaction per migration so a failure leaves the database at the previous version
+        with engine.begin() as conn:
+            migration(conn)
+            conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": target})
+        logger.info(f"database migrated to {target}: {description}")
+        version = target
+    return version
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Column, Integer, String, DATE, DATETIME, ForeignKey, Index, UniqueConstraint, func
+from sqlalchemy.orm import Session, lazyload, relationship
+from sqlalchemy.sql.elements import ColumnElement
+
+from .setting import Base, DiscordId, dialect_insert
+from .user import User
+
+# jobs taken by one update in NotifyJob.claim, below the bound parameter limit of every database
+CLAIM_CHUNK_SIZE = 500
+
+
+class NotifyJob(Base):
+    """one auto notify delivery, unique per user and local date so that it is never sent twice"""
+    __tablename__ = "notify_jobs"
+    __table_args__ = (
+        UniqueConstraint("user_id", "local_date"),
+        Index("ix_notify_jobs_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    id: int = Column("id", Integer, autoincrement=True, primary_key=True)
+    user_id: int = Column("user_id", DiscordId, ForeignKey("users.id"), nullable=False)
+    local_date: datetime.date = Column("local_date", DATE, nullable=False)
+    status: str = Column("status", String, nullable=False, default=PENDING)
+    attempts: int = Column("attempts", Integer, nullable=False, default=0)
+    next_attempt_at: datetime.datetime = Column("next_attempt_at", DATETIME)
+    updated_at: datetime.datetime = Column("updated_at", DATETIME)
+
+    user: User = relationship("User", lazy="selectin")
+
+    @staticmethod
+    def enqueue(session: Session, user_id: int, local_date: datetime.date, now: datetime.datetime):
+        """add a pending job, does nothing when the user already has one for that date"""
+        NotifyJob.enqueue_many(session, [(user_id, local_date)], now)
+
+    @staticmethod
+    def enqueue_many(session: Session, jobs: List[Tuple[int, datetime.date]], now: datetime.datetime):
+        """enqueue for every (user_id, local_date) pair with one statement"""
+        if not jobs:
+            return
+        session.execute(dialect_insert(session, NotifyJob).on_conflict_do_nothing(
+            index_elements=["user_id", "local_date"]
+        ), [{"user_id": user_id, "local_date": local_date, "status": NotifyJob.PENDING, "attempts": 0,
+             "next_attempt_at": now, "updated_at": now} for user_id, local_date in jobs])
+
+    @staticmethod
+    def claim(session: Session, now: datetime.datetime, limit: Optional[int] = None,
+              user_filter: Optional[ColumnElement] = None) -> List[NotifyJob]:
+        """
+        mark runnable jobs as running and return them, the caller commits.
+        The jobs are taken with conditional updates that also set updated_at to `now`, so when several processes
+        claim at the same time each job still goes to only one of them: the one whose `now` it carries.
+        """
+        query = session.query(NotifyJob.id).filter(NotifyJob.status == NotifyJob.PENDING,
+                                                   NotifyJob.next_attempt_at <= now).order_by(NotifyJob.next_attempt_at)
+        if user_filter is not None:
+            query = query.filter(user_filter)
+        if limit is not None:
+            query = query.limit(limit)
+        job_ids = [job_id for (job_id,) in query.all()]
+        claimed = []
+        for start in range(0, len(job_ids), CLAIM_CHUNK_SIZE):
+            chunk = job_ids[start:start + CLAIM_CHUNK_SIZE]
+            session.query(NotifyJob).filter(NotifyJob.id.in_(chunk), NotifyJob.status == NotifyJob.PENDING) \
+                .update({NotifyJob.status: NotifyJob.RUNNING, NotifyJob.attempts: NotifyJob.attempts + 1,
+                         NotifyJob.updated_at: now}, synchronize_session=False)
+            claimed += session.query(NotifyJob).filter(NotifyJob.id.in_(chunk), NotifyJob.status == NotifyJob.RUNNING,
+                                                       NotifyJob.updated_at == now).all()
+        return sorted(claimed, key=lambda job: job.next_attempt_at)
+
+    @staticmethod
+    def finish(session: Session, job_id: int, ok: bool, now: datetime.datetime, max_attempts: int,
+               backoff_seconds: float, retry: bool = True):
+        """a failed job runs again after a backoff until max_attempts, or fails at once when retry is False"""
+        if ok:
+            session.query(NotifyJob).filter(NotifyJob.id == job_id) \
+                .update({NotifyJob.status: NotifyJob.DONE, NotifyJob.updated_at: now}, synchronize_session=False)
+            session.commit()
+            return
+        # the user and accounts of the job are not needed to reschedule it
+        job = session.query(NotifyJob).options(lazyload(NotifyJob.user)).get(job_id)
+        job.updated_at = now
+        if not retry or job.attempts >= max_attempts:
+            job.status = NotifyJob.FAILED
+        else:
+            job.status = NotifyJob.PENDING
+            job.next_attempt_at = now + datetime.timedelta(seconds=backoff_seconds * 2 ** (job.attempts - 1))
+        session.commit()
+
+    @staticmethod
+    def next_attempt(session: Session, user_filter: Optional[ColumnElement] = None) -> Optional[datetime.datetime]:
+        query = session.query(func.min(NotifyJob.next_attempt_at)).filter(NotifyJob.status == NotifyJob.PENDING)
+        if user_filter is not None:
+            query = query.filter(user_filter)
+        return query.scalar()
+
+    @staticmethod
+    def recover(session: Session, user_filter: Optional[ColumnElement] = None) -> int:
+        """jobs left running by a crash or restart are run again"""
+        query = session.query(NotifyJob).filter(NotifyJob.status == NotifyJob.RUNNING)
+        if user_filter is not None:
+            query = query.filter(user_filter)
+        count = query.update({NotifyJob.status: NotifyJob.PENDING}, synchronize_session=False)
+        session.commit()
+        return count
+
+    @staticmethod
+    def purge(session: Session, before: datetime.datetime) -> int:
+        count = session.query(NotifyJob).filter(NotifyJob.status.in_([NotifyJob.DONE, NotifyJob.FAILED]),
+                                                NotifyJob.updated_at < before).delete(synchronize_session=False)
+        session.commit()
+        return count
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy.orm import Session
+
+from .setting import Base
+
+
+@functools.lru_cache(maxsize=None)
+def get_fernet() -> Optional[Fernet]:
+    # generate one with `python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"`
+    key = os.getenv("COOKIE_ENCRYPTION_KEY")
+    if not key:
+        return None
+    return Fernet(key)
+
+
+def cookie_storage_enabled() -> bool:
+    return get_fernet() is not None
+
+
+if not cookie_storage_enabled():
+    # nothing else tells why every login goes through the password
+    logging.getLogger(__name__).warning(
+        "COOKIE_ENCRYPTION_KEY is not set, cookie storage disabled: riot auth cookies are not saved and every "
+        "login without a cached token uses the password")
+
+
+class RiotSession(Base):
+    """riot auth cookies of an account, encrypted with COOKIE_ENCRYPTION_KEY"""
+    __tablename__ = "riot_sessions"
+
+    account_uuid: int = Column("account_uuid", Integer, ForeignKey("riot_accounts.uuid"), primary_key=True)
+    _cookies: str = Column("cookies", String)
+
+    @staticmethod
+    def load_cookies(session: Session, account_uuid: int) -> Dict[str, str]:
+        fernet = get_fernet()
+        if fernet is None or account_uuid is None:
+            return {}
+        riot_session = session.query(RiotSession).filter(RiotSession.account_uuid == account_uuid).first()
+        if riot_session is None or not riot_session._cookies:
+            return {}
+        try:
+            return json.loads(fernet.decrypt(riot_session._cookies.encode()))
+        except (InvalidToken, ValueError):
+            return {}
+
+    @staticmethod
+    def save_cookies(session: Session, account_uuid: int, cookies: Dict[str, str]):
+        fernet = get_fernet()
+        if fernet is None or account_uuid is None:
+            return
+        riot_session = session.query(RiotSession).filter(RiotSession.account_uuid == account_uuid).first()
+        if riot_session is None:
+            riot_session = RiotSession(account_uuid=account_uuid)
+            session.add(riot_session)
+        riot_session._cookies = fernet.encrypt(json.dumps(cookies).encode()).decode()
+        session.commit()
+
+    @staticmethod
+    def clear(session: Session, account_uuid: int):
+        session.query(RiotSession).filter(RiotSession.account_uuid == account_uuid).delete()
+        session.commit()
@@ -1,15 +1,111 @@
+from __future__ import annotations
+
 import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import Column, Integer, String, DATE, Index, LargeBinary, func
+from sqlalchemy.orm import Session
+from sqlalchemy.types import TypeDecorator
+
+from .setting import Base, dialect_insert
+
+
+class BinaryUuid(TypeDecorator):
+    """uuid string kept as its 16 bytes"""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[str], dialect) -> Optional[bytes]:
+        return None if value is None else UUID(value).bytes
+
+    def process_result_value(self, value: Optional[bytes], dialect) -> Optional[str]:
+        return None if value is None else str(UUID(bytes=bytes(value)))
+
 
-from sqlalchemy import Column, Integer, String, DATE
+class PackedUuids(TypeDecorator):
+    """list of uuid strings kept as 16 bytes each, one after the other"""
+    impl = LargeBinary
+    cache_ok = True
 
-from .setting import Base
+    def process_bind_param(self, value: Optional[List[str]], dialect) -> Optional[bytes]:
+        return None if value is None else b"".join(UUID(v).bytes for v in value)
+
+    def process_result_value(self, value: Optional[bytes], dialect) -> Optional[List[str]]:
+        if value is None:
+            return None
+        value = bytes(value)
+        return [str(UUID(bytes=value[i:i + 16])) for i in range(0, len(value), 16)]
 
 
 class SkinLog(Base):
-    __tablename__ = "skin_logs"
+    """
+    the skins in the store of an account on a day, one row per account and day.
+    Only today's row is read (to log every store once), older days live on in skin_daily_counts
+    and are deleted after SKIN_LOG_RETENTION_DAYS (see purge).
+    """
+    __tablename__ = "store_logs"
+    # the rows are stored in primary key order, sqlite needs no rowid and no second index
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    date: datetime.date = Column("date", DATE, primary_key=True)
+    account_puuid: str = Column("account_puuid", BinaryUuid, primary_key=True)
+    skin_uuids: List[str] = Column("skin_uuids", PackedUuids, nullable=False)
+
+    @staticmethod
+    def add_logs_once(session: Session, account_puuid: str, date: datetime.date, skin_uuids: List[str]) -> bool:
+        """
+        log the store of an account and bump the daily counts in the same transaction, unless the store
+        of the account on that date is logged already
+        """
+        result = session.execute(dialect_insert(session, SkinLog).values(
+            date=date, account_puuid=account_puuid, skin_uuids=skin_uuids
+        ).on_conflict_do_nothing(index_elements=["date", "account_puuid"]))
+        if not result.rowcount:
+            return False
+        SkinDailyCount.increment(session, date, skin_uuids)
+        session.commit()
+        return True
+
+    @staticmethod
+    def purge(session: Session, before: datetime.date) -> int:
+        count = session.query(SkinLog).filter(SkinLog.date < before).delete(synchronize_session=False)
+        session.commit()
+        return count
+
+
+class SkinDailyCount(Base):
+    """how many stores offered a skin on a day, kept up to date by SkinLog.add_logs_once and kept for good"""
+    __tablename__ = "skin_daily_counts"
+    __table_args__ = (
+        Index("ix_skin_daily_counts_date_count", "date", "count"),
+    )
+
+    date: datetime.date = Column("date", DATE, primary_key=True)
+    skin_uuid: str = Column("skin_uuid", String, primary_key=True)
+    count: int = Column("count", Integer, nullable=False, default=0)
 
-    id: int = Column("id", Integer, autoincrement=True, primary_key=True)
+    @staticmethod
+    def increment(session: Session, date: datetime.date, skin_uuids: List[str]):
+        counts = {}
+        for uuid in skin_uuids:
+            counts[uuid] = counts.get(uuid, 0) + 1
+        if not counts:
+            return
+        stmt = dialect_insert(session, SkinDailyCount).values([
+            {"date": date, "skin_uuid": uuid, "count": count} for uuid, count in counts.items()
+        ])
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=["date", "skin_uuid"],
+            set_={"count": SkinDailyCount.count + stmt.excluded.count}
+        ))
 
-    account_puuid: str = Column("account_puuid", String)
-    date: datetime.date = Column("date", DATE)
-    skin_uuid: str = Column("skin_uuid", String)
+    @staticmethod
+    def ranking(session: Session, start: datetime.date, end: datetime.date, limit: int = 4) -> List[Tuple[str, int]]:
+        """most offered skins between start and end (inclusive)"""
+        total = func.sum(SkinDailyCount.count).label("total")
+        return session.query(SkinDailyCount.skin_uuid, total) \
+            .filter(SkinDailyCount.date >= start, SkinDailyCount.date <= end) \
+            .group_by(SkinDailyCount.skin_uuid) \
+            .order_by(total.desc()) \
+            .limit(limit).all()
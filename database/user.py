@@ -1,18 +1,19 @@
 from __future__ import annotations
 
 import datetime
-from typing import List
+from typing import List, Optional
 
 from sqlalchemy import Column, Integer, String, ForeignKey, DATETIME, Boolean
 from sqlalchemy.orm import Session, relationship
 
-from .setting import Base
+from .riot_session import RiotSession
+from .setting import Base, DiscordId
 
 
 class User(Base):
     __tablename__ = "users"
 
-    id: int = Column("id", Integer, primary_key=True)
+    id: int = Column("id", DiscordId, primary_key=True, autoincrement=False)
     language: str = Column("language", String, default="ja-JP")
 
     try_activate_count: int = Column("try_activate_count", Integer, default=0)
@@ -21,12 +22,16 @@ class User(Base):
     _is_premium: bool = Column("is_premium", Boolean, default=False)
     premium_until: datetime.datetime = Column("premium_until", DATETIME)
 
-    riot_accounts: List[RiotAccount] = relationship("RiotAccount", backref="users")
+    # loaded with the user, it is read after the session is closed (see database.async_database)
+    riot_accounts: List[RiotAccount] = relationship("RiotAccount", backref="users", lazy="selectin")
 
     auto_notify_timezone: str = Column("auto_notify_timezone", String)
     auto_notify_at: int = Column("auto_notify_at", Integer)
     auto_notify_flag: bool = Column("auto_notify_flag", Boolean)
-    auto_notify_account: RiotAccount = relationship("RiotAccount", uselist=False, overlaps="riot_accounts,users")
+    # next auto notify time in UTC, see services.notify_scheduler
+    next_notify_at: datetime.datetime = Column("next_notify_at", DATETIME, index=True)
+    auto_notify_account: RiotAccount = relationship("RiotAccount", uselist=False, overlaps="riot_accounts,users",
+                                                    lazy="selectin")
 
     last_account_deleted_at: datetime.datetime = Column("last_account_deleted_at", DATETIME)
 
@@ -48,6 +53,79 @@ class User(Base):
         session.commit()
         return new_user
 
+    @staticmethod
+    def set_language(session: Session, uid: int, language: str) -> User:
+        user = User.get_promised(session, uid)
+        user.language = language
+        session.commit()
+        return user
+
+    @staticmethod
+    def set_auto_notify(session: Session, uid: int, account_uuid: int, timezone: str, hour: int,
+                        next_notify_at: datetime.datetime) -> User:
+        user = User.get_promised(session, uid)
+        user.auto_notify_at = hour
+        user.auto_notify_timezone = timezone
+        user.auto_notify_account = session.query(RiotAccount).get(account_uuid)
+        user.next_notify_at = next_notify_at
+        session.commit()
+        return user
+
+    @staticmethod
+    def add_premium(session: Session, uids: List[int], months: int):
+        for uid in uids:
+            user = User.get_promised(session, uid)
+            if not user.is_premium:
+                user.premium_until = datetime.datetime.now() + datetime.timedelta(days=31 * months)
+            else:
+                user.premium_until += datetime.timedelta(days=31 * months)
+            user.is_premium = True
+        session.commit()
+
+    @staticmethod
+    def remove_premium(session: Session, uids: List[int]):
+        for uid in uids:
+            user = User.get_promised(session, uid)
+            user.is_premium = False
+            user.premium_until = None
+        session.commit()
+
+    @staticmethod
+    def unlock_activation(session: Session, uid: int):
+        user = User.get_promised(session, uid)
+        user.try_activate_count = 0
+        user.activation_locked_at = None
+        session.commit()
+
+    @staticmethod
+    def count_activation(session: Session, uid: int) -> User:
+        """one more login attempt of the register command"""
+        user = User.get_promised(session, uid)
+        user.try_activate_count += 1
+        session.commit()
+        return user
+
+    @staticmethod
+    def lock_activation(session: Session, uid: int, now: datetime.datetime):
+        user = User.get_promised(session, uid)
+        user.activation_locked_at = now
+        session.commit()
+
+    @staticmethod
+    def add_riot_account(session: Session, uid: int, account: RiotAccount) -> RiotAccount:
+        user = User.get_promised(session, uid)
+        user.try_activate_count = 0
+        user.activation_locked_at = None
+        user.riot_accounts.append(account)
+        session.commit()
+        return account
+
+    @staticmethod
+    def mark_account_deleted(session: Session, uid: int, now: datetime.datetime):
+        user = User.get_promised(session, uid)
+        user.last_account_deleted_at = now
+        session.commit()
+
     def get_text(self, ja: str, en: str):
         if self.language == "ja-JP":
             return ja
@@ -69,10 +147,10 @@ class RiotAccount(Base):
     password: str = Column("password", String)
     region: str = Column("region", String)
 
-    _game_name: str = Column("game_name", String)
+    _game_name: str = Column("game_name", String, index=True)
     _puuid: str = Column("puuid", String)
 
-    user_id: int = Column("user_id", Integer, ForeignKey("users.id"))
+    user_id: int = Column("user_id", DiscordId, ForeignKey("users.id"), index=True)
 
     last_get_shops_at: datetime.datetime = Column("last_get_shops_at", DATETIME)
     last_get_night_shops_at: datetime.datetime = Column("last_get_night_shops_at", DATETIME)
@@ -98,3 +176,41 @@ class RiotAccount(Base):
     @game_name.setter
     def game_name(self, value):
         self._game_name = value
+
+    @staticmethod
+    def get(session: Session, uuid: int) -> Optional[RiotAccount]:
+        return session.query(RiotAccount).get(uuid)
+
+    @staticmethod
+    def get_by_game_name(session: Session, game_name: str) -> Optional[RiotAccount]:
+        return session.query(RiotAccount).filter(RiotAccount._game_name == game_name).first()
+
+    @staticmethod
+    def update_profile(session: Session, uuid: int, puuid: str, game_name: Optional[str] = None):
+        account = session.query(RiotAccount).get(uuid)
+        if account is None:
+            return
+        account.puuid = puuid
+        if game_name is not None:
+            account.game_name = game_name
+        session.commit()
+
+    @staticmethod
+    def mark_fetched(session: Session, uuid: int, night: bool, at: Optional[datetime.datetime]):
+        """when the store (or the night market) was last fetched, None to allow the next fetch right away"""
+        account = session.query(RiotAccount).get(uuid)
+        if night:
+            account.last_get_night_shops_at = at
+        else:
+            account.last_get_shops_at = at
+        session.commit()
+
+    @staticmethod
+    def delete_by_game_name(session: Session, game_name: str) -> Optional[RiotAccount]:
+        account = RiotAccount.get_by_game_name(session, game_name)
+        if account is None:
+            return None
+        RiotSession.clear(session, account.uuid)
+        session.delete(account)
+        session.commit()
+        return account
@@ -1,12 +1,67 @@
 from __future__ import annotations
 
+import collections
+import threading
+from typing import List, NamedTuple, Optional
+
 from sqlalchemy import String, Column, Integer
 from sqlalchemy.orm import Session
-from valorant_api import SyncValorantApi
 
 from .setting import Base
 from .user import User
 
+SKIN_LEVEL_ICON_URL = "https://media.valorant-api.com/weaponskinlevels/{uuid}/displayicon.png"
+
+
+class SkinRecord(NamedTuple):
+    uuid: str
+    display_name: str
+    display_icon: str
+    streamed_video: Optional[str]
+
+
+class SkinCache:
+    """
+    LRU of SkinRecord keyed by the weapons.uuid column (skin uuid + language).
+    Used from the database writer and the executor threads (preload, catalog refresh), so every access
+    takes the lock.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._records: collections.OrderedDict[str, SkinRecord] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[SkinRecord]:
+        with self._lock:
+            record = self._records.get(key)
+            if record is None:
+                self.misses += 1
+                return None
+            self._records.move_to_end(key)
+            self.hits += 1
+            return record
+
+    def put(self, key: str, record: SkinRecord):
+        with self._lock:
+            self._records[key] = record
+            self._records.move_to_end(key)
+            if len(self._records) > self.max_size:
+                self._records.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._records)
+
+
+skin_cache = SkinCache()
+
 
 class Weapon(Base):
     __tablename__ = "weapons"
@@ -24,14 +79,47 @@ class Weapon(Base):
         if weapon is not None:
             return weapon
 
-        skin = SyncValorantApi(language=user.language).search_weapon_levels_by_uuid(uuid)
-
-        new_weapon = Weapon(
-            uuid=uuid+user.language,
-            display_name=skin.display_name,
-            display_icon=skin.display_icon,
-            streamed_video=skin.streamed_video
+        # the catalog is loaded in bulk by services.catalog_loader, a skin that is not there yet
+        # is rendered from the static media url instead of asking valorant-api while sending a store
+        return Weapon(
+            uuid=uuid + user.language,
+            display_name=user.get_text("不明なスキン", "Unknown skin"),
+            display_icon=SKIN_LEVEL_ICON_URL.format(uuid=uuid),
+            streamed_video=None
         )
-        session.add(new_weapon)
-        session.commit()
-        return new_weapon
+
+    @staticmethod
+    def get_many(session: Session, uuids: List[str], language: str) -> List[SkinRecord]:
+        """resolve a whole store with at most one query, keeping the order of uuids"""
+        records = {uuid: skin_cache.get(uuid + language) for uuid in uuids}
+        missing = [uuid + language for uuid, record in records.items() if record is None]
+        if missing:
+            rows = session.query(Weapon.uuid, Weapon.display_name, Weapon.display_icon, Weapon.streamed_video) \
+                .filter(Weapon.uuid.in_(missing))
+            for key, display_name, display_icon, streamed_video in rows:
+                record = SkinRecord(key[:-len(language)], display_name, display_icon, streamed_video)
+                skin_cache.put(key, record)
+                records[record.uuid] = record
+        unknown = "不明なスキン" if language == "ja-JP" else "Unknown skin"
+        return [records[uuid] or SkinRecord(uuid, unknown, SKIN_LEVEL_ICON_URL.format(uuid=uuid), None)
+                for uuid in uuids]
+
+    @staticmethod
+    def preload(session: Session, uuids: List[str], language: str, chunk_size: int = 500) -> int:
+        """put the skins into skin_cache ahead of the first store, returns how many were found"""
+        loaded = 0
+        for i in range(0, len(uuids), chunk_size):
+            keys = [uuid + language for uuid in uuids[i:i + chunk_size]]
+            rows = session.query(Weapon.uuid, Weapon.display_name, Weapon.display_icon, Weapon.streamed_video) \
+                .filter(Weapon.uuid.in_(keys))
+            for key, display_name, display_icon, streamed_video in rows:
+                skin_cache.put(key, SkinRecord(key[:-len(language)], display_name, display_icon, streamed_video))
+                loaded += 1
+        return loaded
+
+
+class CatalogVersion(Base):
+    __tablename__ = "catalog_versions"
+
+    language: str = Column("language", String, primary_key=True)
+    version: str = Column("version", String)
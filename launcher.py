@@ -0,0 +1,65 @@
+"""
+Runs the bot as several clusters on this host, each one a `main.py --cluster-id n` process
+with its own range of shards. Clusters that exit are started again.
+
+    python launcher.py --clusters 4 --shards 32
+    python launcher.py --clusters 4 --shards 32 --only 2 3   # this host runs clusters 2 and 3
+
+Every cluster serves GET /health on HEALTH_PORT + cluster id.
+"""
+import argparse
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+RESTART_DELAY_SECONDS = 10
+
+
+def start_cluster(cluster_id: int, clusters: int, shards: int, extra: List[str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "main.py", *extra, "--cluster-id", str(cluster_id),
+                             "--clusters", str(clusters), "--shards", str(shards)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clusters", type=int, required=True)
+    parser.add_argument("--shards", type=int, required=True, help="total shard count of the bot")
+    parser.add_argument("--only", type=int, nargs="*", help="cluster ids to run on this host (default: all)")
+    parser.add_argument("--gateway", action="store_true", help="send riot requests to fetcher processes")
+    args = parser.parse_args()
+    if args.shards < args.clusters:
+        parser.error("every cluster needs at least one shard")
+    extra = ["gateway"] if args.gateway else []
+    cluster_ids = args.only if args.only else list(range(args.clusters))
+
+    processes: Dict[int, subprocess.Popen] = {}
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for cluster_id in cluster_ids:
+        processes[cluster_id] = start_cluster(cluster_id, args.clusters, args.shards, extra)
+    while not stopping:
+        time.sleep(1)
+        for cluster_id, process in processes.items():
+            if process.poll() is not None and not stopping:
+                print(f"cluster {cluster_id} exited with {process.returncode}, restarting in "
+                      f"{RESTART_DELAY_SECONDS}s")
+                time.sleep(RESTART_DELAY_SECONDS)
+                processes[cluster_id] = start_cluster(cluster_id, args.clusters, args.shards, extra)
+
+    for process in processes.values():
+        process.terminate()
+    for process in processes.values():
+        process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,50 @@
+import argparse
+import asyncio
 import os
 
 from dotenv import load_dotenv
 
-from client import ValorantStoreBot
+# before database is imported, it reads DATABASE_URL
+load_dotenv()
+
+from client import ValorantStoreBot, build_logger
+from database import AsyncDatabase, session
+from services.cluster import ClusterConfig
+from services.fetch_worker import FetchPool, FetchWorker
+from services.proxy_pool import ProxyPool
+from services.riot_fetcher import RiotFetcher
+from setting import FETCH_SOCKET_DIR, FETCH_TIMEOUT_SECONDS, HTTP_POOL_SIZE, HEALTH_PORT, PROXY_FILE, \
+    DB_SLOW_QUERY_SECONDS, DB_GROUP_COMMIT_MS, DB_GROUP_COMMIT_MAX
+
+
+def run_fetcher():
+    logger = build_logger()
+    db = AsyncDatabase(session, DB_SLOW_QUERY_SECONDS, logger, group_window=DB_GROUP_COMMIT_MS / 1000,
+                       group_max=DB_GROUP_COMMIT_MAX)
+    worker = FetchWorker(RiotFetcher(db, ProxyPool(PROXY_FILE), HTTP_POOL_SIZE), logger)
+    asyncio.run(worker.serve(FETCH_SOCKET_DIR))
+
 
 if __name__ == "__main__":
-    load_dotenv()
-    bot = ValorantStoreBot("")
-    bot.run(os.getenv("DISCORD_TOKEN"))
+    parser = argparse.ArgumentParser()
+    # (none)   everything in this process
+    # gateway  discord only, riot requests go to the fetcher processes
+    # fetcher  one riot fetch worker
+    parser.add_argument("mode", nargs="?", default="", choices=["", "gateway", "fetcher"])
+    # cluster mode, usually started by launcher.py
+    parser.add_argument("--cluster-id", type=int, default=0)
+    parser.add_argument("--clusters", type=int, default=1)
+    parser.add_argument("--shards", type=int, default=None, help="total shard count of the bot")
+    parser.add_argument("--health-port", type=int, default=None, help="default: HEALTH_PORT + cluster id")
+    args = parser.parse_args()
+
+    if args.mode == "fetcher":
+        run_fetcher()
+    else:
+        fetch_pool = None
+        if args.mode == "gateway":
+            fetch_pool = FetchPool(FETCH_SOCKET_DIR, FETCH_TIMEOUT_SECONDS)
+        cluster = ClusterConfig(args.cluster_id, args.clusters, args.shards)
+        health_port = args.health_port if args.health_port is not None else HEALTH_PORT + args.cluster_id
+        bot = ValorantStoreBot("", fetch_pool=fetch_pool, cluster=cluster, health_port=health_port)
+        bot.run(os.getenv("DISCORD_TOKEN"))
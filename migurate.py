@@ -1,26 +1,39 @@
-from typing import List
+"""
+Moves the users of the old single account database (valorant.sqlite3) into the current one.
 
+    python migurate.py --dry-run
+    python migurate.py
+
+Rows are streamed and inserted in chunks by a ChunkedMigration (see database/chunked_migration.py),
+an interrupted run continues where it stopped when started again, --restart starts over.
+"""
+import argparse
+
+from sqlalchemy import select
+
+from database import ChunkedMigration, ENGINE, RiotAccount
 from database import User as UserNew
 from database_old import User as UserOld
-from database import session as session_new
-from database_old import session as session_old
-from database import RiotAccount
-
-olds: List[UserOld] = session_old.query(UserOld).all()
-new_users = []
-for old in olds:
-    if not old.riot_userid:
-        continue
-    new_users.append(UserNew(
-        id=old.uuid,
-        riot_accounts=[
-            RiotAccount(
-                username=old.riot_userid,
-                password=old.riot_password,
-                region="ap",
-            )
-        ]
-    ))
-print(len(new_users))
-session_new.add_all(new_users)
-session_new.commit()
+from database_old import ENGINE as ENGINE_OLD
+
+
+def convert(row):
+    yield UserNew.__table__, {"id": row.uuid}
+    yield RiotAccount.__table__, {"username": row.riot_userid, "password": row.riot_password, "region": "ap",
+                                  "user_id": row.uuid}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true", help="read and convert every user, write nothing")
+    parser.add_argument("--restart", action="store_true", help="forget the checkpoint of an earlier run")
+    args = parser.parse_args()
+
+    users = select(UserOld.uuid, UserOld.riot_userid, UserOld.riot_password) \
+        .where(UserOld.riot_userid.isnot(None), UserOld.riot_userid != "")
+    migration = ChunkedMigration("migurate users", ENGINE_OLD, ENGINE, users, [UserOld.uuid], convert,
+                                 chunk_size=args.chunk_size, dry_run=args.dry_run)
+    if args.restart and not args.dry_run:
+        migration.reset()
+    migration.run()
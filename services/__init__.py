@@ -0,0 +1,2 @@
+from .notify_engine import NotifyEngine, TickStats
+from .storefront_cache import StorefrontCache
@@ -0,0 +1,113 @@
+"""
+Bulk loads every weapon skin level into the weapons table.
+
+    python -m services.catalog_loader                       # download and import when the game version changed
+    python -m services.catalog_loader --dump catalog.json   # download into a file for offline use
+    python -m services.catalog_loader --file catalog.json   # import from a file without network
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from typing import Dict, List, Optional
+
+import requests
+from sqlalchemy.orm import Session
+
+from database import Weapon
+from database.weapon import CatalogVersion, skin_cache
+from setting import SUPPORTED_LANGUAGES
+
+VERSION_URL = "https://valorant-api.com/v1/version"
+SKIN_LEVELS_URL = "https://valorant-api.com/v1/weapons/skinlevels"
+
+
+def fetch_version() -> str:
+    r = requests.get(VERSION_URL, timeout=10)
+    r.raise_for_status()
+    return r.json()["data"]["version"]
+
+
+def download_catalog(languages: List[str], version: Optional[str] = None) -> Dict:
+    catalog = {"version": version or fetch_version(), "languages": {}}
+    with requests.session() as http:
+        for language in languages:
+            r = http.get(SKIN_LEVELS_URL, params={"language": language}, timeout=30)
+            r.raise_for_status()
+            catalog["languages"][language] = r.json()["data"]
+    return catalog
+
+
+def load_catalog_file(path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_catalog_file(catalog: Dict, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False)
+
+
+def outdated_languages(session: Session, languages: List[str], version: str) -> List[str]:
+    stored = {row.language: row.version for row in session.query(CatalogVersion).all()}
+    return [language for language in languages if stored.get(language) != version]
+
+
+def import_catalog(session: Session, catalog: Dict, force: bool = False) -> Dict[str, int]:
+    """insert new and update changed skin levels of every outdated language in a single transaction"""
+    version = catalog["version"]
+    languages = list(catalog["languages"].keys())
+    if not force:
+        languages = outdated_languages(session, languages, version)
+    if not languages:
+        return {"inserted": 0, "updated": 0}
+
+    existing = {row.uuid: row for row in session.query(
+        Weapon.id, Weapon.uuid, Weapon.display_name, Weapon.display_icon, Weapon.streamed_video)}
+    inserts, updates = [], []
+    for language in languages:
+        for level in catalog["languages"][language]:
+            values = {
+                "uuid": level["uuid"] + language,
+                "display_name": level.get("displayName"),
+                "display_icon": level.get("displayIcon"),
+                "streamed_video": level.get("streamedVideo"),
+            }
+            current = existing.get(values["uuid"])
+            if current is None:
+                inserts.append(values)
+            elif (current.display_name, current.display_icon, current.streamed_video) != (
+                    values["display_name"], values["display_icon"], values["streamed_video"]):
+                updates.append(dict(values, id=current.id))
+        session.merge(CatalogVersion(language=language, version=version))
+
+    session.bulk_insert_mappings(Weapon, inserts)
+    session.bulk_update_mappings(Weapon, updates)
+    session.commit()
+    skin_cache.clear()
+    return {"inserted": len(inserts), "updated": len(updates)}
+
+
+def refresh_catalog(session: Session, languages: List[str] = SUPPORTED_LANGUAGES, path: Optional[str] = None,
+                    force: bool = False) -> Dict[str, int]:
+    if path:
+        return import_catalog(session, load_catalog_file(path), force=force)
+    version = fetch_version()
+    languages = languages if force else outdated_languages(session, languages, version)
+    if not languages:
+        return {"inserted": 0, "updated": 0}
+    return import_catalog(session, download_catalog(languages, version), force=force)
+
+
+if __name__ == "__main__":
+    from database import session
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", help="import from a catalog file instead of downloading")
+    parser.add_argument("--dump", help="download the catalog into this file and exit")
+    parser.add_argument("--force", action="store_true", help="import even when the version did not change")
+    args = parser.parse_args()
+    if args.dump:
+        save_catalog_file(download_catalog(SUPPORTED_LANGUAGES), args.dump)
+    else:
+        print(refresh_catalog(session, path=args.file, force=args.force))
@@ -0,0 +1,104 @@
+"""
+Cluster mode: several bot processes, each one connecting its own range of shards.
+
+Auto notify users are split into `clusters` buckets by users.id % clusters. A cluster delivers
+its own bucket and takes over the bucket of a cluster that stopped renewing its lease, until
+that cluster comes back. The leases only spread the work, NotifyJob.claim makes sure a job is
+delivered by a single process even while two clusters think they own the same bucket.
+Tasks needed once for the whole bot (catalog refresh, cleanups) run on the holder of bucket 0.
+"""
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import logging
+from typing import List, Optional, Set
+
+import sqlalchemy.orm
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.elements import ColumnElement
+
+from database import ClusterLease
+
+
+@dataclasses.dataclass(frozen=True)
+class ClusterConfig:
+    cluster_id: int = 0
+    clusters: int = 1
+    # total shards of the bot, None lets discord choose when there is a single cluster
+    shard_count: Optional[int] = None
+
+    def __post_init__(self):
+        if not 0 <= self.cluster_id < self.clusters:
+            raise ValueError(f"cluster id {self.cluster_id} is not in 0..{self.clusters - 1}")
+        if self.clusters > 1 and (self.shard_count is None or self.shard_count < self.clusters):
+            raise ValueError("every cluster needs at least one shard, give a shard count >= clusters")
+
+    @property
+    def shard_ids(self) -> Optional[List[int]]:
+        if self.clusters == 1:
+            return None
+        return [shard for shard in range(self.shard_count) if shard % self.clusters == self.cluster_id]
+
+
+class ClusterLeases:
+    def __init__(self, config: ClusterConfig, ttl: float, logger: logging.Logger):
+        self.config = config
+        self.ttl = datetime.timedelta(seconds=ttl)
+        self.logger = logger
+        self.buckets: Set[int] = set()
+
+    @property
+    def is_leader(self) -> bool:
+        return 0 in self.buckets
+
+    def user_filter(self, user_id: ColumnElement) -> Optional[ColumnElement]:
+        """condition on a users.id column for the users this cluster delivers to, None when it is all of them"""
+        if self.config.clusters == 1 and self.buckets:
+            return None
+        return (user_id % self.config.clusters).in_(sorted(self.buckets))
+
+    def renew(self, session: sqlalchemy.orm.Session, now: datetime.datetime) -> List[int]:
+        """renew and take over leases, returns the buckets whose previous holder is gone"""
+        orphaned = []
+        # swapped in at the end, user_filter and is_leader are read from the event loop meanwhile
+        buckets = set(self.buckets)
+        for bucket in range(self.config.clusters):
+            lease = session.query(ClusterLease).get(bucket)
+            expired = lease is None or lease.expires_at < now
+            if lease is None:
+                lease = ClusterLease(bucket=bucket, holder=self.config.cluster_id)
+                session.add(lease)
+            elif lease.holder == self.config.cluster_id:
+                # still ours, or left by the previous run of this cluster
+                expired = expired or bucket not in buckets
+            elif bucket == self.config.cluster_id or expired:
+                # a cluster takes its own bucket back, the others only take it when nobody renews it
+                lease.holder = self.config.cluster_id
+            else:
+                if bucket in buckets:
+                    self.logger.info(
+                        f"cluster {self.config.cluster_id}: bucket {bucket} taken by cluster {lease.holder}")
+                buckets.discard(bucket)
+                continue
+            lease.expires_at = now + self.ttl
+            try:
+                session.commit()
+            except IntegrityError:
+                # another cluster created the lease first
+                session.rollback()
+                buckets.discard(bucket)
+                continue
+            if bucket not in buckets:
+                self.logger.info(f"cluster {self.config.cluster_id}: delivering bucket {bucket}")
+                buckets.add(bucket)
+            if expired:
+                orphaned.append(bucket)
+        self.buckets = buckets
+        return orphaned
+
+    def release(self, session: sqlalchemy.orm.Session):
+        session.query(ClusterLease).filter(ClusterLease.holder == self.config.cluster_id) \
+            .delete(synchronize_session=False)
+        session.commit()
+        self.buckets = set()
@@ -0,0 +1,189 @@
+"""
+Riot fetch workers running in their own processes next to the discord gateway process.
+
+Every worker listens on a unix socket `fetch-<pid>.sock` in a shared directory and the gateway
+finds them by listing that directory, so workers can be started and stopped independently:
+
+    honcho start -m gateway=1,fetcher=4
+
+Messages are json lines. A request is {"id", "op", "account", "premium"}, the answer carries the
+same id and either "result" or "error" (one of ERRORS) and "message".
+"""
+from __future__ import annotations
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import zlib
+from typing import Dict, List, Optional
+
+from database.user import RiotAccount
+from services.riot_fetcher import RiotFetcher
+from valclient.auth import InvalidCredentialError, RateLimitedError
+
+ERRORS = {
+    "rate_limited": RateLimitedError,
+    "invalid_credential": InvalidCredentialError,
+}
+
+
+class FetchWorkerError(Exception): ...
+
+
+def socket_path(directory: str, pid: int) -> str:
+    return os.path.join(directory, f"fetch-{pid}.sock")
+
+
+class FetchWorker:
+    def __init__(self, fetcher: RiotFetcher, logger: logging.Logger):
+        self.db = fetcher.db
+        self.fetcher = fetcher
+        self.logger = logger
+
+    async def serve(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        path = socket_path(directory, os.getpid())
+        server = await asyncio.start_unix_server(self._handle_connection, path=path)
+        self.logger.info(f"fetch worker listening on {path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            await self.fetcher.close()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # answer requests in any order, the gateway matches them by id
+                task = asyncio.ensure_future(self._answer(json.loads(line), writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _answer(self, request: Dict, writer: asyncio.StreamWriter):
+        answer = {"id": request["id"]}
+        try:
+            answer["result"] = await self._run(request)
+        except Exception as e:
+            answer["error"] = next((code for code, error in ERRORS.items() if isinstance(e, error)), "failed")
+            answer["message"] = str(e)
+            if answer["error"] == "failed":
+                self.logger.error(f"fetch job {request['op']} failed", exc_info=e)
+        writer.write(json.dumps(answer).encode() + b"\n")
+        await writer.drain()
+
+    async def _run(self, request: Dict) -> Dict:
+        account = await self.db.run(RiotAccount.get, request["account"])
+        if account is None:
+            raise InvalidCredentialError("account was removed")
+        if request["op"] == "storefront":
+            offers = await self.fetcher.storefront(request["premium"], account)
+            return {"puuid": account.puuid, "offers": offers}
+        if request["op"] == "login":
+            # warms the token cache of this worker, storefront requests of the account are routed here too
+            await self.fetcher.login(request["premium"], account)
+            return {"puuid": account.puuid}
+        raise ValueError(f"unknown op {request['op']}")
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.next_id = 0
+        self.closed = False
+        self._reader = asyncio.ensure_future(self._read(reader))
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                answer = json.loads(line)
+                future = self.pending.pop(answer["id"], None)
+                if future is not None and not future.done():
+                    future.set_result(answer)
+        finally:
+            self.closed = True
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(FetchWorkerError("fetch worker went away"))
+            self.pending.clear()
+
+    async def request(self, message: Dict) -> Dict:
+        self.next_id += 1
+        message["id"] = self.next_id
+        future = asyncio.get_event_loop().create_future()
+        self.pending[self.next_id] = future
+        try:
+            self.writer.write(json.dumps(message).encode() + b"\n")
+            await self.writer.drain()
+            return await future
+        finally:
+            self.pending.pop(message["id"], None)
+
+    def close(self):
+        self._reader.cancel()
+        self.writer.close()
+
+
+class FetchPool:
+    """sends fetch jobs from the gateway process to the workers"""
+
+    def __init__(self, directory: str, timeout: float):
+        self.directory = directory
+        self.timeout = timeout
+        self._connections: Dict[str, _Connection] = {}
+
+    def workers(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, "fetch-*.sock")))
+
+    async def _connect(self, path: str) -> Optional[_Connection]:
+        connection = self._connections.get(path)
+        if connection is not None and not connection.closed:
+            return connection
+        try:
+            reader, writer = await asyncio.open_unix_connection(path)
+        except OSError:
+            # socket left behind by a worker that was killed
+            return None
+        connection = self._connections[path] = _Connection(reader, writer)
+        return connection
+
+    async def request(self, op: str, account_uuid: int, is_premium: bool) -> Dict:
+        workers = self.workers()
+        # an account always goes to the same worker while the pool does not change, so its token stays cached
+        start = zlib.crc32(str(account_uuid).encode()) % len(workers) if workers else 0
+        for path in workers[start:] + workers[:start]:
+            connection = await self._connect(path)
+            if connection is None:
+                continue
+            answer = await asyncio.wait_for(
+                connection.request({"op": op, "account": account_uuid, "premium": is_premium}), self.timeout)
+            if "error" in answer:
+                raise ERRORS.get(answer["error"], FetchWorkerError)(answer["message"])
+            return answer["result"]
+        raise FetchWorkerError(f"no fetch worker is running in {self.directory}")
+
+    async def storefront(self, account_uuid: int, is_premium: bool) -> Dict:
+        return await self.request("storefront", account_uuid, is_premium)
+
+    async def login(self, account_uuid: int, is_premium: bool) -> Dict:
+        return await self.request("login", account_uuid, is_premium)
+
+    def close(self):
+        for connection in self._connections.values():
+            connection.close()
+        self._connections.clear()
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import time
+from typing import Callable, Dict
+
+from aiohttp import web
+
+
+class HealthServer:
+    """
+    GET /health of one cluster: 200 while every shard is connected, 503 otherwise.
+    `status` returns the json body and decides with its "healthy" key.
+    """
+
+    def __init__(self, status: Callable[[], Dict], host: str, port: int):
+        self.status = status
+        self.host = host
+        self.port = port
+        self.started_at = time.monotonic()
+        self._runner = None
+
+    async def _health(self, request: web.Request) -> web.Response:
+        body = self.status()
+        body["uptime_seconds"] = round(time.monotonic() - self.started_at)
+        return web.json_response(body, status=200 if body.get("healthy") else 503)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/health", self._health)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
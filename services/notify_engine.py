@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class TickStats:
+    total: int = 0
+    delivered: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        if self.elapsed <= 0:
+            return 0.0
+        return self.total / self.elapsed
+
+    def __str__(self) -> str:
+        return (f"total={self.total} delivered={self.delivered} failed={self.failed} "
+                f"timed_out={self.timed_out} elapsed={self.elapsed:.2f}s throughput={self.throughput:.1f}/s")
+
+
+class NotifyEngine(Generic[T]):
+    """
+    Delivers one tick worth of jobs concurrently.
+    `deliver` returns a truthy value when the job succeeded, `key` decides which region limit the job counts against.
+    """
+
+    def __init__(self, deliver: Callable[[T], Awaitable[bool]], key: Callable[[T], Hashable],
+                 global_limit: int = 64, region_limit: int = 16, deadline: float = 45,
+                 logger: Optional[logging.Logger] = None):
+        self.deliver = deliver
+        self.key = key
+        self.global_limit = global_limit
+        self.region_limit = region_limit
+        self.deadline = deadline
+        self.logger = logger or logging.getLogger(__name__)
+        self.last_stats: Optional[TickStats] = None
+
+    async def run(self, jobs: Iterable[T]) -> TickStats:
+        stats = TickStats()
+        # semaphores are created per run so that they are always bound to the running loop
+        global_semaphore = asyncio.Semaphore(self.global_limit)
+        region_semaphores: Dict[Hashable, asyncio.Semaphore] = collections.defaultdict(
+            lambda: asyncio.Semaphore(self.region_limit))
+
+        async def run_one(job: T):
+            # take the region slot first so that a busy region does not hold global slots while waiting
+            async with region_semaphores[self.key(job)]:
+                async with global_semaphore:
+                    try:
+                        ok = await asyncio.wait_for(self.deliver(job), self.deadline)
+                    except asyncio.TimeoutError:
+                        stats.timed_out += 1
+                        return
+                    except Exception as e:
+                        self.logger.error("failed to notify store content", exc_info=e)
+                        stats.failed += 1
+                        return
+            if ok:
+                stats.delivered += 1
+            else:
+                stats.failed += 1
+
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(run_one(job)) for job in jobs]
+        stats.total = len(tasks)
+        if tasks:
+            await asyncio.gather(*tasks)
+        stats.elapsed = time.monotonic() - started
+        self.last_stats = stats
+        return stats
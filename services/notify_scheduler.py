@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import datetime
+from typing import Optional
+
+import pytz
+
+# a delivery may still go out during the whole local hour it was scheduled for
+FIRE_WINDOW = datetime.timedelta(hours=1)
+
+
+def localize(timezone: pytz.BaseTzInfo, naive: datetime.datetime) -> datetime.datetime:
+    try:
+        return timezone.localize(naive, is_dst=None)
+    except pytz.AmbiguousTimeError:
+        # the hour happens twice when DST ends, fire on the first one
+        return timezone.localize(naive, is_dst=True)
+    except pytz.NonExistentTimeError:
+        # the hour is skipped when DST starts, fire at the first valid time after it
+        return timezone.normalize(timezone.localize(naive, is_dst=False))
+
+
+def next_fire_time(timezone: str, hour: int, after: datetime.datetime) -> datetime.datetime:
+    """
+    First time (naive UTC) the local `hour` of `timezone` starts whose fire window has not passed at `after` (naive UTC).
+    Computed from the local calendar every time, so DST changes move the UTC time as expected.
+    """
+    tz = pytz.timezone(timezone)
+    local_date = pytz.utc.localize(after).astimezone(tz).date()
+    for days in range(-1, 3):
+        naive = datetime.datetime.combine(local_date + datetime.timedelta(days=days), datetime.time(hour))
+        fire_at = localize(tz, naive).astimezone(pytz.utc).replace(tzinfo=None)
+        if fire_at + FIRE_WINDOW > after:
+            return fire_at
+    raise ValueError(f"no fire time for {timezone} {hour}")
+
+
+def schedule(timezone: Optional[str], hour: Optional[int], after: datetime.datetime) -> Optional[datetime.datetime]:
+    if not timezone or hour is None:
+        return None
+    return next_fire_time(timezone, hour, after)
+
+
+def reschedule(timezone: str, hour: int, fired_at: datetime.datetime, now: datetime.datetime) -> datetime.datetime:
+    """next fire time after the one at `fired_at` has been handled"""
+    return next_fire_time(timezone, hour, max(now, fired_at + FIRE_WINDOW))
+
+
+def local_date(timezone: str, at: datetime.datetime) -> datetime.date:
+    """the date in `timezone` at `at` (naive UTC)"""
+    return pytz.utc.localize(at).astimezone(pytz.timezone(timezone)).date()
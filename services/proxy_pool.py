@@ -0,0 +1,182 @@
+"""
+Proxies used for riot requests, read from proxies.txt (one `host:port:user:password` per line).
+
+The first quarter of the file is reserved for premium users, everybody else uses the rest
+(premium users fall back to it when none of theirs is healthy). Every account sticks to one
+proxy as long as that proxy stays healthy, so riot sees a stable address per account.
+A proxy that gets rate limited or fails several times in a row is quarantined, for twice as
+long each time it happens again. The file is read again when it changes.
+"""
+from __future__ import annotations
+
+import dataclasses
+import os
+import random
+import time
+from typing import Dict, Hashable, List, Optional
+
+import aiohttp
+from yarl import URL
+
+from valclient import ProxyEndpoint
+
+# consecutive failures before a proxy is quarantined
+MAX_CONSECUTIVE_FAILURES = 3
+COOLDOWN_SECONDS = 30
+MAX_COOLDOWN_SECONDS = 60 * 60
+# weight of the newest sample in the latency average
+LATENCY_ALPHA = 0.2
+# how often the file is checked for changes
+RELOAD_CHECK_SECONDS = 30
+
+
+def parse_proxy_line(line: str) -> Optional[ProxyEndpoint]:
+    parts = line.strip().split(":")
+    if len(parts) != 4:
+        return None
+    host, port, user, password = parts
+    return ProxyEndpoint(URL.build(scheme="http", host=host, port=int(port)), aiohttp.BasicAuth(user, password))
+
+
+# compared by identity, the stats change all the time
+@dataclasses.dataclass(eq=False)
+class Proxy:
+    # parsed once when the file is read
+    endpoint: ProxyEndpoint
+    premium: bool
+    requests: int = 0
+    successes: int = 0
+    failures: int = 0
+    rate_limited: int = 0
+    latency: Optional[float] = None
+    consecutive_failures: int = 0
+    strikes: int = 0
+    quarantined_until: float = 0.0
+    accounts: int = 0
+
+    @property
+    def address(self) -> str:
+        """host:port without the credentials, for logs and stats"""
+        return f"{self.endpoint.url.host}:{self.endpoint.url.port}"
+
+    @property
+    def key(self) -> str:
+        return f"{self.endpoint.auth.login if self.endpoint.auth else ''}@{self.address}"
+
+    @property
+    def success_rate(self) -> float:
+        # smoothed so that new proxies start at 0.5 instead of 0 or 1
+        return (self.successes + 1) / (self.requests + 2)
+
+    def is_healthy(self, now: float) -> bool:
+        return self.quarantined_until <= now
+
+    def score(self, default_latency: float) -> float:
+        latency = self.latency if self.latency is not None else default_latency
+        return self.success_rate / (latency + 0.05) / (1 + self.accounts)
+
+
+class ProxyPool:
+    def __init__(self, path: str):
+        self.path = path
+        self.proxies: Dict[str, Proxy] = {}
+        self._assigned: Dict[Hashable, str] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self.reload()
+
+    def reload(self) -> bool:
+        """read the file again when it changed, returns whether it did"""
+        self._checked_at = time.monotonic()
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        lines = []
+        if mtime is not None:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = [endpoint for endpoint in map(parse_proxy_line, f.read().splitlines()) if endpoint]
+        premium_count = len(lines) // 4
+        proxies = {}
+        for i, endpoint in enumerate(lines):
+            # keep the stats of proxies that are still listed
+            proxy = Proxy(endpoint, premium=False)
+            proxy = self.proxies.get(proxy.key) or proxy
+            proxy.premium = i < premium_count
+            proxies[proxy.key] = proxy
+        self.proxies = proxies
+        self._assigned = {key: url for key, url in self._assigned.items() if url in proxies}
+        for proxy in proxies.values():
+            proxy.accounts = 0
+        for url in self._assigned.values():
+            proxies[url].accounts += 1
+        return True
+
+    def _candidates(self, premium: bool, now: float) -> List[Proxy]:
+        tiers = [[p for p in self.proxies.values() if p.premium == premium]]
+        if premium:
+            tiers.append([p for p in self.proxies.values() if not p.premium])
+        for tier in tiers:
+            healthy = [p for p in tier if p.is_healthy(now)]
+            if healthy:
+                return healthy
+        # everything is quarantined, use whatever comes back first
+        everything = [p for tier in tiers for p in tier]
+        if not everything:
+            return []
+        return [min(everything, key=lambda p: p.quarantined_until)]
+
+    def pick(self, key: Hashable, premium: bool) -> Optional[Proxy]:
+        """the proxy for account `key`, None when there are no proxies at all"""
+        if time.monotonic() - self._checked_at > RELOAD_CHECK_SECONDS:
+            self.reload()
+        now = time.monotonic()
+        candidates = self._candidates(premium, now)
+        if not candidates:
+            return None
+        current = self.proxies.get(self._assigned.get(key))
+        if current is not None and current in candidates:
+            return current
+
+        latencies = [p.latency for p in candidates if p.latency is not None]
+        default_latency = sum(latencies) / len(latencies) if latencies else 1.0
+        # the better of two random proxies spreads the accounts without sending all of them to the fastest one
+        proxy = max(random.sample(candidates, min(2, len(candidates))), key=lambda p: p.score(default_latency))
+        if current is not None:
+            current.accounts -= 1
+        self._assigned[key] = proxy.key
+        proxy.accounts += 1
+        return proxy
+
+    def report(self, proxy: Optional[Proxy], ok: bool, latency: Optional[float] = None, rate_limited: bool = False):
+        if proxy is None:
+            return
+        proxy.requests += 1
+        if ok:
+            proxy.successes += 1
+            proxy.consecutive_failures = 0
+            # one success does not prove it, the cooldown shrinks back step by step
+            proxy.strikes = max(proxy.strikes - 1, 0)
+            if latency is not None:
+                proxy.latency = latency if proxy.latency is None else \
+                    LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * proxy.latency
+            return
+        proxy.failures += 1
+        proxy.consecutive_failures += 1
+        if rate_limited:
+            proxy.rate_limited += 1
+        if rate_limited or proxy.consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+            proxy.strikes += 1
+            proxy.consecutive_failures = 0
+            cooldown = min(COOLDOWN_SECONDS * 2 ** (proxy.strikes - 1), MAX_COOLDOWN_SECONDS)
+            proxy.quarantined_until = time.monotonic() + cooldown
+
+    def quarantined(self) -> List[Proxy]:
+        now = time.monotonic()
+        return [p for p in self.proxies.values() if not p.is_healthy(now)]
+
+    def __len__(self) -> int:
+        return len(self.proxies)
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import collections
+import time
+from typing import Dict, Optional, Tuple
+
+# (ja, en) by competitive tier, 1 and 2 are not used by riot
+TIER_NAMES: Tuple[Tuple[str, str], ...] = (
+    ("アンランク", "UNRANKED"), ("", "Unused1"), ("", "Unused2"),
+    ("アイアン 1", "IRON 1"), ("アイアン 2", "IRON 2"), ("アイアン 3", "IRON 3"),
+    ("ブロンズ 1", "BRONZE 1"), ("ブロンズ 2", "BRONZE 2"), ("ブロンズ 3", "BRONZE 3"),
+    ("シルバー 1", "SILVER 1"), ("シルバー 2", "SILVER 2"), ("シルバー 3", "SILVER 3"),
+    ("ゴールド 1", "GOLD 1"), ("ゴールド 2", "GOLD 2"), ("ゴールド 3", "GOLD 3"),
+    ("プラチナ 1", "PLATINUM 1"), ("プラチナ 2", "PLATINUM 2"), ("プラチナ 3", "PLATINUM 3"),
+    ("ダイヤモンド 1", "DIAMOND 1"), ("ダイヤモンド 2", "DIAMOND 2"), ("ダイヤモンド 3", "DIAMOND 3"),
+    ("アセンダント 1", "ASCENDANT 1"), ("アセンダント 2", "ASCENDANT 2"), ("アセンダント 3", "ASCENDANT 3"),
+    ("イモータル 1", "IMMORTAL 1"), ("イモータル 2", "IMMORTAL 2"), ("イモータル 3", "IMMORTAL 3"),
+    ("レディアント", "RADIANT"),
+)
+
+
+def competitive_tier(mmr: Dict) -> int:
+    """tier in the season of the last competitive game from an MMR_FetchPlayer answer, 0 without one"""
+    latest = mmr.get("LatestCompetitiveUpdate") or {}
+    seasons = ((mmr.get("QueueSkills") or {}).get("competitive") or {}).get("SeasonalInfoBySeasonID") or {}
+    season = seasons.get(latest.get("SeasonID")) or {}
+    return season.get("CompetitiveTier") or latest.get("TierAfterUpdate") or 0
+
+
+def tier_name(tier: int, language: str) -> str:
+    if not 0 <= tier < len(TIER_NAMES):
+        return "UNKNOWN"
+    ja, en = TIER_NAMES[tier]
+    return ja if language == "ja-JP" and ja else en
+
+
+class RankCache:
+    """competitive tier per puuid, kept for ttl seconds"""
+
+    def __init__(self, ttl: float, max_size: int = 50000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._tiers: collections.OrderedDict[str, Tuple[float, int]] = collections.OrderedDict()
+
+    def get(self, puuid: Optional[str]) -> Optional[int]:
+        entry = self._tiers.get(puuid) if puuid else None
+        if entry is None or entry[0] <= time.monotonic():
+            self._tiers.pop(puuid, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, puuid: str, tier: int) -> None:
+        # entries are inserted in expiry order, so the oldest one is the first to go
+        self._tiers.pop(puuid, None)
+        self._tiers[puuid] = (time.monotonic() + self.ttl, tier)
+        while len(self._tiers) > self.max_size:
+            self._tiers.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._tiers)
@@ -0,0 +1,160 @@
+"""
+Token buckets for riot requests, one per region (pd/glz/shared calls), one for auth and one per proxy.
+
+Every request takes a token from the bucket of its scope and from the bucket of its proxy. Callers
+that find a bucket empty queue up in order and sleep until a token is there, so a burst (the morning
+auto notify) is spread out instead of failing. The refill rate adapts AIMD style: every success
+adds a little, a 429 or rate_limited answer halves it (once per decrease_interval) and empties the bucket.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import dataclasses
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from valclient.auth import RateLimitedError
+
+# upper bounds (seconds) of the wait time histogram
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1, 2, 5, 10, 30, 60, float("inf"))
+
+
+@dataclasses.dataclass(frozen=True)
+class BucketConfig:
+    # tokens per second at start, the rate moves between min_rate and max_rate
+    rate: float
+    burst: float
+    min_rate: float
+    max_rate: float
+    # tokens per second added over about one second of successes
+    increase: float = 0.5
+    decrease: float = 0.5
+    # the requests in flight when the limit is hit all fail together, they count as one decrease
+    decrease_interval: float = 1.0
+
+
+class TokenBucket:
+    def __init__(self, config: BucketConfig):
+        self.config = config
+        self.rate = config.rate
+        self.tokens = config.burst
+        self.updated = time.monotonic()
+        self.waiting = 0
+        self.limited_count = 0
+        self.decreased_at = 0.0
+        self.histogram = [0] * len(WAIT_BUCKETS)
+        # asyncio.Lock wakes its waiters in order, the holder is the next one to get a token
+        self._queue = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.config.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def expected_wait(self) -> float:
+        self._refill(time.monotonic())
+        return max(self.waiting + 1 - self.tokens, 0) / self.rate
+
+    async def take(self) -> float:
+        """wait for a token, returns how long it took"""
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self._queue:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        waited = now - started
+                        self.histogram[bisect.bisect_left(WAIT_BUCKETS, waited)] += 1
+                        return waited
+                    # the rate may change while sleeping, look again afterwards
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+
+    def succeeded(self):
+        # about `increase` more tokens per second after a second of successes
+        self.rate = min(self.config.max_rate, self.rate + self.config.increase / self.rate)
+
+    def limited(self, now: float):
+        self.limited_count += 1
+        self._refill(now)
+        self.tokens = min(self.tokens, 0)
+        if now - self.decreased_at >= self.config.decrease_interval:
+            self.rate = max(self.config.min_rate, self.rate * self.config.decrease)
+            self.decreased_at = now
+
+
+class RateGovernor:
+    def __init__(self, configs: Dict[str, BucketConfig], max_wait: float, retries: int):
+        """configs by kind: "auth", "region" and "proxy" """
+        self.configs = configs
+        self.max_wait = max_wait
+        self.retries = retries
+        self.buckets: Dict[Tuple[str, str], TokenBucket] = {}
+
+    def _bucket(self, key: Tuple[str, str]) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.configs[key[0]])
+        return bucket
+
+    async def acquire(self, keys: Iterable[Tuple[str, str]]):
+        buckets = [self._bucket(key) for key in keys]
+        wait = max(bucket.expected_wait() for bucket in buckets)
+        if wait > self.max_wait:
+            # so far behind that the caller is better off being told to come back later
+            raise RateLimitedError(f"rate limit queue is {wait:.0f}s long")
+        for bucket in buckets:
+            await bucket.take()
+
+    def succeeded(self, keys: Iterable[Tuple[str, str]]):
+        for key in keys:
+            self._bucket(key).succeeded()
+
+    def limited(self, keys: Iterable[Tuple[str, str]]):
+        now = time.monotonic()
+        for key in keys:
+            self._bucket(key).limited(now)
+
+    def bind(self, proxy: Optional[str]) -> BoundGovernor:
+        return BoundGovernor(self, proxy)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(bucket.waiting for bucket in self.buckets.values())
+
+    def histogram(self) -> List[int]:
+        return [sum(counts) for counts in zip(*(b.histogram for b in self.buckets.values()))] or \
+            [0] * len(WAIT_BUCKETS)
+
+
+class BoundGovernor:
+    """the governor as seen by the client of one proxy, the limiter of valclient.AsyncClient"""
+
+    def __init__(self, governor: RateGovernor, proxy: Optional[str]):
+        self.governor = governor
+        self.proxy = proxy
+        self.retries = governor.retries
+
+    def _keys(self, scope: str) -> List[Tuple[str, str]]:
+        keys = [("auth", "") if scope == "auth" else ("region", scope)]
+        if self.proxy is not None:
+            keys.append(("proxy", self.proxy))
+        return keys
+
+    async def acquire(self, scope: str):
+        await self.governor.acquire(self._keys(scope))
+
+    def succeeded(self, scope: str):
+        self.governor.succeeded(self._keys(scope))
+
+    def limited(self, scope: str):
+        self.governor.limited(self._keys(scope))
+
+
+def format_histogram(histogram: List[int]) -> str:
+    labels = [f"<={b:g}s" if b != float("inf") else ">60s" for b in WAIT_BUCKETS]
+    return " ".join(f"{label}:{count}" for label, count in zip(labels, histogram) if count)
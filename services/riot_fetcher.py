@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import time
+from typing import Awaitable, Dict, Optional, Tuple, TypeVar
+
+import aiohttp
+
+import valclient
+from database import AsyncDatabase, RiotSession
+from database.user import RiotAccount
+from services.proxy_pool import Proxy, ProxyPool
+from services.rank import RankCache, competitive_tier
+from services.rate_governor import BucketConfig, RateGovernor
+from services.single_flight import SingleFlight
+from setting import HTTP_POOL_SIZE_PER_HOST, HTTP_KEEPALIVE_SECONDS, RATE_LIMITS, RATE_LIMIT_MAX_WAIT_SECONDS, \
+    RATE_LIMIT_RETRIES, RANK_CACHE_SECONDS
+from valclient.auth import InvalidCredentialError, RateLimitedError
+
+T = TypeVar("T")
+
+
+class RiotFetcher:
+    """
+    Riot logins and requests without anything discord related, used by the bot itself
+    and by the fetch worker processes (see services/fetch_worker.py).
+    """
+
+    def __init__(self, db: AsyncDatabase, proxies: ProxyPool, pool_size: int):
+        self.db = db
+        self.proxies = proxies
+        self.pool_size = pool_size
+        self._http_session: Optional[aiohttp.ClientSession] = None
+        self.token_cache = valclient.TokenCache()
+        # how many logins were served by the token cache, saved cookies or the password
+        self.login_sources: collections.Counter = collections.Counter()
+        self.governor = RateGovernor({kind: BucketConfig(**config) for kind, config in RATE_LIMITS.items()},
+                                     max_wait=RATE_LIMIT_MAX_WAIT_SECONDS, retries=RATE_LIMIT_RETRIES)
+        # logins and fetches of the same account running at the same time share one request
+        self.flights = SingleFlight()
+        self.rank_cache = RankCache(RANK_CACHE_SECONDS)
+
+    @property
+    def http_session(self) -> aiohttp.ClientSession:
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = valclient.new_session(limit=self.pool_size, limit_per_host=HTTP_POOL_SIZE_PER_HOST,
+                                                       keepalive_timeout=HTTP_KEEPALIVE_SECONDS)
+        return self._http_session
+
+    def _new_client(self, is_premium: bool, account: RiotAccount,
+                    cookies: Optional[Dict[str, str]] = None) -> Tuple[valclient.AsyncClient, Optional[Proxy]]:
+        if account.is_not_valid:
+            raise InvalidCredentialError("account is not valid")
+        proxy = self.proxies.pick(account.uuid, is_premium)
+        return valclient.AsyncClient(self.http_session, region=account.region, auth={
+            "username": account.username,
+            "password": account.password
+        }, proxy=proxy.endpoint if proxy else None, token_cache=self.token_cache, cache_key=account.uuid,
+            cookies=cookies, limiter=self.governor.bind(proxy.key if proxy else None)), proxy
+
+    def new_client(self, is_premium: bool, account: RiotAccount,
+                   cookies: Optional[Dict[str, str]] = None) -> valclient.AsyncClient:
+        return self._new_client(is_premium, account, cookies=cookies)[0]
+
+    async def _report(self, proxy: Optional[Proxy], coro: Awaitable[T], skip_success: bool = False) -> T:
+        """await a request and tell the proxy pool how `proxy` did"""
+        started = time.monotonic()
+        try:
+            result = await coro
+        except RateLimitedError:
+            self.proxies.report(proxy, ok=False, rate_limited=True)
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.proxies.report(proxy, ok=False)
+            raise
+        if not skip_success:
+            self.proxies.report(proxy, ok=True, latency=time.monotonic() - started)
+        return result
+
+    async def _login(self, is_premium: bool, account: RiotAccount) -> Tuple[valclient.AsyncClient, Optional[Proxy]]:
+        cookies = await self.db.run(RiotSession.load_cookies, account.uuid)
+        started = time.monotonic()
+        try:
+            cl, proxy = self._new_client(is_premium, account, cookies=cookies)
+            await self._report(proxy, cl.activate(), skip_success=True)
+        except InvalidCredentialError:
+            if cookies:
+                await self.db.run(RiotSession.clear, account.uuid)
+            raise
+        self.login_sources[cl.login_source] += 1
+        # a login from the token cache did not go through the proxy
+        if cl.login_source != "cache":
+            self.proxies.report(proxy, ok=True, latency=time.monotonic() - started)
+        if cl.login_source != "cache" and cl.auth.cookies != cookies:
+            await self.db.run(RiotSession.save_cookies, account.uuid, cl.auth.cookies)
+        if account._puuid != cl.puuid:
+            account.puuid = cl.puuid
+            await self.db.run(RiotAccount.update_profile, account.uuid, cl.puuid)
+        return cl, proxy
+
+    async def login(self, is_premium: bool, account: RiotAccount) -> valclient.AsyncClient:
+        """raises InvalidCredentialError, RateLimitedError or whatever the request raised"""
+        cl, _ = await self.flights.run(("login", account.uuid), lambda: self._login(is_premium, account))
+        return cl
+
+    async def _storefront(self, is_premium: bool, account: RiotAccount) -> Dict:
+        cl, proxy = await self.flights.run(("login", account.uuid), lambda: self._login(is_premium, account))
+        return await self._report(proxy, cl.store_fetch_storefront())
+
+    async def storefront(self, is_premium: bool, account: RiotAccount) -> Dict:
+        return await self.flights.run(("storefront", account.uuid), lambda: self._storefront(is_premium, account))
+
+    async def client_rank(self, cl: valclient.AsyncClient, proxy: Optional[Proxy] = None) -> int:
+        """competitive tier of a logged in client, the MMR answer already carries the latest update"""
+        tier = self.rank_cache.get(cl.puuid)
+        if tier is None:
+            tier = competitive_tier(await self._report(proxy, cl.fetch_mmr()))
+            self.rank_cache.put(cl.puuid, tier)
+        return tier
+
+    async def _rank(self, is_premium: bool, account: RiotAccount) -> int:
+        cl, proxy = await self.flights.run(("login", account.uuid), lambda: self._login(is_premium, account))
+        return await self.client_rank(cl, proxy)
+
+    async def rank(self, is_premium: bool, account: RiotAccount) -> int:
+        # no login at all while the tier is cached
+        tier = self.rank_cache.get(account._puuid)
+        if tier is not None:
+            return tier
+        return await self.flights.run(("rank", account.uuid), lambda: self._rank(is_premium, account))
+
+    async def close(self):
+        if self._http_session is not None:
+            await self._http_session.close()
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+import discord
+from discord.abc import Messageable
+from discord.embeds import EmptyEmbed
+
+from database import User
+from database.weapon import SkinRecord
+
+# https://discord.com/developers/docs/resources/channel#embed-object-embed-limits
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARACTERS_PER_MESSAGE = 6000
+
+ICON_URL = "https://pbs.twimg.com/profile_images/1403218724681777152/rcOjWkLv_400x400.jpg"
+
+
+class RenderStats:
+    def __init__(self):
+        self.stores = 0
+        self.messages = 0
+
+    @property
+    def messages_per_store(self) -> float:
+        if self.stores == 0:
+            return 0.0
+        return self.messages / self.stores
+
+
+render_stats = RenderStats()
+
+
+def _skin_embed(skin: SkinRecord, description) -> discord.Embed:
+    embed = discord.Embed(title=skin.display_name, color=0xff0000,
+                          url=skin.streamed_video if skin.streamed_video else EmptyEmbed,
+                          description=description if skin.streamed_video else EmptyEmbed)
+    embed.set_author(name="valorant shop", icon_url=ICON_URL)
+    embed.set_image(url=skin.display_icon)
+    return embed
+
+
+def build_store_embeds(skins: List[SkinRecord], user: User) -> List[discord.Embed]:
+    return [_skin_embed(skin, user.get_text("↑から動画が見れます", "You can watch the video at↑")) for skin in skins]
+
+
+def build_night_store_embeds(offers: List[Dict], skins: List[SkinRecord]) -> List[discord.Embed]:
+    embeds = []
+    for offer, skin in zip(offers, skins):
+        price = list(offer["Offer"]["Cost"].values())[0]
+        discounted = list(offer["DiscountCosts"].values())[0]
+        embeds.append(_skin_embed(skin, f'{price}→{discounted}({offer["DiscountPercent"]}%off) '))
+    return embeds
+
+
+def split_embeds(embeds: List[discord.Embed]) -> List[List[discord.Embed]]:
+    chunks: List[List[discord.Embed]] = [[]]
+    size = 0
+    for embed in embeds:
+        if len(chunks[-1]) >= MAX_EMBEDS_PER_MESSAGE or size + len(embed) > MAX_EMBED_CHARACTERS_PER_MESSAGE:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(embed)
+        size += len(embed)
+    return [chunk for chunk in chunks if chunk]
+
+
+async def send_store(destination: Messageable, embeds: List[discord.Embed], content: Optional[str] = None) -> int:
+    """send a whole store in as few messages as discord allows, returns the number of messages sent"""
+    chunks = split_embeds(embeds)
+    if not chunks:
+        if content:
+            await destination.send(content=content)
+            return 1
+        return 0
+    for i, chunk in enumerate(chunks):
+        await destination.send(content=content if i == 0 else None, embeds=chunk)
+    render_stats.stores += 1
+    render_stats.messages += len(chunks)
+    return len(chunks)
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import collections
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+
+def seconds_until_reset(storefront: Dict) -> float:
+    remaining = storefront.get("SkinsPanelLayout", {}).get("SingleItemOffersRemainingDurationInSeconds")
+    if remaining:
+        return float(remaining)
+    # the daily store resets at 00:00 UTC
+    now = datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - now).total_seconds()
+
+
+class StorefrontCache:
+    """
+    Storefront responses per puuid, kept until the store resets.
+    Least recently used entries are dropped once max_size is reached.
+    """
+
+    def __init__(self, max_size: int = 50000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._storefronts: collections.OrderedDict[str, Tuple[float, Dict]] = collections.OrderedDict()
+
+    def get(self, puuid: Optional[str]) -> Optional[Dict]:
+        entry = self._storefronts.get(puuid) if puuid else None
+        if entry is None or entry[0] <= time.monotonic():
+            self._storefronts.pop(puuid, None)
+            self.misses += 1
+            return None
+        self._storefronts.move_to_end(puuid)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, puuid: str, storefront: Dict) -> None:
+        if not storefront.get("SkinsPanelLayout", {}).get("SingleItemOffers"):
+            # empty while riot is under maintenance, try again next time
+            return
+        self._storefronts[puuid] = (time.monotonic() + seconds_until_reset(storefront), storefront)
+        self._storefronts.move_to_end(puuid)
+        if len(self._storefronts) > self.max_size:
+            self.evict()
+
+    def evict(self) -> None:
+        now = time.monotonic()
+        for puuid in [puuid for puuid, (expires_at, _) in self._storefronts.items() if expires_at <= now]:
+            del self._storefronts[puuid]
+        while len(self._storefronts) > self.max_size:
+            self._storefronts.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._storefronts)
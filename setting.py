@@ -2,3 +2,76 @@ INITIAL_EXTENSIONS = [
     "cogs.commands",
     "cogs.event_handler"
 ]
+
+# auto notify
+# longest sleep between two checks of users.next_notify_at
+NOTIFY_TICK_SECONDS = 60
+# subscribers due at the same hour that have to be delivered within one tick, the limits below follow from it
+NOTIFY_USERS_PER_TICK = 10000
+# storefront requests per second for a full tick to go out in 3/4 of it, even if every user is in one shard
+NOTIFY_REQUEST_RATE = NOTIFY_USERS_PER_TICK * 4 // (NOTIFY_TICK_SECONDS * 3)
+# a delivery of a preauthed account (one storefront request and the DM) takes about this long
+NOTIFY_DELIVERY_MS = 500
+# deliveries in flight needed to keep up NOTIFY_REQUEST_RATE in one region, and over all regions
+NOTIFY_REGION_CONCURRENCY = NOTIFY_REQUEST_RATE * NOTIFY_DELIVERY_MS // 1000
+NOTIFY_CONCURRENCY = NOTIFY_REGION_CONCURRENCY * 2
+NOTIFY_USER_DEADLINE_SECONDS = 45
+# failed deliveries are retried after 1, 2, 4... times the backoff
+NOTIFY_JOB_MAX_ATTEMPTS = 4
+NOTIFY_JOB_BACKOFF_SECONDS = 60
+NOTIFY_JOB_RETENTION_DAYS = 7
+# logged stores are kept this long, the skin ranking reads skin_daily_counts which are kept for good
+SKIN_LOG_RETENTION_DAYS = 7
+# accounts due within this many minutes are logged in ahead of time, so the delivery only fetches the store
+PREAUTH_MINUTES = 10
+PREAUTH_INTERVAL_SECONDS = 60
+
+# database calls taking longer than this are logged (see database/async_database.py)
+DB_SLOW_QUERY_SECONDS = 0.5
+# database calls arriving within this many milliseconds of each other share one commit
+DB_GROUP_COMMIT_MS = 2
+DB_GROUP_COMMIT_MAX = 64
+
+# threads used by run_blocking_func
+BLOCKING_WORKERS = 160
+
+# host:port:user:password per line, reloaded when it changes (see services/proxy_pool.py)
+PROXY_FILE = "proxies.txt"
+
+# connections kept by the shared aiohttp session used for riot api calls
+HTTP_POOL_SIZE = 256
+# keep-alive connections per (proxy, riot host) pair, and how long an idle one is kept
+# one region's deliveries all go to the same pd host, so a tick needs NOTIFY_REGION_CONCURRENCY of them
+HTTP_POOL_SIZE_PER_HOST = NOTIFY_REGION_CONCURRENCY
+HTTP_KEEPALIVE_SECONDS = 60
+
+# fetch workers (python main.py gateway / python main.py fetcher), see services/fetch_worker.py
+FETCH_SOCKET_DIR = "sockets"
+FETCH_TIMEOUT_SECONDS = 30
+
+# cluster mode (python launcher.py), see services/cluster.py
+# a cluster that did not renew its lease for this long loses its auto notify users to the others
+CLUSTER_LEASE_SECONDS = 180
+# GET /health of cluster n listens on HEALTH_PORT + n
+HEALTH_HOST = "0.0.0.0"
+HEALTH_PORT = 8080
+
+# riot request pacing per process (see services/rate_governor.py), tokens per second
+RATE_LIMITS = {
+    "auth": {"rate": 10, "burst": 20, "min_rate": 0.5, "max_rate": 40},
+    "region": {"rate": NOTIFY_REQUEST_RATE, "burst": NOTIFY_REQUEST_RATE, "min_rate": 1,
+               "max_rate": NOTIFY_REQUEST_RATE * 2},
+    "proxy": {"rate": 5, "burst": 10, "min_rate": 0.1, "max_rate": 20},
+}
+# callers that would wait longer than this get RateLimitedError right away
+RATE_LIMIT_MAX_WAIT_SECONDS = 120
+RATE_LIMIT_RETRIES = 3
+
+# how long a fetched competitive tier is shown without asking riot again
+RANK_CACHE_SECONDS = 600
+
+# skin catalog
+SUPPORTED_LANGUAGES = ["ja-JP", "en-US"]
+CATALOG_REFRESH_HOURS = 6
+# import the catalog from this json file instead of valorant-api.com (see services/catalog_loader.py)
+CATALOG_FILE = None
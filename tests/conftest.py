@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+# importing database creates the bot database in the working directory, keep it out of the repo
+os.chdir(tempfile.mkdtemp())
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import scoped_session, sessionmaker  # noqa: E402
+from sqlalchemy.pool import QueuePool  # noqa: E402
+
+from database import Base  # noqa: E402
+from database.setting import SQLITE_PRAGMAS, configure_sqlite  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """a fresh sqlite database with the schema of the bot, set up like the real one"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.sqlite3'}", connect_args={"check_same_thread": False},
+                           poolclass=QueuePool)
+    configure_sqlite(engine, SQLITE_PRAGMAS)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def sessions(engine):
+    sessions = scoped_session(sessionmaker(autoflush=False, bind=engine))
+    yield sessions
+    sessions.remove()
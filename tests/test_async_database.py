@@ -0,0 +1,117 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+
+from database import AsyncDatabase, User
+from database.async_database import BatchAborted
+
+
+def run(coroutine):
+    # a writer thread that died leaves the callers waiting, fail instead of hanging
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=10))
+
+
+def user_ids(session):
+    return sorted(user.id for user in session.query(User).all())
+
+
+def add_user(session, uid):
+    session.add(User(id=uid))
+    session.commit()
+
+
+async def batch(db, *calls):
+    """the calls in one batch, the group window is long enough for all of them"""
+    return await asyncio.gather(*(db.run(*call) for call in calls), return_exceptions=True)
+
+
+@pytest.fixture
+def db(sessions):
+    db = AsyncDatabase(sessions, slow_seconds=float("inf"), group_window=0.05, group_max=64)
+    yield db
+    db.close()
+
+
+def test_failing_call_only_loses_its_own_changes(db):
+    async def scenario():
+        await db.run(add_user, 1)
+        results = await batch(db, (add_user, 2), (add_user, 1), (add_user, 3))
+        return results, await db.run(user_ids)
+
+    results, ids = run(scenario())
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], IntegrityError)
+    assert ids == [1, 2, 3]
+
+
+def test_call_that_catches_the_error_and_rolls_back_goes_on(db):
+    def add_twice(session):
+        try:
+            add_user(session, 1)
+        except IntegrityError:
+            session.rollback()
+        add_user(session, 4)
+
+    async def scenario():
+        await db.run(add_user, 1)
+        results = await batch(db, (add_user, 2), (add_twice,))
+        return results, await db.run(user_ids)
+
+    results, ids = run(scenario())
+    assert results == [None, None]
+    assert ids == [1, 2, 4]
+
+
+def test_lost_transaction_fails_the_batch_and_the_writer_goes_on(db):
+    def lose_transaction(session):
+        session.connection().exec_driver_sql("ROLLBACK")
+        raise OperationalError("ROLLBACK", {}, Exception("database is locked"))
+
+    async def scenario():
+        results = await batch(db, (add_user, 1), (lose_transaction,), (add_user, 2))
+        # the next batch runs as usual
+        await db.run(add_user, 3)
+        return results, await db.run(user_ids)
+
+    results, ids = run(scenario())
+    assert isinstance(results[0], BatchAborted)
+    assert isinstance(results[1], OperationalError)
+    assert isinstance(results[2], BatchAborted)
+    assert ids == [3]
+
+
+def test_failed_commit_fails_every_call_of_the_batch(db):
+    async def scenario():
+        with mock.patch.object(Session, "commit", side_effect=OperationalError("COMMIT", {}, Exception("disk I/O"))):
+            results = await batch(db, (add_user, 1), (add_user, 2))
+        await db.run(add_user, 3)
+        return results, await db.run(user_ids)
+
+    results, ids = run(scenario())
+    assert all(isinstance(result, BatchAborted) for result in results)
+    assert ids == [3]
+    assert db.stats["(commit)"].errors == 1
+
+
+def test_unexpected_error_in_the_writer_does_not_stop_it(db):
+    async def scenario():
+        with mock.patch.object(db, "_record", side_effect=RuntimeError("broken")):
+            first = await batch(db, (add_user, 1))
+        await db.run(add_user, 2)
+        return first, await db.run(user_ids)
+
+    first, ids = run(scenario())
+    assert isinstance(first[0], BatchAborted)
+    assert ids == [2]
+
+
+def test_stats_are_a_copy(db):
+    run(db.run(add_user, 1))
+    stats = db.stats
+    run(db.run(user_ids))
+    assert "user_ids" not in stats
+    assert db.stats["user_ids"].calls == 1
+    assert db.commits == 2
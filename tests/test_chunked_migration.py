@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, select
+
+from database import Base, ChunkedMigration, User
+from database.chunked_migration import MigrationCheckpoint
+
+SOURCE_METADATA = MetaData()
+OLD_USERS = Table("old_users", SOURCE_METADATA, Column("uuid", Integer, primary_key=True),
+                  Column("name", String))
+
+
+@pytest.fixture
+def source(tmp_path):
+    source = create_engine(f"sqlite:///{tmp_path / 'source.sqlite3'}")
+    SOURCE_METADATA.create_all(bind=source)
+    with source.begin() as conn:
+        conn.execute(OLD_USERS.insert(), [{"uuid": i, "name": f"user{i}"} for i in range(1, 26)])
+    yield source
+    source.dispose()
+
+
+def migration(source, target, convert=None, dry_run=False):
+    return ChunkedMigration("old users", source, target, select(OLD_USERS.c.uuid), [OLD_USERS.c.uuid],
+                            convert or (lambda row: [(User.__table__, {"id": row.uuid})]), chunk_size=10,
+                            dry_run=dry_run)
+
+
+def user_ids(target):
+    with target.connect() as conn:
+        return [uid for (uid,) in conn.execute(select(User.id).order_by(User.id))]
+
+
+def test_moves_every_row(source, engine):
+    assert migration(source, engine).run() == 25
+    assert user_ids(engine) == list(range(1, 26))
+    assert migration(source, engine).checkpoint().rows == 25
+
+
+def test_resumes_after_the_last_committed_chunk(source, engine):
+    def fail_at_15(row):
+        if row.uuid == 15:
+            raise RuntimeError("interrupted")
+        return [(User.__table__, {"id": row.uuid})]
+
+    with pytest.raises(RuntimeError):
+        migration(source, engine, fail_at_15).run()
+    # the chunk with the failing row was rolled back, the one before it stays
+    assert user_ids(engine) == list(range(1, 11))
+    assert migration(source, engine).checkpoint().rows == 10
+
+    assert migration(source, engine).run() == 15
+    assert user_ids(engine) == list(range(1, 26))
+    assert migration(source, engine).checkpoint().rows == 25
+    # nothing is left, a third run moves nothing
+    assert migration(source, engine).run() == 0
+
+
+def test_reset_starts_over(source, engine):
+    migration(source, engine).run()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.delete())
+
+    migration(source, engine).reset()
+    assert migration(source, engine).checkpoint() is None
+    assert migration(source, engine).run() == 25
+    assert user_ids(engine) == list(range(1, 26))
+
+
+def test_dry_run_writes_nothing(source, tmp_path):
+    target = create_engine(f"sqlite:///{tmp_path / 'empty.sqlite3'}")
+    dry_run = migration(source, target, dry_run=True)
+    assert dry_run.run() == 25
+    assert dry_run.written == {"users": 25}
+    assert dry_run.checkpoint() is None
+
+    Base.metadata.create_all(bind=target, tables=[User.__table__, MigrationCheckpoint.__table__])
+    assert user_ids(target) == []
+    target.dispose()
@@ -0,0 +1,39 @@
+import asyncio
+from unittest import mock
+
+from client import ValorantStoreBot
+from database.riot_session import get_fernet
+
+
+def test_on_ready_starts_the_background_loops_once():
+    async def scenario():
+        bot = ValorantStoreBot("!")
+        loops = ["cluster_lease_loop", "store_content_notify", "warm_up"]
+        with mock.patch.object(bot, "change_presence", mock.AsyncMock()), \
+                mock.patch.object(bot, "renew_leases", mock.AsyncMock()) as renew_leases, \
+                mock.patch.multiple(bot, **{name: mock.AsyncMock() for name in loops}):
+            # a reconnect fires on_ready again
+            for _ in range(3):
+                await bot.on_ready()
+            await asyncio.sleep(0)
+            started = {name: getattr(bot, name).await_count for name in loops}
+        bot.db.close()
+        return started, renew_leases.await_count
+
+    started, renewed = asyncio.run(scenario())
+    assert started == {"cluster_lease_loop": 1, "store_content_notify": 1, "warm_up": 1}
+    assert renewed == 3
+
+
+def test_health_shows_cookie_storage(monkeypatch):
+    monkeypatch.delenv("COOKIE_ENCRYPTION_KEY", raising=False)
+    get_fernet.cache_clear()
+
+    async def scenario():
+        bot = ValorantStoreBot("!")
+        status = bot.health_status()
+        bot.db.close()
+        return status
+
+    assert asyncio.run(scenario())["cookie_storage"] == "disabled"
+    get_fernet.cache_clear()
@@ -0,0 +1,59 @@
+import datetime
+import uuid
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from database import SkinDailyCount, SkinLog
+from database.migration import migrate
+
+ACCOUNT = str(uuid.uuid4())
+SKINS = [str(uuid.uuid4()) for _ in range(3)]
+
+
+def old_skin_logs(engine, rows):
+    """a database at version 2, with the skin_logs table from before store_logs"""
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE skin_logs (id INTEGER NOT NULL PRIMARY KEY, account_puuid VARCHAR, "
+                          "date DATE, skin_uuid VARCHAR)"))
+        conn.execute(text("INSERT INTO skin_logs (account_puuid, date, skin_uuid) VALUES (:puuid, :date, :skin)"),
+                     [{"puuid": puuid, "date": date.isoformat(), "skin": skin} for puuid, date, skin in rows])
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (2)"))
+
+
+def test_compact_skin_logs_keeps_a_store_with_an_invalid_skin(engine):
+    today = datetime.date.today()
+    old_skin_logs(engine, [(ACCOUNT, today, SKINS[0]), (ACCOUNT, today, "not a uuid"), (ACCOUNT, today, SKINS[1]),
+                           (ACCOUNT, today, SKINS[1]), ("not a uuid", today, SKINS[2])])
+    migrate(engine)
+
+    with Session(bind=engine) as session:
+        logs = session.query(SkinLog).all()
+    assert [(log.account_puuid, log.date, log.skin_uuids) for log in logs] == [(ACCOUNT, today, SKINS[:2])]
+
+
+def test_fresh_database(engine):
+    assert migrate(engine) == 3
+    assert migrate(engine) == 3
+    # users are read by next_notify_at, the timezone needs no index
+    indexes = [index["name"] for index in inspect(engine).get_indexes("users")]
+    assert "ix_users_next_notify_at" in indexes
+    assert "ix_users_auto_notify_timezone" not in indexes
+
+
+def test_compact_skin_logs_backfills_the_missing_daily_counts(engine):
+    today = datetime.date.today()
+    yesterday = today - datetime.timedelta(days=1)
+    old_skin_logs(engine, [(ACCOUNT, yesterday, SKINS[0]), (ACCOUNT, yesterday, SKINS[1]),
+                           (ACCOUNT, today, SKINS[0]), (ACCOUNT, today, SKINS[2])])
+    # today was counted by the new code before the migration ran
+    with Session(bind=engine) as session:
+        SkinDailyCount.increment(session, today, [SKINS[0], SKINS[2]])
+        session.commit()
+    migrate(engine)
+
+    with Session(bind=engine) as session:
+        counts = session.query(SkinDailyCount.date, SkinDailyCount.skin_uuid, SkinDailyCount.count).all()
+    assert sorted(counts) == sorted([(yesterday, SKINS[0], 1), (yesterday, SKINS[1], 1),
+                                     (today, SKINS[0], 1), (today, SKINS[2], 1)])
@@ -0,0 +1,50 @@
+import asyncio
+import collections
+
+from services.notify_engine import NotifyEngine
+
+
+def test_limits_deliveries_per_region_and_overall():
+    in_flight = collections.Counter()
+    peak = collections.Counter()
+
+    async def deliver(job):
+        region, _ = job
+        in_flight[region] += 1
+        in_flight["all"] += 1
+        peak[region] = max(peak[region], in_flight[region])
+        peak["all"] = max(peak["all"], in_flight["all"])
+        await asyncio.sleep(0.01)
+        in_flight[region] -= 1
+        in_flight["all"] -= 1
+        return True
+
+    engine = NotifyEngine(deliver, key=lambda job: job[0], global_limit=5, region_limit=3)
+    jobs = [(region, i) for region in ("ap", "eu", "na") for i in range(10)]
+    stats = asyncio.run(engine.run(jobs))
+
+    assert stats.total == stats.delivered == 30
+    assert peak["all"] == 5
+    assert max(peak[region] for region in ("ap", "eu", "na")) == 3
+
+
+def test_failures_and_timeouts_are_counted():
+    async def deliver(job):
+        if job == "error":
+            raise RuntimeError("riot is down")
+        if job == "slow":
+            await asyncio.sleep(1)
+        return job == "ok"
+
+    engine = NotifyEngine(deliver, key=lambda job: "ap", deadline=0.05)
+    stats = asyncio.run(engine.run(["ok", "ok", "error", "slow", "falsy"]))
+
+    assert (stats.total, stats.delivered, stats.failed, stats.timed_out) == (5, 2, 2, 1)
+    assert engine.last_stats is stats
+
+
+def test_empty_tick():
+    engine = NotifyEngine(lambda job: None, key=lambda job: job)
+    stats = asyncio.run(engine.run([]))
+    assert stats.total == 0
+    assert stats.throughput == 0.0
@@ -0,0 +1,104 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from database import NotifyJob, User, notify_job
+
+NOW = datetime(2026, 1, 10, 14)
+TODAY = date(2026, 1, 10)
+
+
+@pytest.fixture
+def session(sessions):
+    session = sessions()
+    session.add_all([User(id=1), User(id=2)])
+    session.commit()
+    return session
+
+
+def claim(session, now, **kwargs):
+    jobs = NotifyJob.claim(session, now, **kwargs)
+    session.commit()
+    return jobs
+
+
+def test_claim_takes_each_job_once(session):
+    NotifyJob.enqueue(session, 1, TODAY, NOW)
+    NotifyJob.enqueue(session, 1, TODAY, NOW)
+    NotifyJob.enqueue(session, 2, TODAY, NOW + timedelta(minutes=5))
+    session.commit()
+
+    jobs = claim(session, NOW)
+    assert [(job.user_id, job.status, job.attempts) for job in jobs] == [(1, NotifyJob.RUNNING, 1)]
+    assert claim(session, NOW) == []
+    assert [job.user_id for job in claim(session, NOW + timedelta(minutes=5))] == [2]
+
+
+def test_claim_in_chunks(session, monkeypatch):
+    monkeypatch.setattr(notify_job, "CLAIM_CHUNK_SIZE", 2)
+    session.add_all([User(id=uid) for uid in range(3, 6)])
+    NotifyJob.enqueue_many(session, [(uid, TODAY) for uid in range(1, 6)], NOW)
+    session.commit()
+
+    assert sorted(job.user_id for job in claim(session, NOW)) == [1, 2, 3, 4, 5]
+    assert claim(session, NOW + timedelta(minutes=1)) == []
+
+
+def test_claim_with_user_filter(session):
+    NotifyJob.enqueue(session, 1, TODAY, NOW)
+    NotifyJob.enqueue(session, 2, TODAY, NOW)
+    session.commit()
+
+    assert [job.user_id for job in claim(session, NOW, user_filter=NotifyJob.user_id == 2)] == [2]
+
+
+def test_failed_job_backs_off_until_max_attempts(session):
+    NotifyJob.enqueue(session, 1, TODAY, NOW)
+    session.commit()
+
+    now = NOW
+    for attempt in range(1, 3):
+        (job,) = claim(session, now)
+        assert job.attempts == attempt
+        NotifyJob.finish(session, job.id, False, now, 2, 60)
+        session.expire_all()
+        if attempt == 1:
+            assert job.status == NotifyJob.PENDING
+            assert job.next_attempt_at == now + timedelta(seconds=60)
+            assert claim(session, now + timedelta(seconds=59)) == []
+            now += timedelta(seconds=60)
+    assert job.status == NotifyJob.FAILED
+    assert claim(session, now + timedelta(days=1)) == []
+
+
+def test_finish_without_retry_fails_at_once(session):
+    NotifyJob.enqueue(session, 1, TODAY, NOW)
+    session.commit()
+    (job,) = claim(session, NOW)
+
+    NotifyJob.finish(session, job.id, False, NOW, 4, 60, retry=False)
+    session.expire_all()
+    assert (job.status, job.attempts) == (NotifyJob.FAILED, 1)
+
+
+def test_finish_done(session):
+    NotifyJob.enqueue(session, 1, TODAY, NOW)
+    session.commit()
+    (job,) = claim(session, NOW)
+
+    NotifyJob.finish(session, job.id, True, NOW, 4, 60)
+    session.expire_all()
+    assert job.status == NotifyJob.DONE
+    assert NotifyJob.next_attempt(session) is None
+
+
+def test_recover_runs_interrupted_jobs_again(session):
+    NotifyJob.enqueue(session, 1, TODAY, NOW)
+    NotifyJob.enqueue(session, 2, TODAY, NOW)
+    session.commit()
+    claim(session, NOW)
+
+    assert NotifyJob.recover(session, NotifyJob.user_id == 1) == 1
+    jobs = claim(session, NOW)
+    assert [(job.user_id, job.attempts) for job in jobs] == [(1, 2)]
+    assert NotifyJob.recover(session) == 2
@@ -0,0 +1,53 @@
+from datetime import date, datetime
+
+from services.notify_scheduler import local_date, reschedule, schedule
+
+NEW_YORK = "America/New_York"
+
+
+def test_no_schedule_without_timezone_or_hour():
+    assert schedule(None, 9, datetime(2026, 3, 1)) is None
+    assert schedule("", 9, datetime(2026, 3, 1)) is None
+    assert schedule(NEW_YORK, None, datetime(2026, 3, 1)) is None
+
+
+def test_fires_during_the_whole_local_hour():
+    # 9:00 EST is 14:00 UTC
+    assert schedule(NEW_YORK, 9, datetime(2026, 1, 10, 14, 30)) == datetime(2026, 1, 10, 14)
+    assert schedule(NEW_YORK, 9, datetime(2026, 1, 10, 15)) == datetime(2026, 1, 11, 14)
+
+
+def test_reschedule_follows_dst_start():
+    # 2026-03-08 New York moves from EST (UTC-5) to EDT (UTC-4)
+    fired_at = schedule(NEW_YORK, 9, datetime(2026, 3, 7, 12))
+    assert fired_at == datetime(2026, 3, 7, 14)
+    assert reschedule(NEW_YORK, 9, fired_at, datetime(2026, 3, 7, 14, 1)) == datetime(2026, 3, 8, 13)
+
+
+def test_reschedule_follows_dst_end():
+    # 2026-11-01 New York moves back to EST
+    fired_at = schedule(NEW_YORK, 9, datetime(2026, 10, 31, 12))
+    assert fired_at == datetime(2026, 10, 31, 13)
+    assert reschedule(NEW_YORK, 9, fired_at, datetime(2026, 10, 31, 13, 1)) == datetime(2026, 11, 1, 14)
+
+
+def test_skipped_hour_fires_at_the_first_valid_time():
+    # 2:00 does not exist on 2026-03-08, 3:00 EDT is 7:00 UTC
+    assert schedule(NEW_YORK, 2, datetime(2026, 3, 8)) == datetime(2026, 3, 8, 7)
+
+
+def test_repeated_hour_fires_once():
+    # 1:00 happens twice on 2026-11-01, first as EDT (5:00 UTC) then as EST (6:00 UTC)
+    fired_at = schedule(NEW_YORK, 1, datetime(2026, 11, 1))
+    assert fired_at == datetime(2026, 11, 1, 5)
+    assert reschedule(NEW_YORK, 1, fired_at, datetime(2026, 11, 1, 5, 1)) == datetime(2026, 11, 2, 6)
+
+
+def test_reschedule_after_downtime_skips_the_missed_days():
+    fired_at = datetime(2026, 1, 10, 14)
+    assert reschedule(NEW_YORK, 9, fired_at, datetime(2026, 1, 13, 20)) == datetime(2026, 1, 14, 14)
+
+
+def test_local_date():
+    assert local_date("Asia/Tokyo", datetime(2026, 1, 10, 15)) == date(2026, 1, 11)
+    assert local_date(NEW_YORK, datetime(2026, 1, 10, 3)) == date(2026, 1, 9)
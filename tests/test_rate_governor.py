@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from services.rate_governor import BucketConfig, RateGovernor, TokenBucket
+from valclient.auth import RateLimitedError
+
+CONFIG = BucketConfig(rate=100, burst=2, min_rate=10, max_rate=200)
+
+
+def governor(max_wait=60.0, config=CONFIG):
+    return RateGovernor({"auth": config, "region": config, "proxy": config}, max_wait=max_wait, retries=1)
+
+
+def test_burst_then_paced():
+    async def scenario():
+        bucket = TokenBucket(CONFIG)
+        return [await bucket.take() for _ in range(4)]
+
+    started = time.monotonic()
+    waits = asyncio.run(scenario())
+    # two tokens right away, then one every 10ms
+    assert max(waits[:2]) < 0.005
+    assert time.monotonic() - started >= 0.015
+
+
+def test_limited_halves_the_rate_once_per_interval():
+    bucket = TokenBucket(CONFIG)
+    now = time.monotonic()
+    bucket.limited(now)
+    bucket.limited(now + 0.1)
+    assert bucket.rate == 50
+    assert bucket.tokens <= 0
+    assert bucket.limited_count == 2
+    bucket.limited(now + CONFIG.decrease_interval)
+    assert bucket.rate == 25
+    for i in range(10):
+        bucket.limited(now + 10 + i * CONFIG.decrease_interval)
+    assert bucket.rate == CONFIG.min_rate
+
+
+def test_successes_raise_the_rate_up_to_max():
+    bucket = TokenBucket(CONFIG)
+    bucket.succeeded()
+    assert bucket.rate == pytest.approx(100.005)
+    for _ in range(10 ** 6):
+        bucket.succeeded()
+        if bucket.rate == CONFIG.max_rate:
+            break
+    assert bucket.rate == CONFIG.max_rate
+
+
+def test_long_queue_is_refused():
+    # the third request would wait 100ms
+    limiter = governor(max_wait=0.05, config=BucketConfig(rate=10, burst=2, min_rate=1, max_rate=10)).bind(None)
+
+    async def scenario():
+        for _ in range(2):
+            await limiter.acquire("ap")
+        with pytest.raises(RateLimitedError):
+            await limiter.acquire("ap")
+        # another region has its own bucket
+        await limiter.acquire("na")
+
+    asyncio.run(scenario())
+
+
+def test_scopes_and_proxies_get_their_own_buckets():
+    rate_governor = governor()
+
+    async def scenario():
+        await rate_governor.bind("proxy-1").acquire("auth")
+        await rate_governor.bind(None).acquire("ap")
+
+    asyncio.run(scenario())
+    assert set(rate_governor.buckets) == {("auth", ""), ("proxy", "proxy-1"), ("region", "ap")}
+
+    rate_governor.bind("proxy-1").limited("auth")
+    assert rate_governor.buckets[("auth", "")].rate == 50
+    assert rate_governor.buckets[("proxy", "proxy-1")].rate == 50
+    assert rate_governor.buckets[("region", "ap")].rate == 100
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from services.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    flights = SingleFlight()
+    runs = []
+
+    async def login(name):
+        runs.append(name)
+        await asyncio.sleep(0.01)
+        return f"client of {name}"
+
+    async def scenario():
+        return await asyncio.gather(flights.run("a", lambda: login("a")), flights.run("a", lambda: login("a")),
+                                    flights.run("b", lambda: login("b")))
+
+    assert asyncio.run(scenario()) == ["client of a", "client of a", "client of b"]
+    assert runs == ["a", "b"]
+    assert (flights.calls, flights.coalesced, len(flights)) == (3, 1, 0)
+
+
+def test_a_landed_flight_runs_again():
+    flights = SingleFlight()
+    runs = []
+
+    async def call():
+        runs.append(1)
+        return len(runs)
+
+    async def scenario():
+        return [await flights.run("a", call), await flights.run("a", call)]
+
+    assert asyncio.run(scenario()) == [1, 2]
+
+
+def test_error_goes_to_every_caller():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("riot is down")
+
+    async def scenario():
+        return await asyncio.gather(flights.run("a", fail), flights.run("a", fail), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert [type(result) for result in results] == [ValueError, ValueError]
+    assert len(flights) == 0
+
+
+def test_caller_giving_up_does_not_cancel_the_others():
+    flights = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        impatient = asyncio.ensure_future(asyncio.wait_for(flights.run("a", slow), 0.01))
+        patient = asyncio.ensure_future(flights.run("a", slow))
+        with pytest.raises(asyncio.TimeoutError):
+            await impatient
+        return await patient
+
+    assert asyncio.run(scenario()) == "done"
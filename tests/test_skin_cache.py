@@ -0,0 +1,55 @@
+import threading
+
+from database.weapon import SkinCache, SkinRecord
+
+
+def record(key):
+    return SkinRecord(key, f"skin {key}", f"{key}.png", None)
+
+
+def test_least_recently_used_goes_first():
+    cache = SkinCache(max_size=2)
+    cache.put("a", record("a"))
+    cache.put("b", record("b"))
+    assert cache.get("a") == record("a")
+    cache.put("c", record("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") == record("a")
+    assert cache.get("c") == record("c")
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_clear():
+    cache = SkinCache()
+    cache.put("a", record("a"))
+    cache.clear()
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_concurrent_use_keeps_the_size_limit():
+    cache = SkinCache(max_size=64)
+    errors = []
+
+    def use(worker):
+        try:
+            for i in range(2000):
+                key = f"{worker}-{i % 100}"
+                if cache.get(key) is None:
+                    cache.put(key, record(key))
+                if worker == 0 and i % 500 == 0:
+                    cache.clear()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=use, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(cache) <= 64
+    assert cache.hits + cache.misses == 8 * 2000
@@ -1,4 +1,7 @@
 from .client import Client
+from .async_client import AsyncClient, new_session
+from .pool import ProxyEndpoint
+from .token_cache import TokenCache
 
-__all__ = ["Client"]
-__author__ = "colinhartigan"
\ No newline at end of file
+__all__ = ["Client", "AsyncClient", "new_session", "ProxyEndpoint", "TokenCache"]
+__author__ = "colinhartigan"
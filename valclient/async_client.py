@@ -0,0 +1,277 @@
+import json
+
+import aiohttp
+
+from .auth import AsyncAuth, RateLimitedError
+from .pool import ProxyEndpoint
+from .exceptions import ResponseError
+from .resources import base_endpoint
+from .resources import base_endpoint_glz
+from .resources import base_endpoint_shared
+from .resources import queues
+from .resources import region_shard_override, shard_region_override
+from .resources import regions
+from .token_cache import TokenCache
+
+
+def new_session(limit: int = 100, limit_per_host: int = 0, keepalive_timeout: float = 15) -> aiohttp.ClientSession:
+    '''
+    Create a pooled session to share between AsyncClient instances.
+    The connector keeps a keep-alive pool per (proxy, host), limit_per_host caps each of them.
+    Cookies are not kept because the session is used for many accounts at once.
+    Must be called inside a running event loop.
+    '''
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host, keepalive_timeout=keepalive_timeout)
+    return aiohttp.ClientSession(connector=connector,
+                                 cookie_jar=aiohttp.DummyCookieJar(),
+                                 timeout=aiohttp.ClientTimeout(total=10))
+
+
+class AsyncClient:
+
+    def __init__(self, session: aiohttp.ClientSession, region="na", auth=None, proxy=None,
+                 token_cache: TokenCache = None, cache_key=None, cookies=None, limiter=None):
+        '''
+        asyncio version of Client for remote (pd/glz/shared) endpoints only.
+        auth uses the same format as Client, proxy is either the same format or a ProxyEndpoint
+        when token_cache and cache_key are given, activate() reuses the tokens of the last login
+        cookies are riot auth cookies saved from a previous login (see AsyncAuth.cookies)
+        limiter paces the requests, every request first awaits limiter.acquire(scope) where scope is "auth"
+        or the shard, and reports back with limiter.succeeded(scope) / limiter.limited(scope).
+        rate limited requests are retried limiter.retries times before RateLimitedError is raised
+        '''
+        if auth is None:
+            raise ValueError("AsyncClient requires auth")
+
+        self.session = session
+        if isinstance(proxy, dict):
+            proxy = ProxyEndpoint.parse(proxy["https"]) if proxy.get("https") else None
+        self.proxy: ProxyEndpoint = proxy
+        self.proxy_kwargs = {"proxy": proxy.url, "proxy_auth": proxy.auth} if proxy else {}
+        self.puuid = ""
+        self.headers = {}
+        self.region = region
+        self.shard = region
+        self.auth = AsyncAuth(auth, self.proxy, session, cookies=cookies)
+        # "cache", "cookie" or "credentials", whichever served the last activate()
+        self.login_source = ""
+        self.token_cache = token_cache
+        self.cache_key = cache_key
+        self.limiter = limiter
+
+        if region in regions:
+            self.region = region
+        else:
+            raise ValueError(f"Invalid region, valid regions are: {regions}")
+
+        if self.region in region_shard_override.keys():
+            self.shard = region_shard_override[self.region]
+        if self.shard in shard_region_override.keys():
+            self.region = shard_region_override[self.shard]
+
+        self.base_url = base_endpoint.format(shard=self.shard)
+        self.base_url_glz = base_endpoint_glz.format(shard=self.shard, region=self.region)
+        self.base_url_shared = base_endpoint_shared.format(shard=self.shard)
+
+    @property
+    def cacheable(self) -> bool:
+        return self.token_cache is not None and self.cache_key is not None
+
+    async def activate(self, force: bool = False) -> None:
+        '''Activate the client and get authorization, force skips the token cache'''
+        if self.cacheable and not force:
+            token = self.token_cache.get(self.cache_key)
+            if token is not None:
+                self.puuid, self.headers = token.puuid, dict(token.headers)
+                self.login_source = "cache"
+                return
+        self.puuid, self.headers, _ = await self.__limited("auth", self.auth.authenticate)
+        self.login_source = self.auth.served_by
+        if self.cacheable:
+            self.token_cache.put(self.cache_key, self.puuid, self.headers, self.auth.expires_in)
+
+    def __url(self, endpoint, endpoint_type) -> str:
+        if endpoint_type == "glz":
+            return f"{self.base_url_glz}{endpoint}"
+        if endpoint_type == "shared":
+            return f"{self.base_url_shared}{endpoint}"
+        return f"{self.base_url}{endpoint}"
+
+    @staticmethod
+    def __verify_status_code(status_code, exceptions={}):
+        '''Verify that the request was successful according to exceptions'''
+        if status_code in exceptions.keys():
+            response_exception = exceptions[status_code]
+            raise response_exception[0](response_exception[1])
+
+    async def __limited(self, scope, call):
+        if self.limiter is None:
+            return await call()
+        for attempt in range(self.limiter.retries + 1):
+            await self.limiter.acquire(scope)
+            try:
+                result = await call()
+            except RateLimitedError:
+                self.limiter.limited(scope)
+                if attempt == self.limiter.retries:
+                    raise
+                continue
+            self.limiter.succeeded(scope)
+            return result
+
+    async def __request(self, method, endpoint, endpoint_type, exceptions, **kwargs):
+        async def request():
+            async with self.session.request(method, self.__url(endpoint, endpoint_type), headers=self.headers,
+                                            **self.proxy_kwargs, **kwargs) as response:
+                if response.status == 429:
+                    raise RateLimitedError("rate limited")
+                self.__verify_status_code(response.status, exceptions)
+                return await response.text()
+
+        text = await self.__limited(self.shard, request)
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    async def fetch(self, endpoint="/", endpoint_type="pd", exceptions={}, _retry=True) -> dict:
+        '''Get data from a pd/glz/shared endpoint'''
+        data = await self.__request("GET", endpoint, endpoint_type, exceptions)
+        if data is None:
+            raise ResponseError("Request returned NoneType")
+
+        if "httpStatus" not in data:
+            return data
+        if data["httpStatus"] == 400 and _retry:
+            # the cached token was revoked or expired early, login again once
+            await self.activate(force=True)
+            return await self.fetch(endpoint=endpoint, endpoint_type=endpoint_type, exceptions=exceptions,
+                                    _retry=False)
+        return data
+
+    async def post(self, endpoint="/", endpoint_type="pd", json_data={}, exceptions={}) -> dict:
+        '''Post data to a pd/glz endpoint'''
+        return await self.__request("POST", endpoint, endpoint_type, exceptions, json=json_data)
+
+    async def put(self, endpoint="/", endpoint_type="pd", json_data={}, exceptions={}) -> dict:
+        data = await self.__request("PUT", endpoint, endpoint_type, exceptions, data=json.dumps(json_data))
+        if data is not None:
+            return data
+        else:
+            raise ResponseError("Request returned NoneType")
+
+    async def delete(self, endpoint="/", endpoint_type="pd", json_data={}, exceptions={}) -> dict:
+        data = await self.__request("DELETE", endpoint, endpoint_type, exceptions, data=json.dumps(json_data))
+        if data is not None:
+            return data
+        else:
+            raise ResponseError("Request returned NoneType")
+
+    # --------------------------------------------------------------------------------------------------
+
+    # PVP endpoints
+    async def fetch_content(self) -> dict:
+        '''Content_FetchContent'''
+        return await self.fetch(endpoint="/content-service/v2/content", endpoint_type="shared")
+
+    async def fetch_account_xp(self) -> dict:
+        '''AccountXP_GetPlayer'''
+        return await self.fetch(endpoint=f"/account-xp/v1/players/{self.puuid}", endpoint_type="pd")
+
+    async def fetch_player_loadout(self) -> dict:
+        '''playerLoadoutUpdate'''
+        return await self.fetch(endpoint=f"/personalization/v2/players/{self.puuid}/playerloadout",
+                                endpoint_type="pd")
+
+    async def put_player_loadout(self, loadout: dict) -> dict:
+        '''playerLoadoutUpdate'''
+        return await self.put(endpoint=f"/personalization/v2/players/{self.puuid}/playerloadout", endpoint_type="pd",
+                              json_data=loadout)
+
+    async def fetch_mmr(self, puuid: str = None) -> dict:
+        '''MMR_FetchPlayer'''
+        puuid = self.__check_puuid(puuid)
+        return await self.fetch(endpoint=f"/mmr/v1/players/{puuid}", endpoint_type="pd")
+
+    async def fetch_match_history(self, puuid: str = None, start_index: int = 0, end_index: int = 15,
+                                  queue_id: str = "null") -> dict:
+        '''MatchHistory_FetchMatchHistory'''
+        self.__check_queue_type(queue_id)
+        puuid = self.__check_puuid(puuid)
+        return await self.fetch(
+            endpoint=f"/match-history/v1/history/{puuid}?startIndex={start_index}&endIndex={end_index}" + (
+                f"&queue={queue_id}" if queue_id != "null" else ""), endpoint_type="pd")
+
+    async def fetch_match_details(self, match_id: str) -> dict:
+        '''Get the full info for a previous match'''
+        return await self.fetch(endpoint=f"/match-details/v1/matches/{match_id}", endpoint_type="pd")
+
+    async def fetch_competitive_updates(self, puuid: str = None, start_index: int = 0, end_index: int = 15,
+                                        queue_id: str = "competitive") -> dict:
+        '''MMR_FetchCompetitiveUpdates'''
+        self.__check_queue_type(queue_id)
+        puuid = self.__check_puuid(puuid)
+        return await self.fetch(
+            endpoint=f"/mmr/v1/players/{puuid}/competitiveupdates?startIndex={start_index}&endIndex={end_index}" + (
+                f"&queue={queue_id}" if queue_id != "" else ""), endpoint_type="pd")
+
+    async def fetch_leaderboard(self, season: str, start_index: int = 0, size: int = 25,
+                                region: str = "na") -> dict:
+        '''MMR_FetchLeaderboard'''
+        if season == "":
+            season = (await self.fetch_mmr())["LatestCompetitiveUpdate"]["SeasonID"]
+        return await self.fetch(
+            f"/mmr/v1/leaderboards/affinity/{region}/queue/competitive/season/{season}?startIndex={start_index}&size={size}",
+            endpoint_type="pd")
+
+    async def fetch_player_restrictions(self) -> dict:
+        '''Restrictions_FetchPlayerRestrictionsV2'''
+        return await self.fetch(f"/restrictions/v2/penalties", endpoint_type="pd")
+
+    async def fetch_item_progression_definitions(self) -> dict:
+        '''ItemProgressionDefinitionsV2_Fetch'''
+        return await self.fetch("/contract-definitions/v3/item-upgrades", endpoint_type="pd")
+
+    async def fetch_config(self) -> dict:
+        '''Config_FetchConfig'''
+        return await self.fetch(f"/v1/config/{self.region}", endpoint_type="shared")
+
+    # store endpoints
+    async def store_fetch_offers(self) -> dict:
+        '''Store_GetOffers'''
+        return await self.fetch("/store/v1/offers/", endpoint_type="pd")
+
+    async def store_fetch_storefront(self) -> dict:
+        '''Store_GetStorefrontV2'''
+        return await self.fetch(f"/store/v2/storefront/{self.puuid}", endpoint_type="pd")
+
+    async def store_fetch_wallet(self) -> dict:
+        '''Store_GetWallet'''
+        return await self.fetch(f"/store/v1/wallet/{self.puuid}", endpoint_type="pd")
+
+    async def store_fetch_order(self, order_id: str) -> dict:
+        '''Store_GetOrder'''
+        return await self.fetch(f"/store/v1/order/{order_id}", endpoint_type="pd")
+
+    async def store_fetch_entitlements(self, item_type: str = "e7c63390-eda7-46e0-bb7a-a6abdacd2433") -> dict:
+        '''Store_GetEntitlements'''
+        return await self.fetch(endpoint=f"/store/v1/entitlements/{self.puuid}/{item_type}", endpoint_type="pd")
+
+    async def fetch_player_name(self):
+        return await self.put(endpoint="/name-service/v2/players", json_data=[self.puuid])
+
+    # party endpoints
+    async def party_fetch_player(self) -> dict:
+        '''Party_FetchPlayer'''
+        return await self.fetch(endpoint=f"/parties/v1/players/{self.puuid}", endpoint_type="glz")
+
+    # local utility functions
+    def __check_puuid(self, puuid) -> str:
+        '''If puuid passed into method is None make it current user's puuid'''
+        return self.puuid if puuid is None else puuid
+
+    @staticmethod
+    def __check_queue_type(queue_id) -> None:
+        '''Check if queue id is valid'''
+        if queue_id not in queues:
+            raise ValueError("Invalid queue type")
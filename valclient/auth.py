@@ -1,5 +1,8 @@
-import requests
+import aiohttp
 import re
+from yarl import URL
+
+from .pool import new_requests_session, ProxyEndpoint
 
 
 class InvalidCredentialError(Exception): ...
@@ -8,6 +11,12 @@ class InvalidCredentialError(Exception): ...
 class RateLimitedError(Exception): ...
 
 
+# compiled once at import instead of on every login
+TOKEN_PATTERN = re.compile(
+    r'access_token=((?:[a-zA-Z]|\d|\.|-|_)*).*id_token=((?:[a-zA-Z]|\d|\.|-|_)*).*expires_in=(\d*)')
+CLIENT_PLATFORM = "ew0KCSJwbGF0Zm9ybVR5cGUiOiAiUEMiLA0KCSJwbGF0Zm9ybU9TIjogIldpbmRvd3MiLA0KCSJwbGF0Zm9ybU9TVmVyc2lvbiI6ICIxMC4wLjE5MDQyLjEuMjU2LjY0Yml0IiwNCgkicGxhdGZvcm1DaGlwc2V0IjogIlVua25vd24iDQp9"
+
+
 class Auth:
 
     def __init__(self, auth, proxy):
@@ -16,8 +25,8 @@ class Auth:
         self.password = auth['password']
 
     def authenticate(self):
-        session = requests.session()
-        session.proxies = self.proxy
+        # own cookie jar for the login, connections from the pools shared with the clients
+        session = new_requests_session(self.proxy, keep_cookies=True)
         data = {
             'client_id': 'play-valorant-web-prod',
             'nonce': '1',
@@ -33,15 +42,14 @@ class Auth:
             'password': self.password
         }
         r = session.put('https://auth.riotgames.com/api/v1/authorization', timeout=10, json=data)
-        pattern = re.compile(
-            'access_token=((?:[a-zA-Z]|\d|\.|-|_)*).*id_token=((?:[a-zA-Z]|\d|\.|-|_)*).*expires_in=(\d*)')
+        body = r.json()
 
-        if r.json().get("error") == "rate_limited":
+        if body.get("error") == "rate_limited":
             raise RateLimitedError("rate limited")
-        if r.json().get("error") == "auth_failure":
+        if body.get("error") == "auth_failure":
             raise InvalidCredentialError(f"invalid credential")
         try:
-            data = pattern.findall(r.json()['response']['parameters']['uri'])[0]
+            data = TOKEN_PATTERN.findall(body['response']['parameters']['uri'])[0]
         except KeyError:
             raise InvalidCredentialError(f"invalid credential")
         access_token = data[0]
@@ -58,8 +66,89 @@ class Auth:
         user_id = r.json()['sub']
         # print('User ID: ' + user_id)
         headers['X-Riot-Entitlements-JWT'] = entitlements_token
-        session.close()
 
-        headers[
-            "X-Riot-ClientPlatform"] = "ew0KCSJwbGF0Zm9ybVR5cGUiOiAiUEMiLA0KCSJwbGF0Zm9ybU9TIjogIldpbmRvd3MiLA0KCSJwbGF0Zm9ybU9TVmVyc2lvbiI6ICIxMC4wLjE5MDQyLjEuMjU2LjY0Yml0IiwNCgkicGxhdGZvcm1DaGlwc2V0IjogIlVua25vd24iDQp9"
+        headers["X-Riot-ClientPlatform"] = CLIENT_PLATFORM
+        return user_id, headers, {}
+
+
+AUTH_URL = URL('https://auth.riotgames.com/')
+
+
+class AsyncAuth:
+
+    def __init__(self, auth, proxy: ProxyEndpoint, session: aiohttp.ClientSession, cookies=None):
+        # proxy and proxy_auth keyword arguments of every request
+        self.proxy = {"proxy": proxy.url, "proxy_auth": proxy.auth} if proxy else {}
+        self.username = auth['username']
+        self.password = auth['password']
+        self.session = session
+        self.expires_in = 0
+        # riot auth cookies (ssid etc.) of the last login, pass them back in to login without the password
+        self.cookies = dict(cookies or {})
+        # "cookie" or "credentials", whichever served the last login
+        self.served_by = ""
+
+    async def authenticate(self):
+        # riot keeps the login state in cookies, so every login gets its own cookie jar
+        # while the TCP/TLS connections are borrowed from the shared connector
+        async with aiohttp.ClientSession(connector=self.session.connector, connector_owner=False) as session:
+            if self.cookies:
+                session.cookie_jar.update_cookies(self.cookies, AUTH_URL)
+            data = {
+                'client_id': 'play-valorant-web-prod',
+                'nonce': '1',
+                'redirect_uri': 'https://playvalorant.com/opt_in',
+                'response_type': 'token id_token',
+            }
+            async with session.post('https://auth.riotgames.com/api/v1/authorization', json=data,
+                                    **self.proxy, timeout=aiohttp.ClientTimeout(total=10)) as r:
+                body = await r.json(content_type=None)
+
+            # with a valid ssid cookie riot answers the authorization request with the tokens right away
+            if body.get("type") == "response":
+                self.served_by = "cookie"
+            else:
+                if self.cookies:
+                    # the stored cookies are no longer valid, start over with a clean jar
+                    session.cookie_jar.clear()
+                    async with session.post('https://auth.riotgames.com/api/v1/authorization', json=data,
+                                            **self.proxy, timeout=aiohttp.ClientTimeout(total=10)) as r:
+                        await r.read()
+                data = {
+                    'type': 'auth',
+                    'username': self.username,
+                    'password': self.password,
+                    'remember': True
+                }
+                async with session.put('https://auth.riotgames.com/api/v1/authorization', json=data,
+                                       **self.proxy, timeout=aiohttp.ClientTimeout(total=10)) as r:
+                    body = await r.json(content_type=None)
+                self.served_by = "credentials"
+
+            if body.get("error") == "rate_limited":
+                raise RateLimitedError("rate limited")
+            if body.get("error") == "auth_failure":
+                raise InvalidCredentialError(f"invalid credential")
+            try:
+                data = TOKEN_PATTERN.findall(body['response']['parameters']['uri'])[0]
+            except KeyError:
+                raise InvalidCredentialError(f"invalid credential")
+            access_token = data[0]
+            self.expires_in = int(data[2] or 0)
+
+            headers = {
+                'Authorization': f'Bearer {access_token}',
+            }
+            async with session.post('https://entitlements.auth.riotgames.com/api/token/v1', headers=headers, json={},
+                                    **self.proxy, timeout=aiohttp.ClientTimeout(total=10)) as r:
+                entitlements_token = (await r.json(content_type=None))['entitlements_token']
+
+            async with session.post('https://auth.riotgames.com/userinfo', headers=headers, json={},
+                                    **self.proxy, timeout=aiohttp.ClientTimeout(total=10)) as r:
+                user_id = (await r.json(content_type=None))['sub']
+
+            self.cookies = {key: morsel.value for key, morsel in session.cookie_jar.filter_cookies(AUTH_URL).items()}
+
+        headers['X-Riot-Entitlements-JWT'] = entitlements_token
+        headers["X-Riot-ClientPlatform"] = CLIENT_PLATFORM
         return user_id, headers, {}
@@ -7,6 +7,7 @@ import requests
 import urllib3
 
 from .auth import Auth
+from .pool import new_requests_session
 # exceptions
 from .exceptions import ResponseError, HandshakeError, LockfileError, PhaseError
 from .resources import base_endpoint
@@ -37,6 +38,8 @@ class Client:
                 os.getenv('LOCALAPPDATA'), R'Riot Games\Riot Client\Config\lockfile')
 
         self.proxy = proxy
+        # connections are pooled per (proxy, host) and shared with the other clients
+        self.session = new_requests_session(proxy)
         self.puuid = ""
         self.player_name = ""
         self.player_tag = ""
@@ -92,9 +95,9 @@ class Client:
     def fetch(self, endpoint="/", endpoint_type="pd", exceptions={}) -> dict:  # exception: code: {Exception, Message}
         '''Get data from a pd/glz/local endpoint'''
         if endpoint_type in ["pd", "glz", "shared"]:
-            response = requests.get(
+            response = self.session.get(
                 f'{self.base_url_glz if endpoint_type == "glz" else self.base_url if endpoint_type == "pd" else self.base_url_shared if endpoint_type == "shared" else self.base_url}{endpoint}',
-                headers=self.headers, proxies=self.proxy)
+                headers=self.headers)
 
             # custom exceptions for http status codes
             self.__verify_status_code(response.status_code, exceptions)
@@ -135,8 +138,8 @@ class Client:
 
     def post(self, endpoint="/", endpoint_type="pd", json_data={}, exceptions={}) -> dict:
         '''Post data to a pd/glz endpoint'''
-        response = requests.post(f'{self.base_url_glz if endpoint_type == "glz" else self.base_url}{endpoint}',
-                                 headers=self.headers, json=json_data, proxies=self.proxy)
+        response = self.session.post(f'{self.base_url_glz if endpoint_type == "glz" else self.base_url}{endpoint}',
+                                     headers=self.headers, json=json_data)
 
         # custom exceptions for http status codes
         self.__verify_status_code(response.status_code, exceptions)
@@ -149,8 +152,8 @@ class Client:
         return data
 
     def put(self, endpoint="/", endpoint_type="pd", json_data={}, exceptions={}) -> dict:
-        response = requests.put(f'{self.base_url_glz if endpoint_type == "glz" else self.base_url}{endpoint}',
-                                headers=self.headers, data=json.dumps(json_data), proxies=self.proxy)
+        response = self.session.put(f'{self.base_url_glz if endpoint_type == "glz" else self.base_url}{endpoint}',
+                                    headers=self.headers, data=json.dumps(json_data))
         data = json.loads(response.text)
 
         # custom exceptions for http status codes
@@ -162,8 +165,8 @@ class Client:
             raise ResponseError("Request returned NoneType")
 
     def delete(self, endpoint="/", endpoint_type="pd", json_data={}, exceptions={}) -> dict:
-        response = requests.delete(f'{self.base_url_glz if endpoint_type == "glz" else self.base_url}{endpoint}',
-                                   headers=self.headers, data=json.dumps(json_data), proxies=self.proxy)
+        response = self.session.delete(f'{self.base_url_glz if endpoint_type == "glz" else self.base_url}{endpoint}',
+                                       headers=self.headers, data=json.dumps(json_data))
         data = json.loads(response.text)
 
         # custom exceptions for http status codes
@@ -0,0 +1,53 @@
+import http.cookiejar
+from typing import Optional
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from yarl import URL
+
+# riot hosts one client talks to: auth, entitlements, pd, glz, shared
+POOL_CONNECTIONS = 16
+# idle keep-alive connections kept per (proxy, host)
+POOL_MAXSIZE = 32
+
+# requests keeps a urllib3 pool per host and a separate pool manager per proxy inside an adapter,
+# so one adapter mounted by every session gives all Client instances a pool per (proxy, host)
+_adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+
+
+def new_requests_session(proxy=None, keep_cookies: bool = False) -> requests.Session:
+    '''
+    Session for one Client or login, its connections come from the shared pools.
+    Cookies are dropped unless keep_cookies, riot auth needs them for the duration of a login.
+    '''
+    session = requests.Session()
+    session.mount("https://", _adapter)
+    session.mount("http://", _adapter)
+    if proxy:
+        session.proxies = proxy
+    if not keep_cookies:
+        session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+class ProxyEndpoint:
+    '''
+    A proxy parsed once, aiohttp otherwise parses the proxy url and its credentials on every request.
+    The connector keys its keep-alive pools by (host, proxy, proxy auth), so every (proxy, riot host)
+    pair gets its own pool.
+    '''
+    __slots__ = ("url", "auth")
+
+    def __init__(self, url: URL, auth: Optional[aiohttp.BasicAuth] = None):
+        self.url = url
+        self.auth = auth
+
+    @classmethod
+    def parse(cls, proxy: str) -> "ProxyEndpoint":
+        url = URL(proxy)
+        auth = aiohttp.BasicAuth(url.user, url.password or "") if url.user else None
+        return cls(url.with_user(None), auth)
+
+    def __repr__(self):
+        return f"ProxyEndpoint({self.url})"
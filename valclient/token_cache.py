@@ -0,0 +1,57 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, Optional
+
+
+@dataclass(frozen=True)
+class CachedToken:
+    puuid: str
+    headers: Dict[str, str] = field(hash=False)
+    expires_at: float
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at <= time.monotonic()
+
+
+class TokenCache:
+    '''
+    Keeps the access token / entitlements headers of logged in accounts until they expire.
+    `margin` seconds are taken off expires_in so that a token never expires in the middle of a command.
+    '''
+
+    def __init__(self, margin: float = 300, max_size: int = 100000):
+        self.margin = margin
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._tokens: Dict[Hashable, CachedToken] = {}
+
+    def get(self, key: Hashable) -> Optional[CachedToken]:
+        token = self._tokens.get(key)
+        if token is None or token.expired:
+            self._tokens.pop(key, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return token
+
+    def put(self, key: Hashable, puuid: str, headers: Dict[str, str], expires_in: int) -> CachedToken:
+        if len(self._tokens) >= self.max_size:
+            self.purge()
+        if len(self._tokens) >= self.max_size:
+            # still full: drop the token that expires first
+            self._tokens.pop(min(self._tokens, key=lambda k: self._tokens[k].expires_at))
+        token = CachedToken(puuid=puuid, headers=dict(headers),
+                            expires_at=time.monotonic() + max(int(expires_in) - self.margin, 0))
+        self._tokens[key] = token
+        return token
+
+    def invalidate(self, key: Hashable) -> None:
+        self._tokens.pop(key, None)
+
+    def purge(self) -> None:
+        self._tokens = {k: v for k, v in self._tokens.items() if not v.expired}
+
+    def __len__(self) -> int:
+        return len(self._tokens)